@@ -1,21 +1,33 @@
-import json
+import asyncio
+import functools
 import os
-import glob
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+import threading
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-from typing import Optional
-import send2trash
+from typing import Literal, Optional
 
 # Local modules
+import config_service
 import database
+import deletion_jobs
+import generation_params
+import http_cache
+import image_hash
 import image_processing
+import metrics
+import scan_jobs
+import scanner
+import tags
+import thumbnails
+import watcher
 
 CONFIG_FILE = "config.json"
 
 app = FastAPI()
+app.add_middleware(metrics.RequestMetricsMiddleware)
 
 # --- Mount static files for the frontend ---
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -26,58 +38,127 @@ templates = Jinja2Templates(directory="templates")
 class AppConfig(BaseModel):
     image_file_path: str
     des_file_path: str
+    scan_workers: Optional[int] = None # Scan pool size; defaults to one worker per CPU
+    thumbnails_on_scan: bool = False # Render the default thumbnail size while scanning
+    watch_source: bool = False # Ingest new images in the source folder as they appear
+    # What a scan does when a different file already has the destination name (identical files are always skipped)
+    duplicate_policy: Literal["skip", "rename", "replace"] = "skip"
 
 class DeleteRequest(BaseModel):
     image_ids: list[int]
 
 # --- Configuration ---
-def get_config(mount_images=True):
-    """
-    Reads the config file. If mount_images is True, it will also mount 
-    the destination directory to serve classified images.
-    """
-    if not os.path.exists(CONFIG_FILE):
-        return None
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        config_data = json.load(f)
-        if mount_images and os.path.isdir(config_data.get("des_file_path", "")):
-            # To avoid errors on reload, we can try to unmount first, but a simple
-            # check and mount is often sufficient if the path doesn't change.
-            # A more robust solution would manage mounts more carefully if paths change frequently.
-            app.mount("/images", StaticFiles(directory=config_data["des_file_path"]), name="images")
-        return config_data
+def image_version(stored_path: str):
+    """Current version token of a library file (the one image_url puts in ?v=), or None if it is not stored."""
+    fields = database.get_version_fields_by_path(stored_path)
+    return thumbnails.thumbnail_version(stored_path, *fields) if fields is not None else None
+
+# /images is mounted once; the config service points it at des_file_path.
+# Deletion batches staged in the trash folder are not served.
+images_mount = config_service.SwappableStaticFiles(functools.partial(
+    http_cache.CachingStaticFiles, current_version=image_version, hidden_dirs=(deletion_jobs.TRASH_DIR,)))
+app.mount("/images", images_mount, name="images")
+config_store = config_service.ConfigService(CONFIG_FILE, images_mount)
+
+def get_config():
+    """Returns the cached configuration. config.json is only re-read when it changes."""
+    return config_store.get()
 
 def save_config(config: AppConfig):
-    """Saves the configuration and re-mounts the /images static directory."""
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config.dict(), f, indent=4)
-    # Re-mount the images directory with the new path
-    get_config(mount_images=True)
-
-# --- Background Task for Scanning ---
-def scan_and_process_images(source_path: str, dest_path: str):
-    """Scans the source path for images and processes them in the background."""
-    database.create_table_if_not_exists() # Ensure table exists for the background process
-    print(f"Starting scan in background: {source_path}")
-    png_files = glob.glob(os.path.join(source_path, '**', '*.png'), recursive=True)
-    processed_count = 0
-    for png_file in png_files:
-        try:
-            image_data = image_processing.process_image(png_file, dest_path)
-            if image_data:
-                database.add_image_info(image_data)
-                processed_count += 1
-                print(f"Processed: {png_file}")
-        except Exception as e:
-            print(f"Failed to process {png_file}: {e}")
-    print(f"Background scan finished. Processed {processed_count} images.")
+    """
+    Saves the configuration and points the /images mount at the new destination.
+    Only the fields the client sent replace stored values, so a settings form that
+    posts just the paths keeps the other options.
+    """
+    config_store.save({**(get_config() or {}), **config.dict(exclude_unset=True)})
+
+# --- Library paths ---
+PLACEHOLDER_URL = "/static/placeholder.png"
+
+def image_url(stored_path: str, missing=False, version=None):
+    """
+    Builds the /images URL for a stored library-relative path. Pure string work:
+    missing files are flagged by the integrity sweep, not checked per request.
+    With a version the URL is served as immutable.
+    """
+    if missing or os.path.isabs(stored_path):
+        return PLACEHOLDER_URL # Placeholder for missing files or files outside the library
+    url = "/images/" + stored_path
+    return f"{url}?v={version}" if version else url
+
+def resolve_image_path(stored_path: str):
+    """Returns the filesystem path of a stored library path."""
+    config = get_config()
+    return database.resolve_library_path(stored_path, config["des_file_path"] if config else None)
+
+def run_integrity_sweep(base_path: str):
+    """
+    Flags rows whose files disappeared from the library and hashes images
+    stored before perceptual and content hashing existed. Runs off the request path.
+    """
+    try:
+        missing = database.sweep_missing_files(base_path)
+        print(f"Integrity sweep finished. {missing} missing files.")
+        hashed = image_hash.backfill_hashes(base_path)
+        if hashed:
+            print(f"Computed perceptual hashes for {hashed} images.")
+        hashed, duplicates = scanner.backfill_content_hashes(base_path)
+        if hashed or duplicates:
+            print(f"Computed content hashes for {hashed} images, {duplicates} are copies of other images.")
+    except Exception as e:
+        print(f"Integrity sweep failed: {e}")
+    finally:
+        database.close_db_connection()
+
+def start_integrity_sweep():
+    config = get_config()
+    if config and config.get("des_file_path"):
+        threading.Thread(target=run_integrity_sweep, args=(config["des_file_path"],), daemon=True).start()
+
+def scan_thumbnail_sizes(config):
+    return (thumbnails.DEFAULT_THUMBNAIL_SIZE,) if config.get("thumbnails_on_scan") else ()
+
+def scan_duplicate_policy(config):
+    policy = config.get("duplicate_policy", "skip")
+    return policy if policy in image_processing.DUPLICATE_POLICIES else "skip"
+
+# --- Watch mode ---
+source_watcher = None
+source_watcher_lock = threading.Lock()
+
+def update_source_watcher():
+    """Starts, restarts or stops the source folder watcher to match the config."""
+    global source_watcher
+    config = get_config() or {}
+    with source_watcher_lock:
+        if source_watcher is not None:
+            source_watcher.stop()
+            source_watcher = None
+        if config.get("watch_source") and config.get("image_file_path") and config.get("des_file_path"):
+            source_watcher = watcher.SourceWatcher(config["image_file_path"], config["des_file_path"],
+                                                   scan_thumbnail_sizes(config), scan_duplicate_policy(config))
+            source_watcher.start()
 
 # --- API Endpoints ---
 @app.on_event("startup")
 def startup_event():
     """On startup, initialize DB and load config."""
     # database.init_db() # This will wipe the DB on every restart. Better to do it manually.
-    get_config(mount_images=True)
+    database.create_table_if_not_exists()
+    database.mark_interrupted_scan_jobs()
+    database.mark_interrupted_deletion_batches()
+    config = get_config()
+    if config and config.get("des_file_path"):
+        database.migrate_to_relative_paths(config["des_file_path"])
+    start_integrity_sweep()
+    update_source_watcher()
+    deletion_jobs.manager.start_retention(lambda: (get_config() or {}).get("des_file_path"))
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if source_watcher is not None:
+        source_watcher.stop()
+    deletion_jobs.manager.stop_retention()
 
 @app.get("/")
 async def read_root(request: Request):
@@ -87,7 +168,7 @@ async def read_root(request: Request):
 @app.get("/api/config")
 def read_config():
     """Returns the current configuration."""
-    config = get_config(mount_images=False)
+    config = get_config()
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found. Please set it up.")
     return config
@@ -100,41 +181,115 @@ def write_config(config: AppConfig):
             raise HTTPException(status_code=400, detail=f"Source path not found: {config.image_file_path}")
         os.makedirs(config.des_file_path, exist_ok=True)
         save_config(config)
+        database.migrate_to_relative_paths(config.des_file_path)
+        start_integrity_sweep()
+        update_source_watcher()
         return {"message": "Configuration saved successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/scan")
-def start_scan(background_tasks: BackgroundTasks):
-    """Starts the image scan and classification in the background."""
-    config = get_config(mount_images=False)
+def start_scan():
+    """Starts the image scan and classification in the background and returns its job."""
+    config = get_config()
     if not config or not config.get("image_file_path") or not config.get("des_file_path"):
         raise HTTPException(status_code=400, detail="Configuration is not set properly.")
     
     source_path = config["image_file_path"]
     dest_path = config["des_file_path"]
     
-    background_tasks.add_task(scan_and_process_images, source_path, dest_path)
-    return {"message": "Image scan started in the background."}
+    try:
+        job = scan_jobs.manager.start(source_path, dest_path, config.get("scan_workers"),
+                                      scan_thumbnail_sizes(config), scan_duplicate_policy(config))
+    except scan_jobs.ScanAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job.id})
+    return {"message": "Image scan started in the background.", "job_id": job.id, "job": job.to_dict()}
+
+@app.get("/api/scan/{job_id}")
+def get_scan_status(job_id: str):
+    """Returns the status and counters of a scan job."""
+    job = scan_jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job
+
+@app.get("/api/scan/{job_id}/events")
+async def stream_scan_progress(job_id: str, request: Request):
+    """Streams scan progress as Server-Sent Events until the job finishes."""
+    if scan_jobs.manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+
+    async def events():
+        while True:
+            job = scan_jobs.manager.get(job_id)
+            yield scan_jobs.format_event(job)
+            if job["status"] != scan_jobs.STATUS_RUNNING or await request.is_disconnected():
+                break
+            await asyncio.sleep(scan_jobs.STREAM_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/scan/{job_id}/cancel")
+def cancel_scan(job_id: str):
+    """Asks a running scan to stop after the file it is processing."""
+    if not scan_jobs.manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No running scan with this ID")
+    return {"message": "Scan cancellation requested."}
 
 @app.get("/api/images")
-def get_all_images(page: int = 1, limit: int = 50, query: Optional[str] = None, sort_by: str = "random", platform_filter: str = "all"):
-    """Retrieves a paginated list of images, with optional search, sorting and platform filtering."""
+def get_all_images(page: int = 1, limit: int = 50, query: Optional[str] = None, sort_by: str = "random", platform_filter: str = "all",
+                   tags_all: Optional[str] = None, tags_any: Optional[str] = None, tags_none: Optional[str] = None,
+                   cursor: Optional[str] = None, seed: Optional[int] = None, with_total: bool = True,
+                   param_filters: Optional[list[str]] = Query(None, alias="filter")):
+    """
+    Retrieves a paginated list of images, with optional search, sorting and platform filtering.
+    tags_all / tags_any / tags_none take comma-separated tags: images must have every tag,
+    at least one tag, or none of the tags respectively.
+    Pass the returned next_cursor as cursor to fetch the following page.
+    Random order is fixed per seed (returned with the first page, optional to pass in).
+    with_total=false skips the total count on follow-up pages; use has_more instead.
+    filter takes generation parameter conditions such as steps>=28, sampler=k_euler_ancestral
+    or width=832 (repeat the parameter or separate with commas); sort_by also accepts
+    <parameter>_asc / <parameter>_desc, e.g. steps_desc.
+    """
     try:
-        result = database.get_images(page, limit, query, sort_by, platform_filter)
-        config = get_config(mount_images=False)
-        if config:
-            base_path = config["des_file_path"]
-            for img in result["images"]:
-                if os.path.exists(img["filepath"]):
-                    relative_path = os.path.relpath(img["filepath"], base_path)
-                    img["filepath"] = "/images/" + relative_path.replace("\\", "/")
-                else:
-                    img["filepath"] = "/static/placeholder.png" # Placeholder for missing files
+        result = database.get_images(page, limit, query, sort_by, platform_filter,
+                                     tags.parse_tag_list(tags_all), tags.parse_tag_list(tags_any),
+                                     tags.parse_tag_list(tags_none), cursor, seed, with_total,
+                                     generation_params.parse_param_filters(param_filters))
+        for img in result["images"]:
+            version = thumbnails.thumbnail_version(img["filepath"], img["makeTime"], img.pop("content_hash"))
+            img["thumbnail"] = thumbnails.thumbnail_url(img["no"], version=version)
+            img["filepath"] = image_url(img["filepath"], img["missing"], version)
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve images: {e}")
 
+@app.get("/api/stats")
+def get_stats(query: Optional[str] = None, platform_filter: str = "all", tags_all: Optional[str] = None,
+              tags_any: Optional[str] = None, tags_none: Optional[str] = None,
+              param_filters: Optional[list[str]] = Query(None, alias="filter")):
+    """
+    Returns image counts per platform, sampler, resolution and day for the same
+    filters /api/images takes. Unfiltered counts come from maintained aggregates.
+    """
+    try:
+        return database.get_stats(query, platform_filter, tags.parse_tag_list(tags_all),
+                                  tags.parse_tag_list(tags_any), tags.parse_tag_list(tags_none),
+                                  generation_params.parse_param_filters(param_filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve stats: {e}")
+
+@app.post("/api/images/reshuffle")
+def reshuffle_images():
+    """Re-rolls the stored random keys so every seed yields a new random order."""
+    database.reroll_random_keys()
+    return {"message": "Random order re-rolled."}
+
 @app.get("/api/images/{image_id}")
 def get_single_image(image_id: int):
     """Retrieves detailed information for a single image."""
@@ -143,31 +298,179 @@ def get_single_image(image_id: int):
         if image is None:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        config = get_config(mount_images=False)
-        if config:
-            base_path = config["des_file_path"]
-            if os.path.exists(image["filepath"]):
-                relative_path = os.path.relpath(image["filepath"], base_path)
-                image["filepath"] = "/images/" + relative_path.replace("\\", "/")
-            else:
-                image["filepath"] = "/static/placeholder.png"
-        
+        version = thumbnails.thumbnail_version(image["filepath"], image["makeTime"], image["content_hash"])
+        image["thumbnail"] = thumbnails.thumbnail_url(image["no"], version=version)
+        image["filepath"] = image_url(image["filepath"], image["missing"], version)
         return image
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve image details: {e}")
 
-@app.delete("/api/images/batch")
-async def delete_images_batch(request: DeleteRequest):
+def image_summaries(image_nos, distances=None):
+    """List entries (with versioned thumbnail and image URLs) for image numbers, in the given order."""
+    summaries = database.get_image_summaries(image_nos)
+    images = []
+    for no in image_nos:
+        img = summaries.get(no)
+        if img is None:
+            continue
+        version = thumbnails.thumbnail_version(img["filepath"], img["makeTime"], img.pop("content_hash"))
+        img["thumbnail"] = thumbnails.thumbnail_url(img["no"], version=version)
+        img["filepath"] = image_url(img["filepath"], img["missing"], version)
+        if distances is not None:
+            img["distance"] = distances[no]
+        images.append(img)
+    return images
+
+@app.get("/api/images/{image_id}/similar")
+def get_similar_images(image_id: int, distance: int = image_hash.SIMILAR_DISTANCE, limit: int = 50):
+    """
+    Returns images whose perceptual hash is within distance bits (0-16) of this
+    image's, nearest first. Near-identical regenerations are usually within 8.
+    """
+    if not 0 <= distance <= image_hash.MAX_SIMILAR_DISTANCE:
+        raise HTTPException(status_code=400, detail=f"distance must be between 0 and {image_hash.MAX_SIMILAR_DISTANCE}")
+    image = database.get_image_by_id(image_id)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if image["phash"] is None:
+        raise HTTPException(status_code=409, detail="This image has not been hashed yet.")
+    matches = [(no, d) for no, d in image_hash.get_index().neighbors(image["phash"], distance) if no != image_id]
+    matches = matches[:limit]
+    return {"image_id": image_id, "distance": distance,
+            "images": image_summaries([no for no, _ in matches], dict(matches))}
+
+@app.get("/api/images/{image_id}/similar-prompts")
+def get_similar_prompt_images(image_id: int, limit: int = 20):
+    """
+    Returns images whose prompt tags overlap most with this image's (Jaccard
+    similarity of the tag sets), found through the MinHash LSH index.
+    """
+    if database.get_image_summaries([image_id]).get(image_id) is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    matches = dict(database.get_similar_prompt_images(image_id, max(1, min(limit, 100))))
+    images = image_summaries(list(matches))
+    for img in images:
+        img["similarity"] = round(matches[img["no"]], 4)
+    return {"image_id": image_id, "images": images}
+
+@app.get("/api/duplicates")
+def get_duplicate_clusters(distance: int = image_hash.DUPLICATE_DISTANCE, limit: int = 100):
+    """
+    Reports groups of near-duplicate images across the library: images are
+    grouped when their perceptual hashes are within distance bits (0-7),
+    directly or through other images of the group. Largest groups first.
+    """
+    if not 0 <= distance <= image_hash.MAX_DUPLICATE_DISTANCE:
+        raise HTTPException(status_code=400, detail=f"distance must be between 0 and {image_hash.MAX_DUPLICATE_DISTANCE}")
+    clusters = image_hash.find_duplicate_clusters(image_hash.get_index(), distance)
+    return {
+        "distance": distance,
+        "total_clusters": len(clusters),
+        "total_images": sum(len(cluster) for cluster in clusters),
+        "clusters": [{"size": len(cluster), "images": image_summaries(cluster)} for cluster in clusters[:limit]],
+    }
+
+@app.post("/api/integrity/sweep")
+def sweep_library():
+    """Starts a background check that flags images whose files are missing."""
+    start_integrity_sweep()
+    return {"message": "Integrity sweep started in the background."}
+
+@app.get("/api/thumbnails/{image_id}")
+def get_thumbnail(image_id: int, request: Request, size: str = thumbnails.DEFAULT_THUMBNAIL_SIZE,
+                  v: Optional[str] = None):
+    """
+    Serves a cached thumbnail of an image, generating it on first request.
+    The ETag is the thumbnail cache key, so a revalidation is answered with 304
+    before any thumbnail work. Versioned URLs (v matching the image) are immutable.
+    """
+    if size not in thumbnails.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown thumbnail size: {size}")
+    image = database.get_image_by_id(image_id)
+    filepath = resolve_image_path(image["filepath"]) if image else None
+    try:
+        stat_result = os.stat(filepath) if filepath else None
+    except OSError:
+        stat_result = None
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    key = thumbnails.thumbnail_key(filepath, size, stat_result)
+    versioned = v is not None and v == thumbnails.thumbnail_version(image["filepath"], image["makeTime"],
+                                                                    image["content_hash"])
+    cache_control = http_cache.IMMUTABLE_CACHE_CONTROL if versioned else http_cache.REVALIDATE_CACHE_CONTROL
+    etag = http_cache.strong_etag(key)
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        try:
+            http_cache.transfer_stats.record_not_modified(os.path.getsize(thumbnails.cache.path_for(key)))
+        except OSError:
+            http_cache.transfer_stats.record_not_modified(0)
+        return http_cache.not_modified_response({"etag": etag, "cache-control": cache_control})
     try:
-        filepaths = database.delete_images_by_ids(request.image_ids)
-        deleted_count = 0
-        for filepath in filepaths:
-            if os.path.exists(filepath):
-                send2trash.send2trash(filepath)
-                deleted_count += 1
-                print(f"파일을 휴지통으로 이동했습니다: {filepath}")
-            else:
-                print(f"경고: 파일을 찾을 수 없어 휴지통으로 이동하지 못했습니다: {filepath}")
-        return {"message": f"{len(request.image_ids)}개의 레코드를 데이터베이스에서 삭제하고, {deleted_count}개의 파일을 휴지통으로 이동했습니다."}
+        path = thumbnails.cache.get_or_create(filepath, size, key)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"이미지 삭제 실패: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to create thumbnail: {e}")
+    return http_cache.file_response(request.headers, path, os.stat(path), etag, cache_control,
+                                    media_type=thumbnails.THUMBNAIL_MEDIA_TYPE)
+
+@app.get("/api/cache/stats")
+def get_transfer_stats():
+    """Returns bytes sent for images and thumbnails and bytes saved by 304 responses."""
+    return http_cache.transfer_stats.snapshot()
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus text exposition: request latency per route, get_images query
+    time per query shape, scan stage timings and throughput, cache hit ratios.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def require_library_path():
+    config = get_config()
+    if not config or not config.get("des_file_path"):
+        raise HTTPException(status_code=400, detail="Configuration is not set properly.")
+    return config["des_file_path"]
+
+@app.delete("/api/images/batch")
+def delete_images_batch(request: DeleteRequest):
+    """
+    Starts deleting the images in the background and returns the deletion batch.
+    Files are kept in the library's trash folder until the batch is purged, so the batch can be restored.
+    """
+    job = deletion_jobs.manager.delete(request.image_ids, require_library_path())
+    return {"message": f"{job.total}개 이미지의 삭제를 시작했습니다.", "batch_id": job.id, "batch": job.to_dict()}
+
+@app.get("/api/deletions/{batch_id}")
+def get_deletion_batch(batch_id: str):
+    """Returns the status and counters of a deletion batch."""
+    batch = deletion_jobs.manager.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Deletion batch not found")
+    return batch
+
+@app.post("/api/deletions/{batch_id}/restore")
+def restore_deletion_batch(batch_id: str):
+    """
+    Moves the files and records of a deletion batch back into the library.
+    Answers 409 while a scan is running instead of waiting for it.
+    """
+    try:
+        job = deletion_jobs.manager.restore(batch_id, require_library_path())
+    except deletion_jobs.DeletionBatchUnavailable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion batch not found")
+    return {"message": "Restore started.", "batch": job.to_dict()}
+
+@app.delete("/api/deletions/{batch_id}")
+def purge_deletion_batch(batch_id: str):
+    """Sends the staged files of a deletion batch to the system trash. The batch can no longer be restored."""
+    try:
+        job = deletion_jobs.manager.purge(batch_id, require_library_path())
+    except deletion_jobs.DeletionBatchUnavailable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion batch not found")
+    return {"message": "Purge started.", "batch": job.to_dict()}
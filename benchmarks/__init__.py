@@ -0,0 +1,8 @@
+"""
+성능 벤치마크 모음.
+
+    python -m benchmarks.corpus <출력 폴더>     합성 AI 이미지 코퍼스 생성
+    python -m benchmarks.run [--output a.json]  전체 스위트 실행 (결과는 JSON)
+    python benchmarks/bench_stealth.py          stealth 디코더: 기존 구현과 비교
+    python benchmarks/bench_png_reader.py       PNG 메타데이터 추출: 기존 구현과 비교
+"""
@@ -0,0 +1,141 @@
+"""
+PNG 메타데이터 추출 벤치마크.
+
+PIL로 파일을 열어 img.info를 읽고 stealth 정보를 위해 픽셀 전체를 불러오던 기존 방식
+(아래 legacy_extract_metadata)과 png_reader 기반의 image_processing.extract_image_info를
+같은 파일들로 실행해 플랫폼/메타데이터가 같은지 확인하고 파일당 걸린 시간을 비교합니다.
+
+사용법 (프로젝트 루트에서):
+    python benchmarks/bench_png_reader.py [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_processing  # noqa: E402
+from bench_stealth import embed_stealth_info, sample_metadata  # noqa: E402
+
+
+def legacy_extract_metadata(image_path):
+    """기존 extract_image_info의 플랫폼 판별 + 메타데이터 추출 부분. (PIL, stealth 디코딩 두 번)"""
+    metadata_dict = {}
+    with Image.open(image_path) as img:
+        platform = image_processing.check_platform_name(img)
+        if image_processing.check_img_width(img) <= 2000:
+            raw_metadata = img.info
+            if 'Comment' in raw_metadata:
+                metadata_dict.update(json.loads(raw_metadata['Comment']))
+                metadata_dict['Software'] = raw_metadata.get('Software', 'NovelAI')
+                metadata_dict['Source'] = raw_metadata.get('Source')
+                metadata_dict['Title'] = raw_metadata.get('Title')
+            elif 'parameters' in raw_metadata:
+                metadata_dict['prompt'] = raw_metadata['parameters']
+                metadata_dict['Software'] = 'StableDiffusion'
+            else:
+                stealth_info = image_processing.read_info_from_image_stealth(img)
+                if stealth_info:
+                    full_info = json.loads(stealth_info)
+                    metadata_dict.update(json.loads(full_info.get('Comment', '{}')))
+                    metadata_dict['Software'] = full_info.get('Software')
+                    metadata_dict['Source'] = full_info.get('Source')
+    return platform, metadata_dict
+
+
+def extract_metadata(image_path):
+    # 지각 해시는 기존 방식에 없던 작업이므로 비교에서 제외합니다.
+    image_info = image_processing.extract_image_info(image_path, with_hash=False, with_content_hash=False)
+    return image_info['platform'], image_info['metadata']
+
+
+def _text_info(**chunks):
+    info = PngImagePlugin.PngInfo()
+    for key, (value, kind) in chunks.items():
+        if kind == 'zTXt':
+            info.add_text(key, value, zip=True)
+        elif kind == 'iTXt':
+            info.add_itxt(key, value, zip=True)
+        else:
+            info.add_text(key, value)
+    return info
+
+
+def build_corpus(directory, width, height):
+    """
+    대표적인 파일들을 directory에 저장하고 [(이름, 경로)]를 반환합니다.
+    NovelAI / SD 텍스트 청크, 네 가지 stealth 서명, 메타데이터 없는 파일,
+    픽셀을 읽지 않아도 되는 형식(팔레트, 흑백)과 PIL로 처리되는 파일(작은 이미지, JPEG)을 포함합니다.
+    """
+    rng = np.random.default_rng(0)
+    base = Image.fromarray(rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8), 'RGBA')
+    metadata = json.loads(sample_metadata(0))
+    cases = {
+        'novelai_text': (base, dict(pnginfo=_text_info(
+            Comment=(metadata['Comment'], 'tEXt'), Software=('NovelAI', 'tEXt'), Source=(metadata['Source'], 'tEXt')))),
+        'novelai_ztxt': (base, dict(pnginfo=_text_info(
+            Comment=(metadata['Comment'], 'zTXt'), Title=('AI generated image', 'iTXt')))),
+        'sd_parameters': (base.convert('RGB'), dict(pnginfo=_text_info(
+            parameters=('masterpiece, 1girl\nNegative prompt: lowres\nSteps: 20, Seed: 1', 'iTXt')))),
+        'no_metadata_rgba': (base, {}),
+        'no_metadata_rgb': (base.convert('RGB'), {}),
+        'palette': (base.convert('RGB').quantize(64), {}),
+        'grayscale_alpha': (base.convert('LA'), dict(pnginfo=_text_info(Software=('x', 'tEXt')))),
+        'small': (base.crop((0, 0, 64, 64)), {}),
+    }
+    for index, signature in enumerate(('stealth_pnginfo', 'stealth_pngcomp', 'stealth_rgbinfo', 'stealth_rgbcomp')):
+        cases[signature] = (embed_stealth_info(base, sample_metadata(index), signature), {})
+
+    corpus = []
+    for name, (image, save_args) in cases.items():
+        path = os.path.join(directory, f"{name}.png")
+        image.save(path, **save_args)
+        corpus.append((name, path))
+    # PNG가 아닌 파일은 PIL로 처리됩니다.
+    path = os.path.join(directory, "jpeg_named_png.png")
+    base.convert('RGB').save(path, 'JPEG')
+    corpus.append(('jpeg_named_png', path))
+    return corpus
+
+
+def timed(func, path, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = func(path)
+        except Exception as e:
+            result = f"error: {type(e).__name__}"
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--width', type=int, default=832)
+    parser.add_argument('--height', type=int, default=1216)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = build_corpus(directory, args.width, args.height)
+        print(f"{'case':<18}{'legacy (ms)':>14}{'chunks (ms)':>14}{'speedup':>10}  identical")
+        for name, path in corpus:
+            legacy_time, legacy_result = timed(legacy_extract_metadata, path, args.repeat)
+            new_time, new_result = timed(extract_metadata, path, args.repeat)
+            identical = legacy_result == new_result
+            print(f"{name:<18}{legacy_time * 1000:>14.2f}{new_time * 1000:>14.2f}"
+                  f"{legacy_time / new_time:>9.1f}x  {identical}")
+            if not identical:
+                sys.exit(f"metadata mismatch for {name}: {legacy_result!r} != {new_result!r}")
+
+
+if __name__ == '__main__':
+    main()
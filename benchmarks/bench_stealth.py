@@ -0,0 +1,216 @@
+"""
+stealth pnginfo 디코더 벤치마크.
+
+기존의 픽셀 단위 디코더(아래 legacy_read_info_from_image_stealth)와
+image_processing.read_info_from_image_stealth(NumPy 디코더)를 같은 이미지로 실행해
+결과가 바이트 단위로 같은지 확인하고 걸린 시간을 비교합니다.
+
+사용법 (프로젝트 루트에서):
+    python benchmarks/bench_stealth.py [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_processing  # noqa: E402
+
+
+def legacy_read_info_from_image_stealth(image):
+    """numpy 디코더 도입 이전의 픽셀 단위 구현 (비교 기준)."""
+    width, height = image.size
+    pixels = image.load()
+
+    has_alpha = True if image.mode == 'RGBA' else False
+    mode = None
+    compressed = False
+    binary_data = ''
+    buffer_a = ''
+    buffer_rgb = ''
+    index_a = 0
+    index_rgb = 0
+    sig_confirmed = False
+    confirming_signature = True
+    reading_param_len = False
+    reading_param = False
+    read_end = False
+    never_confirmed = True
+    for x in range(width):
+        for y in range(height):
+            if has_alpha:
+                r, g, b, a = pixels[x, y]
+                buffer_a += str(a & 1)
+                index_a += 1
+            else:
+                r, g, b = pixels[x, y]
+            buffer_rgb += str(r & 1)
+            buffer_rgb += str(g & 1)
+            buffer_rgb += str(b & 1)
+            index_rgb += 3
+            if confirming_signature:
+                if x * height + y > 120 and never_confirmed:
+                    return ''
+                if index_a == len('stealth_pnginfo') * 8:
+                    decoded_sig = bytearray(int(buffer_a[i:i + 8], 2) for i in
+                                            range(0, len(buffer_a), 8)).decode('utf-8', errors='ignore')
+                    if decoded_sig in {'stealth_pnginfo', 'stealth_pngcomp'}:
+                        confirming_signature = False
+                        sig_confirmed = True
+                        reading_param_len = True
+                        mode = 'alpha'
+                        if decoded_sig == 'stealth_pngcomp':
+                            compressed = True
+                        buffer_a = ''
+                        index_a = 0
+                        never_confirmed = False
+                    else:
+                        read_end = True
+                        break
+                elif index_rgb == len('stealth_pnginfo') * 8:
+                    decoded_sig = bytearray(int(buffer_rgb[i:i + 8], 2) for i in
+                                            range(0, len(buffer_rgb), 8)).decode('utf-8', errors='ignore')
+                    if decoded_sig in {'stealth_rgbinfo', 'stealth_rgbcomp'}:
+                        confirming_signature = False
+                        sig_confirmed = True
+                        reading_param_len = True
+                        mode = 'rgb'
+                        if decoded_sig == 'stealth_rgbcomp':
+                            compressed = True
+                        buffer_rgb = ''
+                        index_rgb = 0
+                        never_confirmed = False
+            elif reading_param_len:
+                if mode == 'alpha':
+                    if index_a == 32:
+                        param_len = int(buffer_a, 2)
+                        reading_param_len = False
+                        reading_param = True
+                        buffer_a = ''
+                        index_a = 0
+                else:
+                    if index_rgb == 33:
+                        pop = buffer_rgb[-1]
+                        buffer_rgb = buffer_rgb[:-1]
+                        param_len = int(buffer_rgb, 2)
+                        reading_param_len = False
+                        reading_param = True
+                        buffer_rgb = pop
+                        index_rgb = 1
+            elif reading_param:
+                if mode == 'alpha':
+                    if index_a == param_len:
+                        binary_data = buffer_a
+                        read_end = True
+                        break
+                else:
+                    if index_rgb >= param_len:
+                        diff = param_len - index_rgb
+                        if diff < 0:
+                            buffer_rgb = buffer_rgb[:diff]
+                        binary_data = buffer_rgb
+                        read_end = True
+                        break
+            else:
+                read_end = True
+                break
+        if read_end:
+            break
+    geninfo = ''
+    if sig_confirmed and binary_data != '':
+        byte_data = bytearray(int(binary_data[i:i + 8], 2) for i in range(0, len(binary_data), 8))
+        try:
+            if compressed:
+                decoded_data = gzip.decompress(bytes(byte_data)).decode('utf-8')
+            else:
+                decoded_data = byte_data.decode('utf-8', errors='ignore')
+            geninfo = decoded_data
+        except:
+            pass
+    return str(geninfo)
+
+
+def embed_stealth_info(image, text, signature):
+    """text를 signature 방식으로 image의 LSB에 숨긴 새 이미지를 반환합니다."""
+    mode = 'alpha' if signature.startswith('stealth_png') else 'rgb'
+    payload = text.encode('utf-8')
+    if signature.endswith('comp'):
+        payload = gzip.compress(payload, mtime=0)  # 고정 헤더: 같은 입력이면 같은 파일
+    bits = np.unpackbits(np.frombuffer(
+        signature.encode('utf-8') + (len(payload) * 8).to_bytes(4, 'big') + payload, dtype=np.uint8))
+
+    image = image.convert('RGBA' if mode == 'alpha' else 'RGB')
+    width, height = image.size
+    # 열 우선 순서로 LSB를 채운 뒤 원래 배열 모양으로 되돌립니다.
+    data = np.array(image).transpose(1, 0, 2).copy()
+    plane = data[..., 3:4] if mode == 'alpha' else data[..., :3]
+    flat = plane.reshape(-1)
+    if bits.size > flat.size:
+        raise ValueError("payload does not fit in image")
+    flat[:bits.size] = (flat[:bits.size] & 0xFE) | bits
+    if mode == 'alpha':
+        data[..., 3] = flat.reshape(width, height)
+    else:
+        data[..., :3] = flat.reshape(width, height, 3)
+    return Image.fromarray(data.transpose(1, 0, 2))
+
+
+def sample_metadata(seed):
+    rng = np.random.default_rng(seed)
+    tags = ', '.join(f"tag_{int(t)}" for t in rng.integers(0, 5000, size=80))
+    comment = {
+        "prompt": tags,
+        "uc": "lowres, bad anatomy, bad hands, text, error",
+        "steps": 28, "seed": int(rng.integers(0, 2 ** 32)), "scale": 5.0,
+        "sampler": "k_euler_ancestral", "width": 832, "height": 1216,
+    }
+    return json.dumps({"Comment": json.dumps(comment), "Software": "NovelAI", "Source": "NovelAI Diffusion V4"})
+
+
+def build_cases(width, height):
+    rng = np.random.default_rng(0)
+    base = Image.fromarray(rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8), 'RGBA')
+    cases = []
+    for index, signature in enumerate(('stealth_pnginfo', 'stealth_pngcomp', 'stealth_rgbinfo', 'stealth_rgbcomp')):
+        cases.append((signature, embed_stealth_info(base, sample_metadata(index), signature)))
+    cases.append(('no_stealth_rgba', base.copy()))
+    cases.append(('no_stealth_rgb', base.convert('RGB')))
+    return cases
+
+
+def timed(func, image, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(image)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--width', type=int, default=832)
+    parser.add_argument('--height', type=int, default=1216)
+    args = parser.parse_args()
+
+    print(f"{'case':<18}{'legacy (ms)':>14}{'numpy (ms)':>14}{'speedup':>10}  identical")
+    for name, image in build_cases(args.width, args.height):
+        image.load()
+        legacy_time, legacy_result = timed(legacy_read_info_from_image_stealth, image, args.repeat)
+        numpy_time, numpy_result = timed(image_processing.read_info_from_image_stealth, image, args.repeat)
+        identical = legacy_result.encode('utf-8') == numpy_result.encode('utf-8')
+        print(f"{name:<18}{legacy_time * 1000:>14.2f}{numpy_time * 1000:>14.2f}"
+              f"{legacy_time / numpy_time:>9.1f}x  {identical}")
+        if not identical:
+            sys.exit(f"decoder mismatch for {name}")
+
+
+if __name__ == '__main__':
+    main()
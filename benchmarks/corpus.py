@@ -0,0 +1,136 @@
+"""
+벤치마크용 합성 AI 이미지 코퍼스 생성기.
+
+같은 seed와 인자로 실행하면 항상 같은 파일(이름, 내용, 수정 시각)을 만듭니다.
+image_processing이 처리하는 메타데이터 경로를 모두 포함합니다:
+NovelAI Comment 청크, SD parameters, alpha / RGB stealth (평문, gzip),
+너비 2000 초과(메타데이터를 읽지 않음), 메타데이터 없음.
+
+사용법 (프로젝트 루트에서):
+    python -m benchmarks.corpus <출력 폴더> [--per-kind 4] [--seed 0]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.bench_stealth import embed_stealth_info  # noqa: E402
+
+KINDS = ('novelai', 'sd_parameters', 'stealth_pnginfo', 'stealth_pngcomp', 'stealth_rgbinfo', 'stealth_rgbcomp',
+         'wide', 'no_metadata')
+STEALTH_KINDS = ('stealth_pnginfo', 'stealth_pngcomp', 'stealth_rgbinfo', 'stealth_rgbcomp')
+# 메타데이터를 읽지 않는 너비 기준(2000)을 넘는 크기
+WIDE_SIZE = (2048, 512)
+# 파일 수정 시각(= makeTime) 기준. 파일마다 1분씩 늘어납니다.
+CORPUS_EPOCH = 1735689600  # 2025-01-01 00:00:00 UTC
+
+# 프롬프트 어휘: 자주 쓰이는 태그와 드물게 쓰이는 번호 태그를 섞어 태그 필터/검색이 의미 있게 합니다.
+COMMON_TAGS = ('1girl', 'solo', 'long hair', 'smile', 'looking at viewer', 'blue eyes', 'outdoors', 'cat ears',
+               'school uniform', 'night', 'sky', 'flower', 'masterpiece', 'best quality', 'upper body')
+SAMPLERS = ('k_euler', 'k_euler_ancestral', 'k_dpmpp_2m', 'ddim')
+SD_SAMPLERS = ('Euler a', 'DPM++ 2M Karras', 'DDIM')
+NEGATIVE_PROMPT = 'lowres, bad anatomy, bad hands, text, error'
+
+
+def random_prompt(rng):
+    common = rng.choice(len(COMMON_TAGS), size=int(rng.integers(4, 10)), replace=False)
+    rare = rng.integers(0, 2000, size=int(rng.integers(5, 20)))
+    return ', '.join([COMMON_TAGS[i] for i in common] + [f"tag_{int(t)}" for t in rare])
+
+
+def novelai_info(rng, width, height):
+    """NovelAI가 저장하는 형식의 {'Comment', 'Software', 'Source'} 텍스트 청크 값."""
+    comment = {
+        "prompt": random_prompt(rng),
+        "uc": NEGATIVE_PROMPT,
+        "steps": int(rng.choice([20, 28, 50])),
+        "seed": int(rng.integers(0, 2 ** 32)),
+        "scale": float(rng.choice([5.0, 6.0, 7.5])),
+        "sampler": str(rng.choice(SAMPLERS)),
+        "width": width,
+        "height": height,
+        "cfg_rescale": float(rng.choice([0.0, 0.2])),
+    }
+    return {"Comment": json.dumps(comment), "Software": "NovelAI", "Source": "NovelAI Diffusion V4"}
+
+
+def sd_parameters(rng, width, height):
+    return (f"{random_prompt(rng)}\nNegative prompt: {NEGATIVE_PROMPT}\n"
+            f"Steps: {int(rng.choice([20, 30]))}, Sampler: {rng.choice(SD_SAMPLERS)}, "
+            f"CFG scale: {float(rng.choice([6.0, 7.0]))}, Seed: {int(rng.integers(0, 2 ** 32))}, "
+            f"Size: {width}x{height}")
+
+
+def synthetic_pixels(rng, width, height):
+    """
+    생성 이미지와 비슷하게 압축되도록 저해상도 노이즈를 부드럽게 확대하고 약한 노이즈를 더한 RGBA 이미지.
+    (완전한 랜덤 노이즈는 실제 PNG보다 몇 배 크게 저장됩니다)
+    """
+    coarse = Image.fromarray(rng.integers(0, 256, size=(max(1, height // 64), max(1, width // 64), 3),
+                                          dtype=np.uint8), 'RGB')
+    smooth = np.asarray(coarse.resize((width, height), Image.Resampling.BICUBIC), dtype=np.int16)
+    noisy = np.clip(smooth + rng.integers(-4, 5, size=smooth.shape), 0, 255).astype(np.uint8)
+    alpha = np.full((height, width, 1), 255, dtype=np.uint8)
+    return Image.fromarray(np.concatenate([noisy, alpha], axis=2), 'RGBA')
+
+
+def _text_chunks(values):
+    info = PngImagePlugin.PngInfo()
+    for key, value in values.items():
+        info.add_text(key, value)
+    return info
+
+
+def make_image(kind, rng, width, height):
+    """kind에 해당하는 (PIL 이미지, save 인자)를 만듭니다."""
+    if kind == 'wide':
+        width, height = WIDE_SIZE
+    image = synthetic_pixels(rng, width, height)
+    if kind == 'novelai' or kind == 'wide':
+        return image, {'pnginfo': _text_chunks(novelai_info(rng, width, height))}
+    if kind == 'sd_parameters':
+        return image.convert('RGB'), {'pnginfo': _text_chunks({'parameters': sd_parameters(rng, width, height)})}
+    if kind in STEALTH_KINDS:
+        return embed_stealth_info(image, json.dumps(novelai_info(rng, width, height)), kind), {}
+    if kind == 'no_metadata':
+        return image.convert('RGB'), {}
+    raise ValueError(f"Unknown corpus kind: {kind}")
+
+
+def generate_corpus(directory, per_kind=4, seed=0, width=832, height=1216, kinds=KINDS):
+    """
+    directory에 kind마다 per_kind개의 PNG를 만들고 [(kind, 경로)]를 반환합니다.
+    파일 이름은 "<kind>_<번호>.png"이며 수정 시각도 고정됩니다.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for kind in kinds:
+        for index in range(per_kind):
+            image, save_args = make_image(kind, rng, width, height)
+            path = os.path.join(directory, f"{kind}_{index:03d}.png")
+            image.save(path, **save_args)
+            mtime = CORPUS_EPOCH + 60 * len(corpus)
+            os.utime(path, (mtime, mtime))
+            corpus.append((kind, path))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--per-kind', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=832)
+    parser.add_argument('--height', type=int, default=1216)
+    args = parser.parse_args()
+    corpus = generate_corpus(args.directory, args.per_kind, args.seed, args.width, args.height)
+    print(f"{len(corpus)} files written to {args.directory}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+전체 벤치마크 스위트.
+
+benchmarks.corpus로 임시 폴더에 합성 코퍼스를 만든 뒤 아래 스위트를 실행하고
+케이스별 실행 시간(ms) 요약을 JSON으로 출력합니다. 진행 상황과 표는 stderr로 나갑니다.
+
+    process_image  파일 하나의 처리 (메타데이터 추출, 해시, 이동), 코퍼스 종류별
+    stealth        read_info_from_image_stealth (픽셀 로딩 제외), 코퍼스 종류별
+    scan           scan_and_process_images 전체 (워커 1개 / 기본 워커 수), 초당 이미지 수 포함
+    get_images     database.get_images의 정렬/필터 조합과 깊은 페이지 (합성 행 --rows개)
+    api            FastAPI 엔드포인트 (TestClient, 코퍼스를 스캔한 라이브러리)
+
+사용법 (프로젝트 루트에서):
+    python -m benchmarks.run [--suite get_images --suite api] [--repeat 5] [--rows 20000]
+                             [--output result.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import PIL
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import database  # noqa: E402
+import image_processing  # noqa: E402
+import scanner  # noqa: E402
+import tags  # noqa: E402
+import thumbnails  # noqa: E402
+from benchmarks import corpus  # noqa: E402
+
+SUITES = ('process_image', 'stealth', 'scan', 'get_images', 'api')
+
+
+def summarize(samples):
+    """초 단위 측정값 목록을 ms 단위 요약으로 바꿉니다."""
+    ms = [sample * 1000 for sample in samples]
+    return {
+        "runs": len(ms),
+        "min_ms": round(min(ms), 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def measure(func, repeat, setup=None):
+    """
+    func를 repeat번 실행한 시간 목록(초)을 반환합니다.
+    setup(i)이 있으면 매 실행 전에 (시간 측정 밖에서) 호출하고, 반환값을 func의 인자로 넘깁니다.
+    """
+    samples = []
+    for i in range(repeat):
+        args = setup(i) if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def use_database(path):
+    """벤치마크 전용 DB로 전환합니다. (스레드별 연결은 DB_FILE이 바뀌면 다시 열립니다)"""
+    database.DB_FILE = path
+    database.create_table_if_not_exists()
+    # 이전 DB 기준으로 계산된 개수 캐시와 해시 색인을 무효화합니다.
+    database._bump_generation()
+
+
+def corpus_by_kind(files):
+    grouped = {}
+    for kind, path in files:
+        grouped.setdefault(kind, []).append(path)
+    return grouped
+
+
+def suite_process_image(workdir, files, args):
+    results = {}
+    for kind, paths in corpus_by_kind(files).items():
+        samples = []
+        for rep in range(args.repeat):
+            # 매 반복마다 새 원본 사본과 빈 대상 폴더를 써서 이름 충돌 없이 같은 작업을 측정합니다.
+            source_dir = os.path.join(workdir, 'process_image', kind, str(rep), 'source')
+            dest_dir = os.path.join(workdir, 'process_image', kind, str(rep), 'library')
+            os.makedirs(source_dir)
+            copies = [shutil.copy2(path, source_dir) for path in paths]
+            samples += measure(lambda path: image_processing.process_image(path, dest_dir), len(copies),
+                               setup=lambda i: (copies[i],))
+        results[kind] = summarize(samples)
+    return results
+
+
+def suite_stealth(workdir, files, args):
+    results = {}
+    for kind, paths in corpus_by_kind(files).items():
+        images = []
+        for path in paths:
+            with Image.open(path) as img:
+                img.load()
+                images.append(img.copy())
+        samples = []
+        for _ in range(args.repeat):
+            samples += measure(image_processing.read_info_from_image_stealth, len(images),
+                               setup=lambda i: (images[i],))
+        results[kind] = summarize(samples)
+    return results
+
+
+def suite_scan(workdir, files, args):
+    results = {}
+    worker_counts = sorted({1, scanner.resolve_worker_count(None)})
+    for workers in worker_counts:
+        def setup(rep):
+            run_dir = os.path.join(workdir, 'scan', f"{workers}_{rep}")
+            source_dir = os.path.join(run_dir, 'source')
+            os.makedirs(source_dir)
+            for _, path in files:
+                shutil.copy2(path, source_dir)
+            use_database(os.path.join(run_dir, 'gallery.db'))
+            return source_dir, os.path.join(run_dir, 'library')
+
+        samples = measure(lambda source, dest: scanner.scan_and_process_images(source, dest, workers),
+                          args.repeat, setup)
+        summary = summarize(samples)
+        summary["images_per_sec"] = round(len(files) / statistics.median(samples), 1)
+        results[f"workers_{workers}"] = summary
+    return results
+
+
+def synthetic_image_data(rng, index):
+    """DB 전용 합성 행. 파일은 만들지 않고 코퍼스와 같은 분포의 메타데이터만 씁니다."""
+    width, height = (832, 1216) if index % 3 else (1216, 832)
+    if index % 5 == 4:
+        platform_name = "StableDiffusion"
+        metadata = {"prompt": corpus.sd_parameters(rng, width, height), "Software": "StableDiffusion"}
+    else:
+        platform_name = "NovelAI"
+        info = corpus.novelai_info(rng, width, height)
+        metadata = {**json.loads(info["Comment"]), "Software": info["Software"], "Source": info["Source"]}
+    # 하루에 약 50장씩 나눠 makeTime(yymmddHHMMSS)을 만듭니다.
+    made = datetime.fromtimestamp(corpus.CORPUS_EPOCH + index * 1728, tz=timezone.utc)
+    return {
+        "new_path": f"{platform_name}/{made:%Y-%m-%d}/synthetic_{index:07d}.png",
+        "make_time": made.strftime('%y%m%d%H%M%S'),
+        "platform": platform_name,
+        "metadata": metadata,
+        "phash": int(rng.integers(-2 ** 63, 2 ** 63 - 1, dtype=np.int64)),
+        "content_hash": f"{index:064x}",
+    }
+
+
+GET_IMAGES_CASES = {
+    "random": dict(sort_by="random", seed=1),
+    "newest": dict(sort_by="desc"),
+    "oldest": dict(sort_by="asc"),
+    "platform_newest": dict(sort_by="desc", platform_filter="StableDiffusion"),
+    "search_relevance": dict(query="1girl", sort_by="relevance"),
+    "search_newest": dict(query="cat ears", sort_by="desc"),
+    "tags_all": dict(sort_by="desc", tags_all=tags.parse_tag_list("1girl, solo")),
+    "tags_any_none": dict(sort_by="desc", tags_any=tags.parse_tag_list("night, sky"),
+                          tags_none=tags.parse_tag_list("smile")),
+    "param_filter": dict(sort_by="desc", param_filters=[("steps", ">=", 28)]),
+    "param_sort": dict(sort_by="steps_desc"),
+    "param_filter_sort": dict(sort_by="scale_asc", param_filters=[("sampler", "=", "k_euler")]),
+}
+# 깊은 페이지 측정: 같은 위치를 커서와 OFFSET(page)으로 읽습니다.
+DEEP_PAGE = 100
+DEEP_PAGE_SORTS = ("desc", "random", "steps_desc")
+
+
+def suite_get_images(workdir, files, args):
+    use_database(os.path.join(workdir, 'get_images.db'))
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    with database.ImageInfoWriter(batch_size=2000) as writer:
+        for index in range(args.rows):
+            writer.add(synthetic_image_data(rng, index))
+    print(f"  inserted {args.rows} rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    results = {}
+    for name, kwargs in GET_IMAGES_CASES.items():
+        # cold: 세대를 올려 개수 캐시를 비운 첫 요청 / warm: 개수가 캐시된 반복 요청
+        results[f"{name}/cold"] = summarize(measure(lambda: database.get_images(limit=50, **kwargs), args.repeat,
+                                                    setup=lambda i: database._bump_generation() or ()))
+        results[f"{name}/warm"] = summarize(measure(lambda: database.get_images(limit=50, **kwargs), args.repeat))
+    # 행 수가 적으면 마지막 페이지까지만 내려갑니다.
+    deep_page = max(2, min(DEEP_PAGE, args.rows // 50))
+    for sort_by in DEEP_PAGE_SORTS:
+        cursor = None
+        for _ in range(deep_page - 1):
+            cursor = database.get_images(limit=50, sort_by=sort_by, seed=1, cursor=cursor,
+                                         with_total=False)["next_cursor"]
+        # 두 방식이 같은 페이지를 읽는지 먼저 확인합니다. (다르면 비교가 의미 없음)
+        by_cursor = database.get_images(limit=50, sort_by=sort_by, seed=1, cursor=cursor, with_total=False)
+        by_offset = database.get_images(page=deep_page, limit=50, sort_by=sort_by, seed=1, with_total=False)
+        if [img["no"] for img in by_cursor["images"]] != [img["no"] for img in by_offset["images"]]:
+            raise RuntimeError(f"{sort_by}: cursor and page={deep_page} return different pages")
+        results[f"{sort_by}/cursor_page_{deep_page}"] = summarize(measure(
+            lambda: database.get_images(limit=50, sort_by=sort_by, seed=1, cursor=cursor, with_total=False),
+            args.repeat))
+        results[f"{sort_by}/offset_page_{deep_page}"] = summarize(measure(
+            lambda: database.get_images(page=deep_page, limit=50, sort_by=sort_by, seed=1, with_total=False),
+            args.repeat))
+    return results
+
+
+def suite_api(workdir, files, args):
+    from fastapi.testclient import TestClient
+    # app은 static/, templates/를 상대 경로로 마운트합니다.
+    os.chdir(ROOT)
+    import app
+
+    api_dir = os.path.join(workdir, 'api')
+    source_dir = os.path.join(api_dir, 'source')
+    library_dir = os.path.join(api_dir, 'library')
+    os.makedirs(source_dir)
+    for _, path in files:
+        shutil.copy2(path, source_dir)
+    use_database(os.path.join(api_dir, 'gallery.db'))
+    scanner.scan_and_process_images(source_dir, library_dir, workers=1)
+    app.config_store.path = os.path.join(api_dir, 'config.json')
+    app.config_store.save({"image_file_path": source_dir, "des_file_path": library_dir, "scan_workers": 1})
+    thumbnail_dirs = iter(range(1_000_000))
+
+    def fresh_thumbnail_cache():
+        thumbnails.cache = thumbnails.ThumbnailCache(os.path.join(api_dir, 'thumbnails', str(next(thumbnail_dirs))))
+
+    fresh_thumbnail_cache()
+
+    results = {}
+    with TestClient(app.app) as client:
+        def get(url, headers=None, expected=200):
+            response = client.get(url, headers=headers)
+            if response.status_code != expected:
+                raise RuntimeError(f"GET {url} returned {response.status_code}: {response.text[:200]}")
+            return response
+
+        first_page = get("/api/images?sort_by=desc&limit=5").json()
+        image_id = first_page["images"][0]["no"]
+        image_path = first_page["images"][0]["filepath"]
+        thumbnail_url = first_page["images"][0]["thumbnail"]
+        urls = {
+            "images/newest": "/api/images?sort_by=desc&limit=50",
+            "images/random": "/api/images?sort_by=random&seed=1&limit=50",
+            "images/next_page": f"/api/images?sort_by=desc&limit=5&with_total=false&cursor={first_page['next_cursor']}",
+            "images/search": "/api/images?query=1girl&sort_by=relevance&limit=50",
+            "images/param_filter_sort": "/api/images?filter=steps>=28&sort_by=steps_desc&limit=50",
+            "image_detail": f"/api/images/{image_id}",
+            "stats": "/api/stats",
+            "stats/filtered": "/api/stats?tags_all=1girl",
+            "similar": f"/api/images/{image_id}/similar",
+            "similar_prompts": f"/api/images/{image_id}/similar-prompts",
+            "duplicates": "/api/duplicates",
+            "image_file": image_path,
+        }
+        for name, url in urls.items():
+            results[name] = summarize(measure(lambda: get(url), args.repeat))
+
+        # 썸네일: cold는 매번 빈 캐시에서 생성, warm은 캐시된 파일 전송, 304는 ETag 재검증
+        results["thumbnail/cold"] = summarize(measure(lambda: get(thumbnail_url), args.repeat,
+                                                      setup=lambda i: fresh_thumbnail_cache() or ()))
+        etag = get(thumbnail_url).headers["etag"]
+        results["thumbnail/warm"] = summarize(measure(lambda: get(thumbnail_url), args.repeat))
+        results["thumbnail/not_modified"] = summarize(measure(
+            lambda: get(thumbnail_url, headers={"If-None-Match": etag}, expected=304), args.repeat))
+    return results
+
+
+SUITE_FUNCTIONS = {
+    'process_image': suite_process_image,
+    'stealth': suite_stealth,
+    'scan': suite_scan,
+    'get_images': suite_get_images,
+    'api': suite_api,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def print_table(report, baseline=None):
+    """결과를 표로 stderr에 출력합니다. baseline이 있으면 중앙값 비율(현재 / 기준)도 표시합니다."""
+    for suite, cases in report["suites"].items():
+        print(f"\n[{suite}]", file=sys.stderr)
+        for case, summary in cases.items():
+            line = f"  {case:<40} median {summary['median_ms']:>10.3f} ms  (min {summary['min_ms']:.3f})"
+            if "images_per_sec" in summary:
+                line += f"  {summary['images_per_sec']} images/s"
+            old = (baseline or {}).get("suites", {}).get(suite, {}).get(case)
+            if old and old.get("median_ms"):
+                line += f"  x{summary['median_ms'] / old['median_ms']:.2f} vs baseline"
+            print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help="실행할 스위트 (여러 번 지정 가능, 기본값: 전체)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--per-kind', type=int, default=4, help="코퍼스의 종류별 이미지 수")
+    parser.add_argument('--width', type=int, default=832)
+    parser.add_argument('--height', type=int, default=1216)
+    parser.add_argument('--rows', type=int, default=20000, help="get_images 스위트의 합성 DB 행 수")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="결과 JSON을 저장할 파일 (기본값: stdout)")
+    parser.add_argument('--compare', help="비교할 이전 결과 JSON")
+    args = parser.parse_args()
+
+    if args.output:
+        args.output = os.path.abspath(args.output)  # api 스위트가 작업 폴더를 바꿉니다.
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = {"meta": {**environment(), "args": vars(args)}, "suites": {}}
+    with tempfile.TemporaryDirectory(prefix='gallery-bench-') as workdir:
+        print(f"Generating corpus ({args.per_kind} images per kind)...", file=sys.stderr)
+        files = corpus.generate_corpus(os.path.join(workdir, 'corpus'), args.per_kind, args.seed,
+                                       args.width, args.height)
+        # 스캔/DB 코드의 print가 JSON 출력에 섞이지 않도록 stderr로 돌립니다.
+        with contextlib.redirect_stdout(sys.stderr):
+            for suite in args.suite or SUITES:
+                print(f"Running {suite}...", file=sys.stderr)
+                report["suites"][suite] = SUITE_FUNCTIONS[suite](workdir, files, args)
+        database.close_db_connection()
+
+    print_table(report, baseline)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"\nResults written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import copy
+import json
+import os
+import threading
+import time
+
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import PlainTextResponse
+
+# How often (seconds) get() may stat the config file to notice external edits.
+CONFIG_RECHECK_INTERVAL = 1.0
+
+
+class SwappableStaticFiles:
+    """
+    ASGI app mounted once at /images that forwards to a StaticFiles instance
+    for the current destination directory. Changing the directory swaps the
+    instance instead of adding another mount to the router.
+    """
+
+    def __init__(self, static_files_class=StaticFiles):
+        self.static_files_class = static_files_class
+        self.directory = None
+        self._app = None
+
+    def set_directory(self, directory):
+        if directory == self.directory:
+            return
+        if directory and os.path.isdir(directory):
+            self._app = self.static_files_class(directory=directory)
+            self.directory = directory
+        else:
+            self._app = None
+            self.directory = None
+
+    async def __call__(self, scope, receive, send):
+        app = self._app
+        if app is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+            await response(scope, receive, send)
+            return
+        await app(scope, receive, send)
+
+
+class ConfigService:
+    """
+    Loads config.json once and serves the parsed config from memory.
+    The file is re-read only when its mtime changes (checked at most every
+    CONFIG_RECHECK_INTERVAL seconds) or when save() writes a new config.
+    Keeps the /images mount pointed at des_file_path.
+    """
+
+    def __init__(self, path, images_mount: SwappableStaticFiles):
+        self.path = path
+        self.images_mount = images_mount
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime_ns = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Returns a copy of the current config, or None if it has not been set up."""
+        now = time.monotonic()
+        if now - self._checked_at >= CONFIG_RECHECK_INTERVAL:
+            with self._lock:
+                self._checked_at = now
+                self._reload_if_changed()
+        config = self._config
+        return copy.deepcopy(config) if config is not None else None
+
+    def save(self, config_data: dict):
+        """Writes config_data to disk and makes it the current config."""
+        with self._lock:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(config_data, f, indent=4)
+            self._mtime_ns = os.stat(self.path).st_mtime_ns
+            self._checked_at = time.monotonic()
+            self._apply(config_data)
+
+    def _reload_if_changed(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._mtime_ns = None
+            self._apply(None)
+            return
+        if mtime_ns == self._mtime_ns:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            config_data = json.load(f)
+        self._mtime_ns = mtime_ns
+        self._apply(config_data)
+
+    def _apply(self, config_data):
+        self._config = config_data
+        self.images_mount.set_directory((config_data or {}).get("des_file_path"))
@@ -1,26 +1,190 @@
+import base64
+import functools
 import sqlite3
 import json
+import os
+import random
+import re
+import threading
+import time
+
+import generation_params
+import metrics
+import minhash
+import tags
 
 DB_FILE = "image_gallery.db"
 
+def _ensure_schema(cursor):
+    """필요한 테이블이 없으면 생성합니다."""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS NAIimgInfo
+                      (no INTEGER PRIMARY KEY AUTOINCREMENT,
+                       filepath TEXT NOT NULL UNIQUE,
+                       makeTime TEXT,
+                       platform TEXT,
+                       metadata TEXT,
+                       random_key INTEGER,
+                       missing INTEGER NOT NULL DEFAULT 0)''')
+    _ensure_column(cursor, "NAIimgInfo", "random_key", "INTEGER")
+    # 파일 존재 여부는 목록 조회 때가 아니라 무결성 점검(sweep_missing_files)에서 기록합니다.
+    _ensure_column(cursor, "NAIimgInfo", "missing", "INTEGER NOT NULL DEFAULT 0")
+    # 무작위 정렬용 키가 없는 기존 레코드에 키를 부여합니다.
+    cursor.execute("UPDATE NAIimgInfo SET random_key = random() WHERE random_key IS NULL")
+    # 시간순 키셋 페이지네이션용 색인 (전체 / 플랫폼별)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_maketime ON NAIimgInfo (makeTime, no)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_platform_maketime ON NAIimgInfo (platform, makeTime, no)")
+    # 무작위 정렬용 색인 (전체 / 플랫폼별)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_random ON NAIimgInfo (random_key, no)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_images_platform_random ON NAIimgInfo (platform, random_key, no)")
+    # 생성 파라미터(seed, steps 등) 컬럼: 필터/정렬을 json_extract 없이 색인으로 처리합니다.
+    params_added = False
+    for column, sql_type in generation_params.PARAM_COLUMNS.items():
+        params_added |= _ensure_column(cursor, "NAIimgInfo", column, sql_type)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_images_{column} ON NAIimgInfo ({column}, no)")
+    if params_added:
+        image_nos = [row[0] for row in cursor.execute("SELECT no FROM NAIimgInfo").fetchall()]
+        _update_params(cursor.connection, image_nos)
+    # 지각 해시(dHash, 64비트): 유사 이미지 검색은 image_hash의 메모리 색인이 담당합니다.
+    # 기존 레코드는 파일을 다시 읽어야 하므로 무결성 점검과 함께 백그라운드에서 채워집니다.
+    _ensure_column(cursor, "NAIimgInfo", "phash", "INTEGER")
+    # 파일 내용의 SHA-256. 같은 내용의 파일은 한 번만 저장되도록 고유 색인을 둡니다. (NULL은 중복 허용)
+    _ensure_column(cursor, "NAIimgInfo", "content_hash", "TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_images_content_hash ON NAIimgInfo (content_hash)")
+    _ensure_prompt_fts(cursor)
+    _ensure_tag_tables(cursor)
+    _ensure_prompt_lsh(cursor)
+    _ensure_facet_table(cursor, rebuild=params_added)
+    # 스캔 원장: 원본 경로별로 마지막으로 본 크기/수정시각과 처리 결과를 기록합니다.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ScanLedger
+                      (source_path TEXT PRIMARY KEY,
+                       size INTEGER NOT NULL,
+                       mtime_ns INTEGER NOT NULL,
+                       outcome TEXT NOT NULL,
+                       updated_at TEXT NOT NULL)''')
+    # 스캔 작업: 작업별 상태와 진행 카운터를 기록해 서버가 재시작되어도 결과를 조회할 수 있습니다.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ScanJob
+                      (id TEXT PRIMARY KEY,
+                       status TEXT NOT NULL,
+                       source_path TEXT,
+                       started_at TEXT NOT NULL,
+                       finished_at TEXT,
+                       discovered INTEGER NOT NULL DEFAULT 0,
+                       processed INTEGER NOT NULL DEFAULT 0,
+                       skipped INTEGER NOT NULL DEFAULT 0,
+                       failed INTEGER NOT NULL DEFAULT 0,
+                       throughput REAL NOT NULL DEFAULT 0,
+                       error TEXT)''')
+    # 일괄 삭제: 배치별 진행 상황과, 되돌리기에 필요한 원래 레코드/경로를 이미지별로 기록합니다.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS DeletionBatch
+                      (id TEXT PRIMARY KEY,
+                       status TEXT NOT NULL,
+                       created_at TEXT NOT NULL,
+                       finished_at TEXT,
+                       total INTEGER NOT NULL DEFAULT 0,
+                       deleted INTEGER NOT NULL DEFAULT 0,
+                       failed INTEGER NOT NULL DEFAULT 0,
+                       restored INTEGER NOT NULL DEFAULT 0)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS DeletionJournal
+                      (batch_id TEXT NOT NULL,
+                       image_no INTEGER NOT NULL,
+                       filepath TEXT,
+                       makeTime TEXT,
+                       platform TEXT,
+                       metadata TEXT,
+                       random_key INTEGER,
+                       trash_path TEXT,
+                       status TEXT NOT NULL,
+                       error TEXT,
+                       PRIMARY KEY (batch_id, image_no))''')
+    _ensure_column(cursor, "DeletionJournal", "phash", "INTEGER")
+    _ensure_column(cursor, "DeletionJournal", "content_hash", "TEXT")
+
+def _ensure_column(cursor, table, column, declaration):
+    """기존 DB의 테이블에 컬럼이 없으면 추가합니다. 추가했으면 True를 반환합니다."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return True
+    return False
+
+def _ensure_prompt_fts(cursor):
+    """
+    프롬프트 전문 검색용 FTS5 테이블(rowid = NAIimgInfo.no)을 만듭니다.
+    기존 DB에 처음 만들어질 때는 저장된 레코드로 한 번 채웁니다.
+    unicode61 토크나이저는 쉼표, 괄호, 밑줄을 모두 구분자로 보므로 가중치 문법은 색인에 남지 않습니다.
+    """
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'ImagePromptFTS'").fetchone()
+    if exists:
+        return
+    cursor.execute('''CREATE VIRTUAL TABLE ImagePromptFTS
+                      USING fts5(prompt, uc, tokenize = 'unicode61 remove_diacritics 2')''')
+    cursor.execute('''INSERT INTO ImagePromptFTS (rowid, prompt, uc)
+                      SELECT no, json_extract(metadata, '$.prompt'), json_extract(metadata, '$.uc')
+                      FROM NAIimgInfo''')
+
+def _ensure_tag_tables(cursor):
+    """
+    태그 사전(Tag)과 이미지-태그 역색인(ImageTag)을 만듭니다.
+    ImageTag의 기본 키는 태그 → 이미지, 보조 색인은 이미지 → 태그 방향 조회에 쓰입니다.
+    기존 DB에 처음 만들어질 때는 저장된 프롬프트로 한 번 채웁니다.
+    """
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'ImageTag'").fetchone()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Tag
+                      (id INTEGER PRIMARY KEY,
+                       name TEXT NOT NULL UNIQUE)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ImageTag
+                      (tag_id INTEGER NOT NULL,
+                       image_no INTEGER NOT NULL,
+                       PRIMARY KEY (tag_id, image_no)) WITHOUT ROWID''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_imagetag_image ON ImageTag (image_no, tag_id)")
+    if not exists:
+        image_nos = [row[0] for row in cursor.execute("SELECT no FROM NAIimgInfo").fetchall()]
+        _index_tags(cursor.connection, image_nos)
+
+def _ensure_prompt_lsh(cursor):
+    """
+    유사 프롬프트 검색용 MinHash LSH 테이블을 만듭니다.
+    PromptSignature는 이미지별 밴드 버킷 키(minhash.BANDS개, BLOB)를, PromptLSH는 버킷 → 이미지 역색인을 담습니다.
+    기존 DB에 처음 만들어질 때는 저장된 태그로 한 번 채웁니다. (태그 테이블 이후에 호출해야 합니다)
+    """
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'PromptLSH'").fetchone()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS PromptSignature
+                      (image_no INTEGER PRIMARY KEY,
+                       buckets BLOB NOT NULL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS PromptLSH
+                      (bucket INTEGER NOT NULL,
+                       image_no INTEGER NOT NULL,
+                       PRIMARY KEY (bucket, image_no)) WITHOUT ROWID''')
+    if not exists:
+        image_nos = [row[0] for row in cursor.execute("SELECT no FROM NAIimgInfo").fetchall()]
+        _index_prompt_signatures(cursor.connection, image_nos)
+
+def _ensure_facet_table(cursor, rebuild=False):
+    """
+    패싯(플랫폼, 샘플러, 해상도, 날짜)별 이미지 수 집계 테이블을 만듭니다.
+    이후로는 _index_images / _unindex_images가 증감으로 유지하므로, 전체 통계를 GROUP BY 없이 읽을 수 있습니다.
+    기존 DB에 처음 만들어질 때(또는 rebuild=True)는 저장된 레코드로 다시 계산합니다.
+    """
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'ImageFacet'").fetchone()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ImageFacet
+                      (facet TEXT NOT NULL,
+                       value TEXT NOT NULL,
+                       count INTEGER NOT NULL,
+                       PRIMARY KEY (facet, value)) WITHOUT ROWID''')
+    if not exists or rebuild:
+        cursor.execute("DELETE FROM ImageFacet")
+        cursor.execute(f"INSERT INTO ImageFacet (facet, value, count) {_facet_counts_sql('FROM NAIimgInfo')}")
+
 def create_table_if_not_exists():
     """테이블이 존재하지 않으면 생성합니다."""
-    conn = None
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS NAIimgInfo
-                          (no INTEGER PRIMARY KEY AUTOINCREMENT,
-                           filepath TEXT NOT NULL UNIQUE,
-                           makeTime TEXT,
-                           platform TEXT,
-                           metadata TEXT)''')
+        _ensure_schema(cursor)
         conn.commit()
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"Database error while ensuring table exists: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 def init_db():
     """
@@ -29,15 +193,20 @@ def init_db():
     """
     conn = None
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = connect()
         cursor = conn.cursor()
         cursor.execute("DROP TABLE IF EXISTS NAIimgInfo")
-        cursor.execute('''CREATE TABLE NAIimgInfo
-                          (no INTEGER PRIMARY KEY AUTOINCREMENT,
-                           filepath TEXT NOT NULL UNIQUE,
-                           makeTime TEXT,
-                           platform TEXT,
-                           metadata TEXT)''')
+        cursor.execute("DROP TABLE IF EXISTS ImagePromptFTS")
+        cursor.execute("DROP TABLE IF EXISTS ImageTag")
+        cursor.execute("DROP TABLE IF EXISTS Tag")
+        cursor.execute("DROP TABLE IF EXISTS ImageFacet")
+        cursor.execute("DROP TABLE IF EXISTS PromptSignature")
+        cursor.execute("DROP TABLE IF EXISTS PromptLSH")
+        cursor.execute("DROP TABLE IF EXISTS ScanLedger")
+        cursor.execute("DROP TABLE IF EXISTS ScanJob")
+        cursor.execute("DROP TABLE IF EXISTS DeletionBatch")
+        cursor.execute("DROP TABLE IF EXISTS DeletionJournal")
+        _ensure_schema(cursor)
         conn.commit()
         print("Database initialized successfully with the new schema.")
     except sqlite3.Error as e:
@@ -46,95 +215,964 @@ def init_db():
         if 'conn' in locals() and conn:
             conn.close()
 
-def get_db_connection():
-    """데이터베이스 연결을 생성하고 반환합니다."""
-    conn = sqlite3.connect(DB_FILE)
+# 연결마다 적용되는 PRAGMA. WAL 모드에서는 스캔이 쓰는 동안에도 갤러리 조회가 막히지 않으며,
+# synchronous=NORMAL은 WAL에서 커밋마다 fsync하지 않으면서도 DB 손상 없이 안전합니다.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",        # 64 MiB 페이지 캐시
+    "PRAGMA mmap_size = 268435456",      # 256 MiB 메모리 매핑 읽기
+    "PRAGMA temp_store = MEMORY",
+)
+# 다른 연결이 쓰는 중이면 바로 "database is locked"를 내지 않고 기다리는 시간(초)
+BUSY_TIMEOUT = 10.0
+# 연결별로 재사용할 준비된 문장(prepared statement) 수
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+def connect():
+    """설정(PRAGMA)이 적용된 새 데이터베이스 연결을 만듭니다. 호출자가 닫아야 합니다."""
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def add_image_info(image_data):
-    """이미지 정보를 데이터베이스에 추가하거나 업데이트합니다 (UPSERT)."""
-    sql = '''INSERT OR REPLACE INTO NAIimgInfo (filepath, makeTime, platform, metadata)
-             VALUES (?, ?, ?, ?)'''
-    conn = get_db_connection()
-    try:
-        conn.execute(sql, (
-            image_data['new_path'],
-            image_data['make_time'],
-            image_data['platform'],
-            json.dumps(image_data['metadata'])
-        ))
-        conn.commit()
-    finally:
+def get_db_connection():
+    """
+    현재 스레드의 데이터베이스 연결을 반환합니다.
+    연결은 스레드마다 한 번 만들어 재사용하므로 호출자가 닫지 않습니다.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.db_file != DB_FILE:
+        if conn is not None:
+            conn.close()
+        conn = connect()
+        _local.conn = conn
+        _local.db_file = DB_FILE
+    return conn
+
+def close_db_connection():
+    """현재 스레드의 연결을 닫습니다. (스레드를 끝내기 전 정리용)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
         conn.close()
+        _local.conn = None
 
-def get_images(page = 1, limit = 50, query = None, sort_by: str = "random", platform_filter: str = "all"):
+# 같은 경로가 다시 들어오면 행 번호(no)를 유지한 채 갱신합니다.
+_PARAM_COLUMN_NAMES = list(generation_params.PARAM_COLUMNS)
+IMAGE_UPSERT_SQL = f'''INSERT INTO NAIimgInfo (filepath, makeTime, platform, metadata, phash, content_hash, random_key, {", ".join(_PARAM_COLUMN_NAMES)})
+                       VALUES (?, ?, ?, ?, ?, ?, random(), {", ".join("?" for _ in _PARAM_COLUMN_NAMES)})
+                       ON CONFLICT(filepath) DO UPDATE SET
+                           makeTime = excluded.makeTime,
+                           platform = excluded.platform,
+                           metadata = excluded.metadata,
+                           phash = excluded.phash,
+                           content_hash = excluded.content_hash,
+                           {", ".join(f"{column} = excluded.{column}" for column in _PARAM_COLUMN_NAMES)}'''
+LEDGER_UPSERT_SQL = '''INSERT OR REPLACE INTO ScanLedger (source_path, size, mtime_ns, outcome, updated_at)
+                       VALUES (?, ?, ?, ?, datetime('now'))'''
+
+# 스캔 원장에 기록되는 처리 결과
+LEDGER_MOVED = "moved"
+LEDGER_FAILED = "failed"
+LEDGER_SKIPPED = "skipped"
+# 내용이 같은 이미지가 이미 라이브러리에 있어 건너뜀
+LEDGER_DUPLICATE = "duplicate"
+# 다시 스캔해도 결과가 같은 처리 결과. 나머지(이름 충돌로 건너뜀, 실패)는 정책 변경이나 일시적 오류 뒤에 다시 시도합니다.
+LEDGER_FINAL_OUTCOMES = (LEDGER_MOVED, LEDGER_DUPLICATE)
+
+def to_library_path(path, base_path):
     """
-    이미지 목록을 페이지네이션하여 반환합니다. 태그 검색, 정렬 및 플랫폼 필터링을 지원합니다.
+    파일 경로를 DB 저장 형식으로 바꿉니다.
+    base_path(분류 폴더) 아래의 파일은 '/'로 구분된 상대 경로로, 그 밖의 파일은 절대 경로로 저장됩니다.
+    """
+    path = os.path.abspath(path)
+    if base_path:
+        base = os.path.join(os.path.abspath(base_path), '')
+        if path.startswith(base):
+            return path[len(base):].replace(os.sep, '/')
+    return path
+
+def resolve_library_path(stored_path, base_path):
+    """DB에 저장된 경로를 실제 파일 시스템 경로로 되돌립니다."""
+    if os.path.isabs(stored_path) or not base_path:
+        return stored_path
+    return os.path.join(base_path, *stored_path.split('/'))
+
+# _image_row 튜플에서 content_hash의 위치
+IMAGE_ROW_CONTENT_HASH = 5
+
+def _image_row(image_data, base_path=None):
+    """process_image 결과를 NAIimgInfo INSERT 파라미터로 변환합니다."""
+    params = generation_params.extract_params(image_data['metadata'])
+    return (
+        to_library_path(image_data['new_path'], base_path),
+        image_data['make_time'],
+        image_data['platform'],
+        json.dumps(image_data['metadata']),
+        image_data.get('phash'),
+        image_data.get('content_hash'),
+        *(params[column] for column in _PARAM_COLUMN_NAMES)
+    )
+
+# 목록 전체 개수(및 필터별 통계) 캐시. 이미지가 추가/삭제될 때마다 세대(generation) 번호가 올라가며,
+# 현재 세대와 다른 캐시 항목은 무효로 취급됩니다.
+COUNT_CACHE_MAX_ENTRIES = 256
+_data_generation = 0
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+def _bump_generation():
+    """이미지 집합이 바뀌었음을 알려 개수 캐시를 무효화합니다."""
+    global _data_generation
+    with _count_cache_lock:
+        _data_generation += 1
+
+def data_generation():
+    """현재 세대 번호. 다른 모듈의 메모리 색인도 이 값이 바뀌면 다시 만듭니다."""
+    with _count_cache_lock:
+        return _data_generation
+
+def _cached(key, compute):
+    """같은 key의 compute() 결과를 세대가 바뀔 때까지 재사용합니다."""
+    with _count_cache_lock:
+        generation = _data_generation
+        cached = _count_cache.get(key)
+    hit = cached is not None and cached[0] == generation
+    metrics.record_cache("query_count", hit)
+    if hit:
+        return cached[1]
+    value = compute()
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.clear()
+        _count_cache[key] = (generation, value)
+    return value
+
+def _cached_count(conn, key, count_sql, count_params, shape):
+    """
+    같은 필터 조건(key)의 COUNT(*) 결과를 세대가 바뀔 때까지 재사용합니다.
+    실제로 센 시간은 get_images의 질의 형태(shape)별로 metrics에 기록합니다.
+    """
+    def count():
+        with metrics.GET_IMAGES_QUERY_SECONDS.time(*shape, "count"):
+            return conn.execute(count_sql, count_params).fetchone()[0]
+    return _cached(key, count)
+
+# SQLite 바인딩 변수 개수 제한(구버전 999)을 넘지 않도록 IN 절을 나눕니다.
+SQL_IN_CHUNK_SIZE = 500
+
+def _chunks(values, size=SQL_IN_CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _image_nos_for_paths(conn, filepaths):
+    nos = []
+    for chunk in _chunks(filepaths):
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT no FROM NAIimgInfo WHERE filepath IN ({placeholders})", chunk).fetchall()
+        nos.extend(row[0] for row in rows)
+    return nos
+
+def _index_tags(conn, image_nos):
+    """이미지들의 프롬프트를 태그로 나누어 Tag / ImageTag에 기록합니다."""
+    for chunk in _chunks(image_nos):
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT no, metadata FROM NAIimgInfo WHERE no IN ({placeholders})", chunk).fetchall()
+        image_tags = []
+        for no, metadata in rows:
+            try:
+                image_tags.append((no, tags.extract_tags(json.loads(metadata or '{}'))))
+            except ValueError:
+                continue
+        names = {name for _, tag_list in image_tags for name in tag_list}
+        if not names:
+            continue
+        conn.executemany("INSERT OR IGNORE INTO Tag (name) VALUES (?)", [(name,) for name in names])
+        tag_ids = {}
+        for name_chunk in _chunks(names):
+            name_placeholders = ','.join('?' for _ in name_chunk)
+            tag_ids.update(conn.execute(f"SELECT name, id FROM Tag WHERE name IN ({name_placeholders})",
+                                        name_chunk).fetchall())
+        conn.executemany("INSERT OR IGNORE INTO ImageTag (tag_id, image_no) VALUES (?, ?)",
+                         [(tag_ids[name], no) for no, tag_list in image_tags for name in tag_list])
+
+# 통계 패싯 -> NAIimgInfo에서 값을 계산하는 SQL 식. 값이 없으면 ''로 집계됩니다.
+# makeTime은 'yymmdd_HHMMSS' 형식이므로 날짜는 'YYYY-MM-DD'로 바꿔 집계합니다.
+FACET_EXPRESSIONS = {
+    "platform": "platform",
+    "sampler": "sampler",
+    "resolution": "width || 'x' || height",
+    "day": "CASE WHEN length(makeTime) >= 6 THEN '20' || substr(makeTime, 1, 2) || '-' || "
+           "substr(makeTime, 3, 2) || '-' || substr(makeTime, 5, 2) END",
+}
+
+def _facet_counts_sql(from_where):
+    """from_where 범위의 이미지를 패싯별 (facet, value, count) 행으로 집계하는 SELECT 문을 만듭니다."""
+    return " UNION ALL ".join(
+        f"SELECT '{facet}', COALESCE({expression}, ''), COUNT(*) {from_where} GROUP BY 2"
+        for facet, expression in FACET_EXPRESSIONS.items())
+
+def _adjust_facets(conn, image_nos, sign):
+    """이미지들의 패싯 값만큼 ImageFacet 집계를 늘리거나(sign=1) 줄입니다(sign=-1)."""
+    # 패싯마다 같은 IN 목록이 반복되므로 바인딩 변수 제한에 맞춰 더 작게 나눕니다.
+    for chunk in _chunks(image_nos, SQL_IN_CHUNK_SIZE // len(FACET_EXPRESSIONS)):
+        placeholders = ','.join('?' for _ in chunk)
+        counts_sql = _facet_counts_sql(f"FROM NAIimgInfo WHERE no IN ({placeholders})")
+        conn.execute(f'''INSERT INTO ImageFacet (facet, value, count)
+                         SELECT * FROM ({counts_sql}) WHERE true
+                         ON CONFLICT (facet, value) DO UPDATE SET count = count + excluded.count * ?''',
+                     chunk * len(FACET_EXPRESSIONS) + [sign])
+    if sign < 0:
+        conn.execute("DELETE FROM ImageFacet WHERE count <= 0")
+
+def _index_prompt_signatures(conn, image_nos):
+    """ImageTag에 기록된 태그로 이미지들의 MinHash 서명을 계산해 LSH 버킷에 넣습니다."""
+    for chunk in _chunks(image_nos):
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(f'''SELECT image_no, name FROM ImageTag JOIN Tag ON Tag.id = ImageTag.tag_id
+                                WHERE image_no IN ({placeholders})''', chunk).fetchall()
+        image_tags = {}
+        for no, name in rows:
+            image_tags.setdefault(no, []).append(name)
+        signatures = []
+        postings = []
+        for no, tag_list in image_tags.items():
+            buckets = minhash.band_buckets(minhash.signature(tag_list))
+            signatures.append((no, minhash.pack_buckets(buckets)))
+            postings.extend((bucket, no) for bucket in buckets)
+        conn.executemany("INSERT OR REPLACE INTO PromptSignature (image_no, buckets) VALUES (?, ?)", signatures)
+        conn.executemany("INSERT OR IGNORE INTO PromptLSH (bucket, image_no) VALUES (?, ?)", postings)
+
+def _unindex_prompt_signatures(conn, image_nos):
+    for chunk in _chunks(image_nos):
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT image_no, buckets FROM PromptSignature WHERE image_no IN ({placeholders})",
+                            chunk).fetchall()
+        conn.executemany("DELETE FROM PromptLSH WHERE bucket = ? AND image_no = ?",
+                         [(bucket, no) for no, buckets in rows for bucket in minhash.unpack_buckets(buckets)])
+        conn.execute(f"DELETE FROM PromptSignature WHERE image_no IN ({placeholders})", chunk)
+
+def _unindex_images(conn, image_nos):
+    """레코드가 바뀌거나 삭제되기 전에 파생 색인(전문 검색, 태그, 유사 프롬프트, 패싯 집계 등)에서 해당 이미지를 제거합니다."""
+    _unindex_prompt_signatures(conn, image_nos)
+    for chunk in _chunks(image_nos):
+        placeholders = ','.join('?' for _ in chunk)
+        conn.execute(f"DELETE FROM ImagePromptFTS WHERE rowid IN ({placeholders})", chunk)
+        conn.execute(f"DELETE FROM ImageTag WHERE image_no IN ({placeholders})", chunk)
+    _adjust_facets(conn, image_nos, -1)
+
+def _update_params(conn, image_nos):
+    """저장된 메타데이터에서 생성 파라미터 컬럼을 다시 채웁니다. (기존 레코드 백필, 복원 시 사용)"""
+    assignments = ", ".join(f"{column} = ?" for column in _PARAM_COLUMN_NAMES)
+    for chunk in _chunks(image_nos):
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT no, metadata FROM NAIimgInfo WHERE no IN ({placeholders})", chunk).fetchall()
+        updates = []
+        for no, metadata in rows:
+            try:
+                params = generation_params.extract_params(json.loads(metadata or '{}'))
+            except ValueError:
+                params = generation_params.extract_params({})
+            updates.append([params[column] for column in _PARAM_COLUMN_NAMES] + [no])
+        conn.executemany(f"UPDATE NAIimgInfo SET {assignments} WHERE no = ?", updates)
+
+def _index_images(conn, image_nos):
+    """저장된 레코드로 파생 색인(전문 검색, 태그, 유사 프롬프트, 패싯 집계 등)을 채웁니다."""
+    for chunk in _chunks(image_nos):
+        placeholders = ','.join('?' for _ in chunk)
+        conn.execute(f'''INSERT INTO ImagePromptFTS (rowid, prompt, uc)
+                         SELECT no, json_extract(metadata, '$.prompt'), json_extract(metadata, '$.uc')
+                         FROM NAIimgInfo WHERE no IN ({placeholders})''', chunk)
+    _index_tags(conn, image_nos)
+    _index_prompt_signatures(conn, image_nos)
+    _adjust_facets(conn, image_nos, 1)
+
+def _write_images(conn, rows):
+    """
+    NAIimgInfo에 레코드를 UPSERT하고 파생 색인을 함께 갱신합니다.
+    트랜잭션(커밋)은 호출자가 관리합니다.
+    """
+    filepaths = [row[0] for row in rows]
+    _unindex_images(conn, _image_nos_for_paths(conn, filepaths))
+    conn.executemany(IMAGE_UPSERT_SQL, rows)
+    _index_images(conn, _image_nos_for_paths(conn, filepaths))
+
+def add_image_info(image_data, base_path=None):
+    """
+    이미지 정보를 데이터베이스에 추가하거나 업데이트합니다 (UPSERT).
+    base_path를 지정하면 그 아래의 경로는 상대 경로로 저장됩니다.
     """
-    offset = (page - 1) * limit
     conn = get_db_connection()
-    
-    sql_parts = ["SELECT no, filepath, platform, makeTime FROM NAIimgInfo"]
-    count_sql_parts = ["SELECT COUNT(*) FROM NAIimgInfo"]
-    
+    with conn:
+        _write_images(conn, [_image_row(image_data, base_path)])
+    _bump_generation()
+
+class ImageInfoWriter:
+    """
+    여러 이미지 정보를 하나의 연결에서 배치 단위로 커밋하는 대량 입력기입니다.
+    batch_size개가 모이거나 max_delay초가 지나면 executemany로 한 번에 커밋합니다.
+    스캔 원장(ScanLedger) 기록도 같은 트랜잭션으로 커밋되어 이미지 레코드와 함께 남습니다.
+    커밋 시점에 이미 다른 이미지가 가진 콘텐츠 해시의 레코드는 빼고 커밋하며, 그 이미지 정보로
+    on_rejected(image_data, LEDGER_DUPLICATE)를 호출합니다. (해당 원장 기록은 duplicate로 바뀝니다)
+    배치는 커밋되었거나 모든 이미지가 on_rejected로 넘겨진 뒤에만 비워집니다.
+
+    사용 예:
+        with database.ImageInfoWriter() as writer:
+            for image_data in results:
+                writer.add(image_data)
+    """
+
+    def __init__(self, base_path=None, batch_size=500, max_delay=2.0, on_rejected=None):
+        self.base_path = base_path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.on_rejected = on_rejected
+        self.conn = None
+        self.pending = []
+        self.pending_images = []
+        self.pending_ledger = []
+        self.written_count = 0
+        self._last_flush = 0.0
+
+    def __enter__(self):
+        self.conn = connect()
+        self._last_flush = time.monotonic()
+        return self
+
+    def add(self, image_data):
+        """이미지 정보를 배치에 추가하고, 배치가 차면 커밋합니다."""
+        self.pending.append(_image_row(image_data, self.base_path))
+        self.pending_images.append(image_data)
+        self._flush_if_due()
+
+    def record_scan(self, source_path, size, mtime_ns, outcome):
+        """원본 파일의 처리 결과(moved/duplicate/skipped/failed)를 스캔 원장에 기록합니다."""
+        self.pending_ledger.append((source_path, size, mtime_ns, outcome))
+        self._flush_if_due()
+
+    def _flush_if_due(self):
+        pending_count = len(self.pending) + len(self.pending_ledger)
+        if pending_count >= self.batch_size or time.monotonic() - self._last_flush >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        """
+        대기 중인 레코드를 하나의 트랜잭션으로 커밋합니다.
+        커밋할 수 없으면 배치의 이미지마다 on_rejected(image_data, LEDGER_FAILED)를 호출해 되돌린 뒤 비웁니다.
+        """
+        if self.pending or self.pending_ledger:
+            try:
+                try:
+                    self._commit()
+                except sqlite3.IntegrityError:
+                    # 트랜잭션은 롤백되었습니다. 겹치는 레코드만 빼고 다시 커밋합니다.
+                    self._reject(self._content_conflicts(), LEDGER_DUPLICATE)
+                    self._commit()
+            except sqlite3.Error as e:
+                # 이미 이동된 파일이 레코드 없이 남지 않도록 배치 전체를 되돌립니다.
+                print(f"Failed to commit {len(self.pending)} images: {e}")
+                self._reject(list(self.pending_images), LEDGER_FAILED)
+                self._write_ledger()
+            self.pending.clear()
+            self.pending_images.clear()
+            self.pending_ledger.clear()
+        self._last_flush = time.monotonic()
+
+    def _commit(self):
+        with metrics.SCAN_STAGE_SECONDS.time("insert"), self.conn:
+            _write_images(self.conn, self.pending)
+            self.conn.executemany(LEDGER_UPSERT_SQL, self.pending_ledger)
+        if self.pending:
+            _bump_generation()
+        self.written_count += len(self.pending)
+
+    def _write_ledger(self):
+        """원장 기록만 커밋합니다. 실패해도 기록이 없는 파일은 다음 스캔에서 다시 처리되므로 무시합니다."""
+        try:
+            with self.conn:
+                self.conn.executemany(LEDGER_UPSERT_SQL, self.pending_ledger)
+        except sqlite3.Error as e:
+            print(f"Failed to record {len(self.pending_ledger)} scan ledger entries: {e}")
+
+    def _content_conflicts(self):
+        """
+        다른 경로의 이미지가 이미 가진(또는 배치 안에서 먼저 나온) 콘텐츠 해시의 이미지 정보 목록.
+        검사와 커밋 사이에 같은 내용이 기록된 경우(예: 해시 백필)입니다.
+        """
+        hashes = {row[IMAGE_ROW_CONTENT_HASH] for row in self.pending if row[IMAGE_ROW_CONTENT_HASH] is not None}
+        owners = {}
+        for chunk in _chunks(hashes):
+            placeholders = ",".join("?" * len(chunk))
+            owners.update((row[0], row[1]) for row in self.conn.execute(
+                f"SELECT content_hash, filepath FROM NAIimgInfo WHERE content_hash IN ({placeholders})", chunk))
+        conflicts = []
+        for row, image_data in zip(self.pending, self.pending_images):
+            file_hash = row[IMAGE_ROW_CONTENT_HASH]
+            if file_hash is not None and owners.setdefault(file_hash, row[0]) != row[0]:
+                print(f"{row[0]} has the same content as {owners[file_hash]}. Not recorded.")
+                conflicts.append(image_data)
+        return conflicts
+
+    def _reject(self, images, outcome):
+        """images를 배치에서 빼고 on_rejected로 알리며, 해당 원장 기록을 outcome으로 바꿉니다."""
+        rejected = {id(image_data) for image_data in images}
+        kept = [(row, image_data) for row, image_data in zip(self.pending, self.pending_images)
+                if id(image_data) not in rejected]
+        self.pending[:] = [row for row, _ in kept]
+        self.pending_images[:] = [image_data for _, image_data in kept]
+        rejected_sources = {image_data.get('source_path') for image_data in images}
+        self.pending_ledger[:] = [(source, size, mtime_ns, outcome if source in rejected_sources else previous)
+                                  for source, size, mtime_ns, previous in self.pending_ledger]
+        if self.on_rejected is not None:
+            for image_data in images:
+                self.on_rejected(image_data, outcome)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        # 예외가 나도 이미 이동된 파일들의 레코드는 남겨야 하므로 항상 커밋합니다.
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
+
+def get_scan_ledger():
+    """스캔 원장 전체를 {source_path: (size, mtime_ns, outcome)} 형태로 반환합니다."""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT source_path, size, mtime_ns, outcome FROM ScanLedger").fetchall()
+    return {row['source_path']: (row['size'], row['mtime_ns'], row['outcome']) for row in rows}
+
+def prune_scan_ledger(source_paths):
+    """더 이상 원본 폴더에 없는 파일들의 원장 기록을 삭제합니다."""
+    if not source_paths:
+        return
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("DELETE FROM ScanLedger WHERE source_path = ?", [(path,) for path in source_paths])
+
+SCAN_JOB_FIELDS = ("id", "status", "source_path", "started_at", "finished_at",
+                   "discovered", "processed", "skipped", "failed", "throughput", "error")
+SCAN_JOB_UPSERT_SQL = f'''INSERT OR REPLACE INTO ScanJob ({", ".join(SCAN_JOB_FIELDS)})
+                          VALUES ({", ".join("?" for _ in SCAN_JOB_FIELDS)})'''
+
+def save_scan_job(job):
+    """스캔 작업의 상태와 카운터(dict)를 저장합니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute(SCAN_JOB_UPSERT_SQL, [job.get(field) for field in SCAN_JOB_FIELDS])
+
+def get_scan_job(job_id):
+    """저장된 스캔 작업을 dict로 반환합니다. 없으면 None."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT * FROM ScanJob WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row is not None else None
+
+def mark_interrupted_scan_jobs():
+    """서버가 종료되며 끝나지 못한 'running' 작업들을 'interrupted'로 표시합니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute("UPDATE ScanJob SET status = 'interrupted' WHERE status = 'running'")
+
+def build_fts_query(query):
+    """
+    검색어를 FTS5 MATCH 식으로 변환합니다.
+    쉼표로 구분된 태그 하나가 하나의 구문(phrase)이 되고, 모든 태그가 일치해야 합니다.
+    태그 끝에 *를 붙이면 접두어 검색이 됩니다. (예: "cat*")
+    """
+    phrases = []
+    for tag in query.split(','):
+        tokens = re.findall(r'[^\W_]+', tag)
+        if tokens:
+            phrase = '"' + ' '.join(tokens) + '"'
+            if tag.strip().endswith('*'):
+                phrase += '*'
+            phrases.append(phrase)
+    return ' AND '.join(phrases)
+
+# 태그 하나에 해당하는 이미지 번호 집합 (ImageTag 기본 키 색인 사용)
+_TAG_POSTING_SQL = "SELECT image_no FROM ImageTag WHERE tag_id = (SELECT id FROM Tag WHERE name = ?)"
+
+def build_tag_filters(tags_all=None, tags_any=None, tags_none=None):
+    """
+    구조화된 태그 조건을 WHERE 절 목록과 파라미터로 변환합니다.
+    tags_all은 교집합(INTERSECT), tags_any는 합집합, tags_none은 차집합으로 처리됩니다.
+    """
+    where_clauses = []
+    params = []
+    if tags_all:
+        where_clauses.append("no IN (" + " INTERSECT ".join(_TAG_POSTING_SQL for _ in tags_all) + ")")
+        params.extend(tags_all)
+    if tags_any:
+        placeholders = ','.join('?' for _ in tags_any)
+        where_clauses.append(f"no IN (SELECT image_no FROM ImageTag WHERE tag_id IN "
+                             f"(SELECT id FROM Tag WHERE name IN ({placeholders})))")
+        params.extend(tags_any)
+    if tags_none:
+        placeholders = ','.join('?' for _ in tags_none)
+        where_clauses.append(f"no NOT IN (SELECT image_no FROM ImageTag WHERE tag_id IN "
+                             f"(SELECT id FROM Tag WHERE name IN ({placeholders})))")
+        params.extend(tags_none)
+    return where_clauses, params
+
+def encode_cursor(state):
+    """페이지 위치 정보를 URL에 넣을 수 있는 불투명한 문자열로 만듭니다."""
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """encode_cursor의 역변환. 잘못된 커서는 ValueError를 발생시킵니다."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(state, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return state
+
+def _build_filters(query=None, platform_filter="all", tags_all=None, tags_any=None, tags_none=None,
+                   param_filters=None):
+    """목록/통계 조회의 필터 조건을 (FROM 절, WHERE 조건 목록, 바인딩 값 목록, FTS 질의)로 만듭니다."""
+    from_clause = "FROM NAIimgInfo"
     where_clauses = []
     params = []
-    count_params = []
-    
-    if query:
-        where_clauses.append("(json_extract(metadata, '$.prompt') LIKE ? OR json_extract(metadata, '$.uc') LIKE ?)")
-        params.extend([f"%{query}%", f"%{query}%"])
-        count_params.extend([f"%{query}%", f"%{query}%"])
+
+    fts_query = build_fts_query(query) if query else ''
+    if fts_query:
+        from_clause += " JOIN ImagePromptFTS ON ImagePromptFTS.rowid = NAIimgInfo.no"
+        where_clauses.append("ImagePromptFTS MATCH ?")
+        params.append(fts_query)
 
     if platform_filter != "all":
         if platform_filter == "none":
-            where_clauses.append("platform IS NULL OR platform = '' OR platform = 'Unknown'")
+            where_clauses.append("(platform IS NULL OR platform = '' OR platform = 'Unknown')")
         else:
             where_clauses.append("platform = ?")
             params.append(platform_filter)
-            count_params.append(platform_filter)
 
+    tag_clauses, tag_params = build_tag_filters(tags_all, tags_any, tags_none)
+    where_clauses.extend(tag_clauses)
+    params.extend(tag_params)
+
+    for column, operator, value in param_filters or ():
+        # 컬럼과 연산자는 parse_param_filters에서 허용 목록으로 검증된 값입니다.
+        where_clauses.append(f"{column} {operator} ?")
+        params.append(value)
+    return from_clause, where_clauses, params, fts_query
+
+def _filter_key(fts_query, platform_filter, tags_all, tags_any, tags_none, param_filters):
+    """캐시 키로 쓸 수 있도록 필터 조건을 튜플로 만듭니다."""
+    return (fts_query, platform_filter, tuple(tags_all or ()), tuple(tags_any or ()), tuple(tags_none or ()),
+            tuple(param_filters or ()))
+
+def _query_shape(sort_kind, fts_query, platform_filter, tags_all, tags_any, tags_none, param_filters):
+    """metrics 라벨로 쓸 질의 형태: (정렬 종류, 활성 필터 종류를 "+"로 이은 문자열 또는 "none")."""
+    active = (("search", fts_query), ("platform", platform_filter != "all"),
+              ("tags", tags_all or tags_any or tags_none), ("params", param_filters))
+    return sort_kind, "+".join(name for name, on in active if on) or "none"
+
+def get_images(page = 1, limit = 50, query = None, sort_by: str = "random", platform_filter: str = "all",
+               tags_all=None, tags_any=None, tags_none=None, cursor=None, seed=None, with_total=True,
+               param_filters=None):
+    """
+    이미지 목록을 페이지네이션하여 반환합니다. 태그 검색, 정렬 및 플랫폼 필터링을 지원합니다.
+    검색은 ImagePromptFTS 전문 색인을 사용하며, sort_by="relevance"이면 검색 관련도 순으로 정렬합니다.
+    tags_all / tags_any / tags_none은 정규화된 태그 목록으로, 각각 모두 포함 / 하나 이상 포함 / 제외 조건입니다.
+    param_filters는 generation_params.parse_param_filters가 만든 (컬럼, 연산자, 값) 목록이며,
+    sort_by="steps_desc"처럼 생성 파라미터 컬럼으로 정렬할 수도 있습니다. (값이 없는 이미지는 마지막)
+
+    다음 페이지는 응답의 next_cursor를 cursor로 넘겨 요청합니다 (마지막 페이지이면 None).
+    시간순 정렬(desc/asc)은 마지막으로 본 (makeTime, no) 이후부터 색인을 따라 읽으므로
+    깊은 페이지도 첫 페이지와 비용이 같습니다. cursor가 없으면 page로 시작 위치를 정합니다.
+    무작위 정렬은 첫 페이지 응답의 seed로 순서가 고정되며 (seed를 넘기면 같은 순서를 재현),
+    이후 페이지의 cursor에도 seed가 담겨 있습니다. cursor 없이 page를 주면 같은 순서에서 그 페이지를 읽습니다.
+
+    total_images는 필터 조건별로 캐시됩니다. with_total=False이면 이어지는 페이지(cursor 지정)에서
+    개수 계산을 생략하고 total_images를 None으로 반환합니다. 다음 페이지 여부는 항상 has_more로 알 수 있습니다.
+    """
+    state = decode_cursor(cursor) if cursor else {}
+    conn = get_db_connection()
+    from_clause, where_clauses, params, fts_query = _build_filters(query, platform_filter, tags_all, tags_any,
+                                                                   tags_none, param_filters)
+
+    count_sql = "SELECT COUNT(*) " + from_clause
     if where_clauses:
-        sql_parts.append(" WHERE " + " AND ".join(where_clauses))
-        count_sql_parts.append(" WHERE " + " AND ".join(where_clauses))
+        count_sql += " WHERE " + " AND ".join(where_clauses)
+    count_params = list(params)
 
     # 정렬 옵션 처리
-    if sort_by == "desc":
-        sql_parts.append(" ORDER BY makeTime DESC")
-    elif sort_by == "asc":
-        sql_parts.append(" ORDER BY makeTime ASC")
+    db_cursor = conn.cursor()
+    next_state = None
+    param_sort = generation_params.parse_param_sort(sort_by)
+    started = time.perf_counter()
+    if param_sort:
+        sort_kind = "param"
+        column, direction = param_sort
+        images, next_state = _select_param_page(db_cursor, from_clause, where_clauses, params,
+                                                column, direction, state.get("p"), limit,
+                                                0 if cursor else (page - 1) * limit)
+    elif sort_by in ("desc", "asc") or (sort_by == "relevance" and not fts_query):
+        sort_kind = "time"
+        direction = "ASC" if sort_by == "asc" else "DESC"
+        page_where, page_params, offset = list(where_clauses), list(params), 0
+        if "k" in state:
+            page_where.append(f"(makeTime, no) {'>' if direction == 'ASC' else '<'} (?, ?)")
+            page_params.extend(state["k"])
+        else:
+            offset = int(state.get("o", (page - 1) * limit))
+        images = _select_page(db_cursor, from_clause, page_where, page_params,
+                              f"makeTime {direction}, no {direction}", limit + 1, offset)
+        if len(images) > limit:
+            images = images[:limit]
+            next_state = {"k": [images[-1]["makeTime"], images[-1]["no"]]}
+    elif sort_by == "relevance":
+        sort_kind = "relevance"
+        # bm25는 값이 작을수록 관련도가 높습니다. 부정 프롬프트(uc) 일치는 가중치를 낮춥니다.
+        offset = int(state.get("o", (page - 1) * limit))
+        images = _select_page(db_cursor, from_clause, where_clauses, params,
+                              "bm25(ImagePromptFTS, 1.0, 0.25), no DESC", limit + 1, offset)
+        if len(images) > limit:
+            images = images[:limit]
+            next_state = {"o": offset + limit}
     else: # "random" 또는 기본값
-        sql_parts.append(" ORDER BY RANDOM()")
+        sort_kind = "random"
+        if "s" in state:
+            seed = int(state["s"])
+        elif seed is None:
+            seed = random.randrange(RANDOM_SEED_RANGE)
+        images, next_state = _select_random_page(db_cursor, from_clause, where_clauses, params,
+                                                 seed, state.get("r"), limit,
+                                                 0 if cursor else (page - 1) * limit)
+    shape = _query_shape(sort_kind, fts_query, platform_filter, tags_all, tags_any, tags_none, param_filters)
+    metrics.GET_IMAGES_QUERY_SECONDS.observe(time.perf_counter() - started, *shape, "page")
 
-    sql_parts.append(" LIMIT ? OFFSET ?")
-    params.extend([limit, offset])
-    
-    sql = " ".join(sql_parts)
-    count_sql = " ".join(count_sql_parts)
+    total_images = None
+    if with_total or not cursor:
+        count_key = _filter_key(fts_query, platform_filter, tags_all, tags_any, tags_none, param_filters)
+        total_images = _cached_count(conn, count_key, count_sql, count_params, shape)
 
-    cursor = conn.cursor()
-    images = cursor.execute(sql, params).fetchall()
-    
-    total_images = conn.cursor().execute(count_sql, count_params).fetchone()[0]
-        
-    conn.close()
-    
-    total_pages = (total_images + limit - 1) // limit
-    return {
+    result = {
         "images": [dict(ix) for ix in images],
-        "page": page,
         "limit": limit,
         "total_images": total_images,
-        "total_pages": total_pages
+        "has_more": next_state is not None,
+        "next_cursor": encode_cursor(next_state) if next_state else None
     }
+    if sort_by not in ("desc", "asc", "relevance") and not param_sort:
+        result["seed"] = seed
+    return result
+
+def _select_page(db_cursor, from_clause, where_clauses, params, order_by, limit, offset=0):
+    sql = f"SELECT no, filepath, platform, makeTime, missing, content_hash {from_clause}"
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+    sql += f" ORDER BY {order_by} LIMIT ? OFFSET ?"
+    return db_cursor.execute(sql, list(params) + [limit, offset]).fetchall()
+
+def _count_rows(db_cursor, from_clause, where_clauses, params):
+    sql = f"SELECT COUNT(*) {from_clause}"
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+    return db_cursor.execute(sql, params).fetchone()[0]
+
+def _select_param_page(db_cursor, from_clause, where_clauses, params, column, direction, position, limit, offset=0):
+    """
+    생성 파라미터 컬럼 순으로 키셋 페이지를 읽습니다. ({column}, no) 색인을 따라 읽고,
+    값이 없는(NULL) 이미지는 그 뒤에 no 순으로 이어집니다.
+    position은 직전 페이지의 마지막 위치 [phase, 값, no] 입니다. (phase 0: 값 있음, 1: NULL)
+    position 없이 offset을 주면 이 순서에서 offset개를 건너뛴 곳부터 읽습니다. (page 지정)
+    """
+    operator = '>' if direction == "ASC" else '<'
+    phase, last_value, last_no = position if position else (0, None, None)
+    images = []
+    if phase == 0:
+        page_where, page_params = list(where_clauses) + [f"{column} IS NOT NULL"], list(params)
+        if last_no is not None:
+            page_where.append(f"({column}, no) {operator} (?, ?)")
+            page_params.extend([last_value, last_no])
+        images = _select_page(db_cursor, from_clause, page_where, page_params,
+                              f"{column} {direction}, no {direction}", limit + 1, offset)
+        if offset and not images:
+            # 값 있는 행이 offset개 이하이면 남은 건너뛰기는 NULL 구간에 적용합니다.
+            offset -= _count_rows(db_cursor, from_clause, page_where, page_params)
+        else:
+            offset = 0
+        if len(images) > limit:
+            images = images[:limit]
+            last_no = images[-1]["no"]
+            value = db_cursor.execute(f"SELECT {column} FROM NAIimgInfo WHERE no = ?", (last_no,)).fetchone()[0]
+            return images, {"p": [0, value, last_no]}
+        last_no = None
+
+    remaining = limit - len(images)
+    page_where, page_params = list(where_clauses) + [f"{column} IS NULL"], list(params)
+    if last_no is not None:
+        page_where.append(f"no {operator} ?")
+        page_params.append(last_no)
+    rows = _select_page(db_cursor, from_clause, page_where, page_params, f"no {direction}", remaining + 1, offset)
+    next_state = None
+    if len(rows) > remaining:
+        rows = rows[:remaining]
+        next_state = {"p": [1, None, rows[-1]["no"] if rows else None]}
+    return images + rows, next_state
+
+# 무작위 정렬 시드 범위. JavaScript 숫자로도 손실 없이 주고받을 수 있도록 32비트로 제한합니다.
+RANDOM_SEED_RANGE = 2 ** 32
+# random_key 공간(부호 있는 64비트)을 나누는 구간 수. 시드마다 구간의 순서와 구간별 읽는 방향이 달라집니다.
+# 구간마다 색인 범위 질의를 하나씩 하므로 너무 크면 작은 라이브러리에서 빈 구간 질의가 늘어납니다.
+RANDOM_BUCKET_BITS = 6
+RANDOM_BUCKETS = 2 ** RANDOM_BUCKET_BITS
+
+@functools.lru_cache(maxsize=256)
+def _random_plan(seed):
+    """시드의 구간 순서와 구간별 방향: ((random_key 하한, 상한 또는 None, 역순 여부), ...)"""
+    rng = random.Random(seed % RANDOM_SEED_RANGE)
+    buckets = list(range(RANDOM_BUCKETS))
+    rng.shuffle(buckets)
+    width = 2 ** (64 - RANDOM_BUCKET_BITS)
+    return tuple((bucket * width - 2 ** 63, (bucket + 1) * width - 2 ** 63 if bucket < RANDOM_BUCKETS - 1 else None,
+                  rng.random() < 0.5)
+                 for bucket in buckets)
+
+def _select_random_page(db_cursor, from_clause, where_clauses, params, seed, position, limit, offset=0):
+    """
+    시드로 정해지는 고정된 무작위 순서의 한 페이지를 읽습니다.
+
+    각 행은 저장 시 부여된 random_key를 갖습니다. random_key 공간을 RANDOM_BUCKETS개 구간으로 나누고,
+    시드로 섞은 구간 순서대로 각 구간을 시드가 정한 방향((random_key, no) 오름차순 또는 내림차순)으로 읽습니다.
+    구간마다 색인 범위를 따라 읽으므로 ORDER BY RANDOM() 없이도 한 세션 안에서 중복이나 누락이 없고,
+    시드가 다르면 구간 순서와 방향이 달라집니다. (구간 안의 상대 순서는 reshuffle로 random_key를 다시 뽑을 때 바뀝니다)
+    position은 직전 페이지의 마지막 위치 [구간 순번, random_key, no] 입니다.
+    position 없이 offset을 주면 이 순서에서 offset개를 건너뛴 곳부터 읽습니다. (page 지정)
+    """
+    plan = _random_plan(seed)
+    phase, last_key, last_no = position if position else (0, None, None)
+    images = []
+    skip = offset
+    while phase < len(plan) and len(images) <= limit:
+        low, high, descending = plan[phase]
+        page_where, page_params = list(where_clauses), list(params)
+        page_where.append("random_key >= ?")
+        page_params.append(low)
+        if high is not None:
+            page_where.append("random_key < ?")
+            page_params.append(high)
+        if last_key is not None:
+            page_where.append("(random_key, no) < (?, ?)" if descending else "(random_key, no) > (?, ?)")
+            page_params.extend([last_key, last_no])
+        rows = _select_page(db_cursor, from_clause, page_where, page_params,
+                            "random_key DESC, no DESC" if descending else "random_key, no",
+                            limit + 1 - len(images), skip)
+        if skip and not rows:
+            # 이 구간의 행이 skip개 이하이면 남은 건너뛰기를 다음 구간으로 넘깁니다.
+            skip -= _count_rows(db_cursor, from_clause, page_where, page_params)
+        else:
+            skip = 0
+        images.extend((phase, row) for row in rows)
+        if len(images) <= limit:
+            phase, last_key, last_no = phase + 1, None, None
+
+    next_state = None
+    if len(images) > limit:
+        images = images[:limit]
+        last_phase, last_row = images[-1]
+        key = db_cursor.execute("SELECT random_key FROM NAIimgInfo WHERE no = ?", (last_row["no"],)).fetchone()[0]
+        next_state = {"s": seed, "r": [last_phase, key, last_row["no"]]}
+    return [row for _, row in images], next_state
+
+def get_stats(query=None, platform_filter="all", tags_all=None, tags_any=None, tags_none=None, param_filters=None):
+    """
+    패싯별 이미지 수를 {"total": n, "facets": {패싯: [{"value", "count"}, ...]}} 형태로 반환합니다.
+    값이 없는 이미지는 value None으로 묶이며, 날짜(day)는 날짜순, 나머지는 개수가 많은 순입니다.
+    필터가 없으면 ImageFacet 집계를 그대로 읽고, 필터가 있으면 조건에 맞는 이미지만 GROUP BY로 세어
+    목록 개수와 같은 방식(세대 번호)으로 캐시합니다.
+    """
+    conn = get_db_connection()
+    from_clause, where_clauses, params, fts_query = _build_filters(query, platform_filter, tags_all, tags_any,
+                                                                   tags_none, param_filters)
+    if where_clauses:
+        from_where = from_clause + " WHERE " + " AND ".join(where_clauses)
+        key = ("stats",) + _filter_key(fts_query, platform_filter, tags_all, tags_any, tags_none, param_filters)
+        rows = _cached(key, lambda: conn.execute(_facet_counts_sql(from_where),
+                                                 params * len(FACET_EXPRESSIONS)).fetchall())
+    else:
+        rows = conn.execute("SELECT facet, value, count FROM ImageFacet").fetchall()
+
+    facets = {facet: [] for facet in FACET_EXPRESSIONS}
+    for facet, value, count in rows:
+        facets[facet].append({"value": value or None, "count": count})
+    for facet, values in facets.items():
+        if facet == "day":
+            values.sort(key=lambda item: item["value"] or "")
+        else:
+            values.sort(key=lambda item: (-item["count"], item["value"] or ""))
+    return {"total": sum(item["count"] for item in facets["platform"]), "facets": facets}
+
+def reroll_random_keys():
+    """모든 이미지의 random_key를 새로 뽑아 무작위 순서 자체를 바꿉니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute("UPDATE NAIimgInfo SET random_key = random()")
+
+def migrate_to_relative_paths(base_path):
+    """
+    예전 DB에 절대 경로로 저장된 레코드 중 base_path 아래에 있는 것들을 상대 경로로 바꿉니다.
+    filepath 색인의 범위 검색만 하므로 바꿀 것이 없으면 거의 비용이 들지 않습니다.
+    시작 시와 설정에서 분류 폴더(base_path)를 바꿀 때마다 실행됩니다. base_path 밖의 레코드는
+    파일 위치를 알 수 없으므로 바꾸지 않고(목록에는 자리표시 이미지로 표시) 그 수를 알립니다.
+    """
+    base = os.path.join(os.path.abspath(base_path), '')
+    conn = get_db_connection()
+    rows = conn.execute("SELECT no, filepath FROM NAIimgInfo WHERE filepath >= ? AND filepath < ?",
+                        (base, base + '\U0010ffff')).fetchall()
+    converted = 0
+    if rows:
+        with conn:
+            converted = sum(conn.execute("UPDATE OR IGNORE NAIimgInfo SET filepath = ? WHERE no = ?",
+                                         (to_library_path(row['filepath'], base_path), row['no'])).rowcount
+                            for row in rows)
+        print(f"{converted}개 레코드의 경로를 상대 경로로 변환했습니다.")
+    # 상대 경로는 '/'나 드라이브 문자로 시작하지 않습니다.
+    remaining = conn.execute("SELECT COUNT(*) FROM NAIimgInfo WHERE filepath LIKE '/%' OR filepath LIKE '\\%' "
+                             "OR substr(filepath, 2, 1) = ':'").fetchone()[0]
+    if remaining:
+        print(f"{remaining}개 레코드는 분류 폴더({base_path}) 밖의 절대 경로이거나 같은 상대 경로의 레코드가 있어 "
+              f"변환하지 않았습니다. 파일을 분류 폴더로 옮기거나 분류 폴더 설정을 파일이 있는 폴더로 바꾸면 변환됩니다.")
+    return converted
+
+def sweep_missing_files(base_path, batch_size=1000):
+    """
+    모든 레코드의 파일 존재 여부를 확인해 missing 플래그를 갱신합니다.
+    목록 조회마다 파일을 확인하지 않도록 백그라운드에서 주기적으로 실행하는 무결성 점검입니다.
+
+    :return: 누락된 파일 수
+    """
+    conn = get_db_connection()
+    missing_count = 0
+    last_no = 0
+    while True:
+        rows = conn.execute("SELECT no, filepath, missing FROM NAIimgInfo WHERE no > ? ORDER BY no LIMIT ?",
+                            (last_no, batch_size)).fetchall()
+        if not rows:
+            break
+        last_no = rows[-1]['no']
+        changes = []
+        for row in rows:
+            missing = 0 if os.path.exists(resolve_library_path(row['filepath'], base_path)) else 1
+            missing_count += missing
+            if missing != row['missing']:
+                changes.append((missing, row['no']))
+        if changes:
+            with conn:
+                conn.executemany("UPDATE NAIimgInfo SET missing = ? WHERE no = ?", changes)
+    return missing_count
+
+# 유사 프롬프트 검색에서 정확한 Jaccard 유사도를 계산할 최대 후보 수 (겹치는 밴드가 많은 순)
+PROMPT_CANDIDATE_LIMIT = 200
+# 버킷 하나에서 읽는 최대 이미지 수. 흔한 태그 조합의 버킷은 매우 커지지만 유사도 정보는 적으므로,
+# 진짜 비슷한 이미지는 다른 (작은) 버킷들에서도 겹치는 것에 기대어 앞부분만 읽습니다.
+PROMPT_BUCKET_SCAN_LIMIT = 1000
+
+def get_similar_prompt_images(image_id, limit=20):
+    """
+    태그 집합이 비슷한 이미지를 [(no, Jaccard 유사도)]로 유사도가 높은 순으로 반환합니다. (자기 자신 제외)
+    MinHash LSH 버킷을 공유하는 후보를 겹치는 밴드 수 순으로 PROMPT_CANDIDATE_LIMIT개까지 고른 뒤,
+    ImageTag의 실제 태그 집합으로 유사도를 계산합니다. 태그가 없는 이미지는 빈 목록입니다.
+    """
+    conn = get_db_connection()
+    row = conn.execute("SELECT buckets FROM PromptSignature WHERE image_no = ?", (image_id,)).fetchone()
+    if row is None:
+        return []
+    shared_bands = {}
+    for bucket in minhash.unpack_buckets(row[0]):
+        for no, in conn.execute("SELECT image_no FROM PromptLSH WHERE bucket = ? LIMIT ?",
+                                (bucket, PROMPT_BUCKET_SCAN_LIMIT)).fetchall():
+            shared_bands[no] = shared_bands.get(no, 0) + 1
+    shared_bands.pop(image_id, None)
+    candidates = sorted(shared_bands, key=lambda no: (-shared_bands[no], no))[:PROMPT_CANDIDATE_LIMIT]
+    if not candidates:
+        return []
+    tag_sets = {}
+    for chunk in _chunks(candidates + [image_id]):
+        chunk_placeholders = ','.join('?' for _ in chunk)
+        for no, tag_id in conn.execute(f"SELECT image_no, tag_id FROM ImageTag WHERE image_no IN ({chunk_placeholders})",
+                                       chunk).fetchall():
+            tag_sets.setdefault(no, set()).add(tag_id)
+    query_tags = tag_sets.get(image_id, set())
+    scored = [(no, minhash.jaccard(query_tags, tag_sets.get(no, set()))) for no in candidates]
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+def get_image_summaries(image_ids):
+    """이미지 번호 목록의 목록용 정보(no, filepath, platform, makeTime, missing, content_hash)를 {no: dict}로 반환합니다."""
+    conn = get_db_connection()
+    summaries = {}
+    for chunk in _chunks(image_ids):
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(f"SELECT no, filepath, platform, makeTime, missing, content_hash FROM NAIimgInfo "
+                            f"WHERE no IN ({placeholders})", chunk).fetchall()
+        summaries.update((row['no'], dict(row)) for row in rows)
+    return summaries
+
+def get_perceptual_hashes():
+    """지각 해시가 있는 모든 이미지의 (번호 목록, 해시 목록)을 반환합니다."""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT no, phash FROM NAIimgInfo WHERE phash IS NOT NULL").fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+def get_images_without_phash(after_no, limit):
+    """after_no 다음부터 지각 해시가 없는 이미지의 (no, filepath)를 limit개까지 반환합니다."""
+    conn = get_db_connection()
+    return conn.execute("SELECT no, filepath FROM NAIimgInfo WHERE no > ? AND phash IS NULL ORDER BY no LIMIT ?",
+                        (after_no, limit)).fetchall()
+
+def set_perceptual_hashes(updates):
+    """(phash, no) 목록으로 지각 해시를 기록합니다."""
+    if not updates:
+        return
+    conn = get_db_connection()
+    with conn:
+        conn.executemany("UPDATE NAIimgInfo SET phash = ? WHERE no = ?", updates)
+    _bump_generation()
+
+def find_image_by_content_hash(content_hash):
+    """같은 내용의 이미지가 이미 저장되어 있으면 그 filepath를, 없으면 None을 반환합니다."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT filepath FROM NAIimgInfo WHERE content_hash = ?", (content_hash,)).fetchone()
+    return row['filepath'] if row is not None else None
+
+def get_images_without_content_hash(after_no, limit):
+    """after_no 다음부터 콘텐츠 해시가 없는 이미지의 (no, filepath)를 limit개까지 반환합니다."""
+    conn = get_db_connection()
+    return conn.execute("SELECT no, filepath FROM NAIimgInfo WHERE no > ? AND content_hash IS NULL ORDER BY no LIMIT ?",
+                        (after_no, limit)).fetchall()
+
+def set_content_hashes(updates):
+    """
+    (content_hash, no) 목록으로 콘텐츠 해시를 기록합니다. 다른 레코드와 내용이 같은 이미지는
+    고유 색인 때문에 기록되지 않고 NULL로 남습니다.
+
+    :return: 기록된 수
+    """
+    conn = get_db_connection()
+    with conn:
+        return sum(conn.execute("UPDATE OR IGNORE NAIimgInfo SET content_hash = ? WHERE no = ?", update).rowcount
+                   for update in updates)
+
+def get_version_fields_by_path(stored_path):
+    """저장된 라이브러리 경로(filepath)의 (makeTime, content_hash)를 반환합니다. 없으면 None."""
+    row = get_db_connection().execute("SELECT makeTime, content_hash FROM NAIimgInfo WHERE filepath = ?",
+                                      (stored_path,)).fetchone()
+    return (row[0], row[1]) if row else None
 
 def get_image_by_id(image_id):
     """ID로 특정 이미지의 모든 정보를 조회합니다."""
     conn = get_db_connection()
     cursor = conn.cursor()
     image = cursor.execute("SELECT * FROM NAIimgInfo WHERE no = ?", (image_id,)).fetchone()
-    conn.close()
     if image is None:
         return None
     
@@ -161,19 +1199,114 @@ def delete_images_by_ids(image_ids: list[int]) -> list[str]:
         for record in file_records:
             filepaths_to_delete.append(record['filepath'])
             
-        # 이미지 레코드들을 삭제합니다.
+        # 파생 색인과 이미지 레코드들을 삭제합니다.
+        _unindex_images(conn, image_ids)
         delete_sql = f"DELETE FROM NAIimgInfo WHERE no IN ({placeholders})"
         cursor.execute(delete_sql, image_ids)
         
         conn.commit()
+        _bump_generation()
         print(f"데이터베이스에서 {len(filepaths_to_delete)}개의 이미지 레코드를 삭제했습니다.")
         return filepaths_to_delete
     except sqlite3.Error as e:
         conn.rollback()
         print(f"데이터베이스 오류로 이미지 삭제에 실패했습니다: {e}")
         raise
-    finally:
-        conn.close()
+
+DELETION_BATCH_FIELDS = ("id", "status", "created_at", "finished_at", "total", "deleted", "failed", "restored")
+DELETION_BATCH_UPSERT_SQL = f'''INSERT OR REPLACE INTO DeletionBatch ({", ".join(DELETION_BATCH_FIELDS)})
+                                VALUES ({", ".join("?" for _ in DELETION_BATCH_FIELDS)})'''
+JOURNAL_DELETED = "deleted"
+JOURNAL_FAILED = "failed"
+JOURNAL_RESTORED = "restored"
+JOURNAL_PURGED = "purged"
+
+def save_deletion_batch(batch):
+    """삭제 배치의 상태와 카운터(dict)를 저장합니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute(DELETION_BATCH_UPSERT_SQL, [batch.get(field) for field in DELETION_BATCH_FIELDS])
+
+def get_deletion_batch(batch_id):
+    """저장된 삭제 배치를 dict로 반환합니다. 없으면 None."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT * FROM DeletionBatch WHERE id = ?", (batch_id,)).fetchone()
+    return dict(row) if row is not None else None
+
+def mark_interrupted_deletion_batches():
+    """서버가 종료되며 끝나지 못한 삭제/복원 배치들을 'interrupted'로 표시합니다. 기록은 그대로 되돌릴 수 있습니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute("UPDATE DeletionBatch SET status = 'interrupted' WHERE status IN ('running', 'restoring')")
+
+def get_deletion_batches_before(created_before, statuses):
+    """created_before 이전에 만들어진, statuses 중 하나의 상태인 삭제 배치 ID 목록을 반환합니다."""
+    conn = get_db_connection()
+    placeholders = ','.join('?' for _ in statuses)
+    rows = conn.execute(f"SELECT id FROM DeletionBatch WHERE created_at < ? AND status IN ({placeholders})",
+                        (created_before, *statuses)).fetchall()
+    return [row['id'] for row in rows]
+
+def journal_image_deletion(batch_id, image_no, trash_path):
+    """
+    이미지 레코드를 삭제 기록(DeletionJournal)으로 옮깁니다.
+    기록 추가, 파생 색인 삭제, 레코드 삭제가 한 트랜잭션으로 커밋되므로 파일 하나를 옮길 때마다
+    호출하면 파일과 레코드가 어긋나지 않습니다.
+
+    :return: 레코드가 있어서 옮겼으면 True
+    """
+    conn = get_db_connection()
+    with conn:
+        moved = conn.execute('''INSERT INTO DeletionJournal
+                                    (batch_id, image_no, filepath, makeTime, platform, metadata, random_key, phash, content_hash,
+                                     trash_path, status)
+                                SELECT ?, no, filepath, makeTime, platform, metadata, random_key, phash, content_hash, ?, ?
+                                FROM NAIimgInfo WHERE no = ?''',
+                             (batch_id, trash_path, JOURNAL_DELETED, image_no)).rowcount
+        if moved:
+            _unindex_images(conn, [image_no])
+            conn.execute("DELETE FROM NAIimgInfo WHERE no = ?", (image_no,))
+    if moved:
+        _bump_generation()
+    return bool(moved)
+
+def journal_deletion_failure(batch_id, image_no, filepath, error):
+    """파일을 옮기지 못해 삭제하지 않은 이미지를 기록합니다. 레코드는 그대로 남습니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute('''INSERT OR REPLACE INTO DeletionJournal (batch_id, image_no, filepath, status, error)
+                        VALUES (?, ?, ?, ?, ?)''', (batch_id, image_no, filepath, JOURNAL_FAILED, str(error)))
+
+def get_deletion_journal(batch_id, status=JOURNAL_DELETED):
+    """삭제 배치에서 주어진 상태인 기록들을 dict 목록으로 반환합니다."""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT * FROM DeletionJournal WHERE batch_id = ? AND status = ? ORDER BY image_no",
+                        (batch_id, status)).fetchall()
+    return [dict(row) for row in rows]
+
+def restore_journal_entry(batch_id, image_no):
+    """
+    삭제 기록의 레코드를 원래 번호(no)로 되살리고 검색/태그 색인을 다시 만듭니다.
+    같은 경로나 같은 내용(content_hash)의 레코드가 이미 있으면 sqlite3.IntegrityError가 발생하고 아무것도 바뀌지 않습니다.
+    """
+    conn = get_db_connection()
+    with conn:
+        conn.execute('''INSERT INTO NAIimgInfo (no, filepath, makeTime, platform, metadata, random_key, phash, content_hash)
+                        SELECT image_no, filepath, makeTime, platform, metadata, random_key, phash, content_hash
+                        FROM DeletionJournal WHERE batch_id = ? AND image_no = ? AND status = ?''',
+                     (batch_id, image_no, JOURNAL_DELETED))
+        _update_params(conn, [image_no])
+        _index_images(conn, [image_no])
+        conn.execute("UPDATE DeletionJournal SET status = ? WHERE batch_id = ? AND image_no = ?",
+                     (JOURNAL_RESTORED, batch_id, image_no))
+    _bump_generation()
+
+def mark_journal_purged(batch_id, image_no):
+    """보관 중이던 파일을 휴지통으로 보낸 기록을 표시합니다. 이후로는 되돌릴 수 없습니다."""
+    conn = get_db_connection()
+    with conn:
+        conn.execute("UPDATE DeletionJournal SET status = ? WHERE batch_id = ? AND image_no = ?",
+                     (JOURNAL_PURGED, batch_id, image_no))
 
 if __name__ == '__main__':
     print("Initializing database...")
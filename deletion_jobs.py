@@ -0,0 +1,299 @@
+import datetime
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import send2trash
+
+# Local modules
+import database
+import scanner
+import thumbnails
+
+# Deleted files are first moved here (inside the library, so it is a cheap rename)
+# and kept until the batch is purged, which is what makes a deletion restorable.
+TRASH_DIR = ".trash"
+# Batches older than this are purged to the system trash on startup, every
+# RETENTION_CHECK_INTERVAL seconds and when the next deletion starts.
+DELETION_RETENTION = datetime.timedelta(days=7)
+RETENTION_CHECK_INTERVAL = 3600
+DELETION_WORKERS = 2
+# Counters are written to the DeletionBatch table at most this often (seconds) while a job runs.
+PERSIST_INTERVAL = 1.0
+
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_RESTORING = "restoring"
+STATUS_RESTORED = "restored"
+STATUS_PURGING = "purging"
+STATUS_PURGED = "purged"
+STATUS_INTERRUPTED = "interrupted"
+# Batches whose staged files can still be restored or purged
+RESTORABLE_STATUSES = (STATUS_COMPLETED, STATUS_INTERRUPTED)
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+class DeletionBatchUnavailable(Exception):
+    """Raised when a batch is busy or in a state that does not allow the requested action."""
+
+
+class DeletionJob:
+    """
+    One bulk deletion batch. Each image is handled on its own: the file is moved
+    to the batch's trash folder, then the row is moved to DeletionJournal in a
+    single transaction. If that commit fails the file is moved back, so a row
+    and its file are always either both in the library or both in the trash.
+    """
+
+    def __init__(self, batch_id, base_path: str, image_ids=(), status=STATUS_RUNNING, created_at=None,
+                 finished_at=None, total=None, deleted=0, failed=0, restored=0):
+        self.id = batch_id
+        self.base_path = base_path
+        self.image_ids = list(dict.fromkeys(image_ids))
+        self.status = status
+        self.created_at = created_at or _now()
+        self.finished_at = finished_at
+        self.total = len(self.image_ids) if total is None else total
+        self.deleted = deleted
+        self.failed = failed
+        self.restored = restored
+        self._persisted_at = 0.0
+
+    @classmethod
+    def from_record(cls, record: dict, base_path: str):
+        return cls(record["id"], base_path, status=record["status"], created_at=record["created_at"],
+                   finished_at=record["finished_at"], total=record["total"], deleted=record["deleted"],
+                   failed=record["failed"], restored=record["restored"])
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "total": self.total,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "restored": self.restored,
+        }
+
+    @property
+    def trash_path(self):
+        return os.path.join(self.base_path, TRASH_DIR, self.id)
+
+    def delete(self):
+        self._run(self.image_ids, self._delete_one, STATUS_COMPLETED)
+
+    def restore(self):
+        # The caller holds scanner.ingest_lock: restoring puts files back into the library,
+        # and a scan's content-hash checks assume no one else adds rows meanwhile.
+        self._run(database.get_deletion_journal(self.id), self._restore_one, STATUS_RESTORED)
+        if self.status == STATUS_RESTORED and database.get_deletion_journal(self.id):
+            # Some files could not be put back; keep the batch restorable so it can be retried.
+            self.status = STATUS_COMPLETED
+            self._persist()
+
+    def purge(self):
+        self._run(database.get_deletion_journal(self.id), self._purge_one, STATUS_PURGED)
+        # An interrupted purge leaves journal entries whose staged files must stay restorable.
+        if self.status == STATUS_PURGED:
+            shutil.rmtree(self.trash_path, ignore_errors=True)
+
+    def _run(self, items, handle, final_status):
+        try:
+            for item in items:
+                handle(item)
+                if time.monotonic() - self._persisted_at >= PERSIST_INTERVAL:
+                    self._persist()
+            self.status = final_status
+        except Exception as e:
+            print(f"Deletion batch {self.id} stopped: {e}")
+            self.status = STATUS_INTERRUPTED
+        finally:
+            self.finished_at = _now()
+            self._persist()
+
+    def _delete_one(self, image_no):
+        image = database.get_image_by_id(image_no)
+        if image is None:
+            self.failed += 1
+            database.journal_deletion_failure(self.id, image_no, None, "Image not found")
+            return
+        filepath = database.resolve_library_path(image["filepath"], self.base_path)
+        trash_path = None
+        try:
+            if os.path.exists(filepath):
+                thumbnails.cache.invalidate(filepath)
+                trash_path = os.path.join(self.trash_path, f"{image_no}_{os.path.basename(filepath)}")
+                os.makedirs(self.trash_path, exist_ok=True)
+                os.rename(filepath, trash_path)
+            try:
+                database.journal_image_deletion(
+                    self.id, image_no, database.to_library_path(trash_path, self.base_path) if trash_path else None)
+            except Exception:
+                if trash_path:
+                    os.rename(trash_path, filepath)
+                raise
+        except Exception as e:
+            print(f"이미지 삭제 실패 ({filepath}): {e}")
+            self.failed += 1
+            database.journal_deletion_failure(self.id, image_no, image["filepath"], e)
+            return
+        self.deleted += 1
+
+    def _restore_one(self, entry):
+        original = database.resolve_library_path(entry["filepath"], self.base_path)
+        staged = database.resolve_library_path(entry["trash_path"], self.base_path) if entry["trash_path"] else None
+        try:
+            if staged is not None:
+                if os.path.exists(original):
+                    raise FileExistsError(f"A file already exists at {original}")
+                os.makedirs(os.path.dirname(original), exist_ok=True)
+                os.rename(staged, original)
+            try:
+                database.restore_journal_entry(self.id, entry["image_no"])
+            except Exception:
+                if staged is not None:
+                    os.rename(original, staged)
+                raise
+        except Exception as e:
+            print(f"이미지 복원 실패 ({original}): {e}")
+            return
+        self.restored += 1
+
+    def _purge_one(self, entry):
+        if entry["trash_path"]:
+            staged = database.resolve_library_path(entry["trash_path"], self.base_path)
+            if os.path.exists(staged):
+                send2trash.send2trash(staged)
+        database.mark_journal_purged(self.id, entry["image_no"])
+
+    def _persist(self):
+        database.save_deletion_batch(self.to_dict())
+        self._persisted_at = time.monotonic()
+
+
+class DeletionJobManager:
+    """
+    Runs deletion, restore and purge jobs on a small thread pool so file
+    operations never block the event loop. Jobs on the pool are served from
+    memory; everything else is read from the DeletionBatch table.
+    """
+
+    def __init__(self, workers=DELETION_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="deletion")
+        self._lock = threading.Lock()
+        self._active = {}
+        self._retention_stop = threading.Event()
+        self._retention_thread = None
+
+    def start_retention(self, get_base_path, interval=RETENTION_CHECK_INTERVAL):
+        """
+        Purges expired batches now and then every interval seconds on a background
+        thread. get_base_path() returns the current library path, or None if unset.
+        """
+        def run():
+            while True:
+                base_path = get_base_path()
+                if base_path:
+                    try:
+                        self._purge_expired(base_path)
+                    except Exception as e:
+                        print(f"Purging expired deletion batches failed: {e}")
+                    finally:
+                        database.close_db_connection()
+                if self._retention_stop.wait(interval):
+                    return
+
+        self._retention_stop.clear()
+        self._retention_thread = threading.Thread(target=run, name="deletion-retention", daemon=True)
+        self._retention_thread.start()
+
+    def stop_retention(self):
+        self._retention_stop.set()
+        if self._retention_thread is not None:
+            self._retention_thread.join()
+            self._retention_thread = None
+
+    def delete(self, image_ids, base_path: str):
+        """Starts deleting image_ids and returns the job."""
+        self._purge_expired(base_path)
+        job = DeletionJob(uuid.uuid4().hex, base_path, image_ids)
+        job._persist()
+        self._submit(job, job.delete)
+        return job
+
+    def restore(self, batch_id: str, base_path: str):
+        """
+        Starts moving a batch's files and rows back. Returns None if the batch is unknown.
+        Raises DeletionBatchUnavailable instead of waiting while a scan holds scanner.ingest_lock.
+        """
+        if not scanner.ingest_lock.acquire(blocking=False):
+            raise DeletionBatchUnavailable("A scan is adding images to the library. Try again when it finishes.")
+        try:
+            job = self._start(batch_id, base_path, STATUS_RESTORING, "restore", scanner.ingest_lock)
+        except BaseException:
+            scanner.ingest_lock.release()
+            raise
+        if job is None:
+            scanner.ingest_lock.release()
+        return job
+
+    def purge(self, batch_id: str, base_path: str):
+        """Starts sending a batch's staged files to the system trash. Returns None if the batch is unknown."""
+        return self._start(batch_id, base_path, STATUS_PURGING, "purge")
+
+    def get(self, batch_id: str):
+        """Returns the status dict of a batch, or None if it is unknown."""
+        job = self._active.get(batch_id)
+        if job is not None:
+            return job.to_dict()
+        return database.get_deletion_batch(batch_id)
+
+    def _start(self, batch_id, base_path, status, action, held_lock=None):
+        """Submits the action; held_lock (already acquired) is released when the job ends."""
+        with self._lock:
+            if batch_id in self._active:
+                raise DeletionBatchUnavailable(f"Deletion batch {batch_id} is busy.")
+            record = database.get_deletion_batch(batch_id)
+            if record is None:
+                return None
+            if record["status"] not in RESTORABLE_STATUSES:
+                raise DeletionBatchUnavailable(f"Deletion batch {batch_id} is {record['status']}.")
+            job = DeletionJob.from_record(record, base_path)
+            job.status = status
+            job._persist()
+            self._active[batch_id] = job
+        self._executor.submit(self._run, job, getattr(job, action), held_lock)
+        return job
+
+    def _submit(self, job, action):
+        with self._lock:
+            self._active[job.id] = job
+        self._executor.submit(self._run, job, action)
+
+    def _run(self, job, action, held_lock=None):
+        try:
+            action()
+        finally:
+            if held_lock is not None:
+                held_lock.release()
+            with self._lock:
+                self._active.pop(job.id, None)
+
+    def _purge_expired(self, base_path):
+        created_before = (datetime.datetime.now() - DELETION_RETENTION).isoformat(timespec="seconds")
+        for batch_id in database.get_deletion_batches_before(created_before, RESTORABLE_STATUSES):
+            try:
+                self.purge(batch_id, base_path)
+            except DeletionBatchUnavailable:
+                continue
+
+
+manager = DeletionJobManager()
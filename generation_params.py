@@ -0,0 +1,100 @@
+import re
+
+# 메타데이터에서 꺼내 NAIimgInfo의 타입 있는 컬럼으로 저장하는 생성 파라미터 (컬럼 이름 -> SQLite 타입)
+PARAM_COLUMNS = {
+    "seed": "INTEGER",
+    "steps": "INTEGER",
+    "scale": "REAL",
+    "sampler": "TEXT",
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "cfg_rescale": "REAL",
+}
+_CONVERTERS = {"INTEGER": int, "REAL": float, "TEXT": str}
+_SQLITE_INT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+# SD parameters 문자열의 마지막 줄: "Steps: 20, Sampler: Euler a, CFG scale: 7, Seed: 1, Size: 512x768, ..."
+_SD_FIELD = re.compile(r'(?:^|,\s*)(Steps|Sampler|CFG scale|Seed|Size|CFG rescale(?: phi)?):\s*([^,]+)')
+_SD_FIELD_COLUMNS = {"Steps": "steps", "Sampler": "sampler", "CFG scale": "scale", "Seed": "seed",
+                     "CFG rescale": "cfg_rescale", "CFG rescale phi": "cfg_rescale"}
+
+# 필터 식: "steps>=28", "sampler=k_euler_ancestral", "width!=832"
+_FILTER = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$')
+
+
+def _coerce(column, value):
+    """값을 컬럼 타입으로 변환합니다. 변환할 수 없으면 None."""
+    if value is None or isinstance(value, bool):
+        return None
+    sql_type = PARAM_COLUMNS[column]
+    try:
+        if sql_type == "INTEGER" and isinstance(value, str):
+            value = float(value)
+        if sql_type == "INTEGER" and isinstance(value, float) and not value.is_integer():
+            return None
+        converted = _CONVERTERS[sql_type](value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if sql_type == "INTEGER" and not _SQLITE_INT_RANGE[0] <= converted <= _SQLITE_INT_RANGE[1]:
+        return None
+    if sql_type == "TEXT":
+        converted = converted.strip()
+    return converted if converted != "" else None
+
+
+def _sd_params(parameters):
+    """SD parameters 문자열에서 생성 파라미터를 읽습니다."""
+    lines = [line for line in parameters.splitlines() if 'Steps:' in line]
+    if not lines:
+        return {}
+    raw = {}
+    for name, value in _SD_FIELD.findall(lines[-1]):
+        if name == "Size":
+            width, _, height = value.partition('x')
+            raw["width"], raw["height"] = width, height
+        else:
+            raw[_SD_FIELD_COLUMNS[name]] = value
+    return raw
+
+
+def extract_params(metadata):
+    """
+    이미지 메타데이터에서 생성 파라미터를 {컬럼: 값} 형태로 추출합니다. 없는 값은 None입니다.
+    NovelAI는 메타데이터의 같은 이름 키를, Stable Diffusion은 parameters 문자열을 사용합니다.
+    """
+    if not isinstance(metadata, dict):
+        metadata = {}
+    if metadata.get('Software') == 'StableDiffusion' and isinstance(metadata.get('prompt'), str):
+        raw = _sd_params(metadata['prompt'])
+    else:
+        raw = metadata
+    return {column: _coerce(column, raw.get(column)) for column in PARAM_COLUMNS}
+
+
+def parse_param_filters(expressions):
+    """
+    "steps>=28" 같은 필터 식 목록(쉼표로 여러 개를 이어 쓸 수도 있음)을 (컬럼, 연산자, 값) 목록으로 변환합니다.
+    알 수 없는 컬럼, 연산자, 값이면 ValueError가 발생합니다.
+    """
+    filters = []
+    for expression in expressions or ():
+        for part in expression.split(','):
+            if not part.strip():
+                continue
+            match = _FILTER.match(part)
+            if not match or match.group(1) not in PARAM_COLUMNS:
+                raise ValueError(f"Invalid parameter filter: {part.strip()}")
+            column, operator, raw_value = match.groups()
+            value = _coerce(column, raw_value)
+            if value is None:
+                raise ValueError(f"Invalid value for {column}: {raw_value}")
+            filters.append((column, operator, value))
+    return filters
+
+
+def parse_param_sort(sort_by):
+    """sort_by가 "steps_asc" / "steps_desc" 형식이면 (컬럼, "ASC"|"DESC")를, 아니면 None을 반환합니다."""
+    column, _, direction = (sort_by or '').rpartition('_')
+    if column in PARAM_COLUMNS and direction in ("asc", "desc"):
+        return column, direction.upper()
+    return None
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, QueryParams
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+
+# Local modules
+import metrics
+
+# Versioned URLs (?v=...) change whenever their content does, so they can be cached forever.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unversioned URLs may be cached but must be revalidated (cheap: a 304 against the ETag).
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# Headers a 304 response repeats from the full response (RFC 9110 15.4.5)
+_NOT_MODIFIED_HEADERS = ("cache-control", "content-location", "date", "etag", "expires", "vary")
+# Request scope key where CachingStaticFiles keeps whether the requested version is current
+_VERSIONED_SCOPE_KEY = "http_cache.versioned"
+
+
+def strong_etag(*identity):
+    """Returns a strong ETag built from values that change whenever the content does."""
+    digest = hashlib.sha1("\0".join(str(part) for part in identity).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def file_etag(stat_result):
+    """Strong ETag of a file from its size and nanosecond mtime."""
+    return strong_etag(stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def not_modified_response(headers):
+    return Response(status_code=304, headers={key: value for key, value in headers.items()
+                                              if key.lower() in _NOT_MODIFIED_HEADERS})
+
+
+class TransferStats:
+    """
+    Counts what the image and thumbnail endpoints sent and what 304s saved,
+    so the effect of browser caching can be measured.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+    def record_sent(self, nbytes):
+        with self._lock:
+            self.bytes_sent += nbytes
+
+    def record_response(self):
+        metrics.record_cache("http_revalidation", False)
+        with self._lock:
+            self.responses += 1
+
+    def record_not_modified(self, nbytes):
+        metrics.record_cache("http_revalidation", True)
+        with self._lock:
+            self.responses += 1
+            self.not_modified += 1
+            self.bytes_saved += nbytes
+
+    def snapshot(self):
+        with self._lock:
+            total = self.bytes_sent + self.bytes_saved
+            return {
+                "responses": self.responses,
+                "not_modified": self.not_modified,
+                "bytes_sent": self.bytes_sent,
+                "bytes_saved": self.bytes_saved,
+                "saved_ratio": round(self.bytes_saved / total, 4) if total else 0.0,
+            }
+
+
+transfer_stats = TransferStats()
+
+
+class CountedFileResponse(FileResponse):
+    """FileResponse (with its Range support) that adds the body bytes it sends to transfer_stats."""
+
+    async def __call__(self, scope, receive, send):
+        async def counting_send(message):
+            if message["type"] == "http.response.body":
+                transfer_stats.record_sent(len(message.get("body", b"")))
+            elif message["type"] == "http.response.pathsend":
+                transfer_stats.record_sent(self.stat_result.st_size if self.stat_result else 0)
+            await send(message)
+
+        transfer_stats.record_response()
+        await super().__call__(scope, receive, counting_send)
+
+
+def file_response(request_headers, path, stat_result, etag, cache_control, media_type=None, status_code=200):
+    """
+    Returns a 304 if the client already has etag, otherwise a counted
+    FileResponse for path (which also answers Range requests).
+    """
+    headers = {"etag": etag, "cache-control": cache_control}
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        transfer_stats.record_not_modified(stat_result.st_size)
+        return not_modified_response(headers)
+    return CountedFileResponse(path, status_code=status_code, media_type=media_type, stat_result=stat_result,
+                               headers=headers)
+
+
+class CachingStaticFiles(StaticFiles):
+    """
+    StaticFiles with strong ETags from the file identity. A request is served
+    as immutable only when its version (?v=...) equals current_version(path)
+    for the '/'-separated relative path; others must revalidate.
+    current_version may query the database, so it runs in the threadpool and
+    only for versioned requests. Top-level folders named in hidden_dirs are never served.
+    """
+
+    def __init__(self, *args, current_version=None, hidden_dirs=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.current_version = current_version
+        self.hidden_dirs = {os.path.normcase(name) for name in hidden_dirs}
+
+    async def get_response(self, path, scope):
+        # path is already normalized, so "a/../.trash/x" arrives as ".trash/x".
+        if os.path.normcase(path.split(os.sep, 1)[0]) in self.hidden_dirs:
+            raise HTTPException(status_code=404)
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        versioned = (version is not None and self.current_version is not None
+                     and version == await run_in_threadpool(self.current_version, path.replace(os.sep, "/")))
+        # file_response is called synchronously by StaticFiles, so the result travels in the request scope.
+        scope[_VERSIONED_SCOPE_KEY] = versioned
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        versioned = scope.get(_VERSIONED_SCOPE_KEY, False)
+        return file_response(Headers(scope=scope), full_path, stat_result, file_etag(stat_result),
+                             IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+                             status_code=status_code)
@@ -0,0 +1,196 @@
+import functools
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Local modules
+import database
+import metrics
+
+# dHash compares each pixel of a (HASH_SIZE + 1) x HASH_SIZE grayscale thumbnail
+# with its right neighbour, giving a 64-bit hash that survives resizing,
+# recompression and small edits. Near-identical images differ in a few bits.
+HASH_SIZE = 8
+SIMILAR_DISTANCE = 8
+DUPLICATE_DISTANCE = 3
+MAX_SIMILAR_DISTANCE = 16
+# Clustering probes 1 + 16 + 120 ... band variants per extra bit of radius, so
+# the library-wide report is limited to radius 1 (distance < 2 * BANDS).
+MAX_DUPLICATE_DISTANCE = 7
+
+# Multi-index hashing: the 64-bit hash is split into BANDS bands. Two hashes
+# within distance k share at least one band within floor(k / BANDS) bits
+# (pigeonhole), so only those band values need to be looked up.
+BANDS = 4
+BAND_BITS = 64 // BANDS
+_BAND_MASK = np.uint64((1 << BAND_BITS) - 1)
+# Upper bound on candidate pairs materialized at once while clustering.
+PAIR_CHUNK_SIZE = 4_000_000
+
+
+def dhash(img):
+    """Returns the 64-bit difference hash of a PIL image as a signed integer (SQLite INTEGER range)."""
+    small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big", signed=True)
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _band_masks(radius):
+    """Every BAND_BITS-bit mask with at most radius bits set, fewest bits first."""
+    masks = [mask for mask in range(1 << BAND_BITS) if mask.bit_count() <= radius]
+    return np.array(sorted(masks, key=int.bit_count), dtype=np.uint64)
+
+
+def _expand_ranges(lo, hi):
+    """For ranges [lo[i], hi[i]) returns (owner, position) arrays listing every position of every range."""
+    counts = hi - lo
+    total = int(counts.sum())
+    owners = np.repeat(np.arange(len(lo)), counts)
+    positions = np.arange(total) + np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    return owners, positions
+
+
+class HashIndex:
+    """
+    In-memory multi-index over the perceptual hashes of the library. Each band
+    keeps its values sorted, so a band lookup is a binary search and a whole
+    batch of lookups is one vectorized np.searchsorted.
+    """
+
+    def __init__(self, image_nos, hashes):
+        self.image_nos = np.asarray(image_nos, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype=np.int64).view(np.uint64)
+        self._bands = []
+        for band in range(BANDS):
+            values = (self.hashes >> np.uint64(band * BAND_BITS)) & _BAND_MASK
+            order = np.argsort(values, kind="stable")
+            self._bands.append((values[order], order))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def neighbors(self, phash, distance):
+        """Returns [(image_no, distance)] of every hash within distance of phash, nearest first."""
+        query = np.array([phash], dtype=np.int64).view(np.uint64)[0]
+        masks = _band_masks(distance // BANDS)
+        candidates = []
+        for band, (values, order) in enumerate(self._bands):
+            keys = ((query >> np.uint64(band * BAND_BITS)) & _BAND_MASK) ^ masks
+            lo = np.searchsorted(values, keys, "left")
+            hi = np.searchsorted(values, keys, "right")
+            candidates.append(order[_expand_ranges(lo, hi)[1]])
+        candidates = np.unique(np.concatenate(candidates))
+        distances = _popcount(self.hashes[candidates] ^ query)
+        keep = distances <= distance
+        candidates, distances = candidates[keep], distances[keep]
+        ranked = np.lexsort((self.image_nos[candidates], distances))
+        return [(int(self.image_nos[candidates[i]]), int(distances[i])) for i in ranked]
+
+    def pairs_within(self, distance):
+        """Returns (a, b) position arrays, a < b, of every pair of entries within distance of each other."""
+        masks = _band_masks(distance // BANDS)
+        found = []
+        for values, order in self._bands:
+            for mask in masks:
+                lo = np.searchsorted(values, values ^ mask, "left")
+                hi = np.searchsorted(values, values ^ mask, "right")
+                counts = hi - lo
+                bounds = np.searchsorted(np.cumsum(counts), np.arange(PAIR_CHUNK_SIZE, int(counts.sum()),
+                                                                        PAIR_CHUNK_SIZE))
+                for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(values)]):
+                    owners, positions = _expand_ranges(lo[start:stop], hi[start:stop])
+                    a, b = order[owners + start], order[positions]
+                    keep = a < b
+                    a, b = a[keep], b[keep]
+                    keep = _popcount(self.hashes[a] ^ self.hashes[b]) <= distance
+                    found.append((a[keep], b[keep]))
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pairs = np.unique(np.stack([np.concatenate([a for a, _ in found]),
+                                    np.concatenate([b for _, b in found])], axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+
+def _connected_components(count, a, b):
+    """Labels count nodes by connected component of the edges (a, b) (label = smallest node)."""
+    labels = np.arange(count)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def find_duplicate_clusters(index, distance=DUPLICATE_DISTANCE):
+    """
+    Groups the library into clusters of images connected by hashes within
+    distance of each other. Identical hashes are collapsed first, so exact
+    duplicates cost nothing. Returns lists of image numbers, largest first.
+    """
+    if not len(index):
+        return []
+    unique, inverse = np.unique(index.hashes, return_inverse=True)
+    a, b = HashIndex(np.arange(len(unique)), unique.view(np.int64)).pairs_within(distance)
+    labels = _connected_components(len(unique), a, b)[inverse.reshape(-1)]
+    order = np.lexsort((index.image_nos, labels))
+    labels, image_nos = labels[order], index.image_nos[order]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    clusters = [group.tolist() for group in np.split(image_nos, starts[1:]) if len(group) > 1]
+    clusters.sort(key=lambda group: (-len(group), group[0]))
+    return clusters
+
+
+_index = None
+_index_generation = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the HashIndex of the library, rebuilt from the DB whenever the image set has changed."""
+    global _index, _index_generation
+    with _index_lock:
+        generation = database.data_generation()
+        stale = _index is None or _index_generation != generation
+        metrics.record_cache("hash_index", not stale)
+        if stale:
+            _index = HashIndex(*database.get_perceptual_hashes())
+            _index_generation = generation
+        return _index
+
+
+def backfill_hashes(base_path, batch_size=500):
+    """
+    Computes the hash of every image stored before hashing existed (or whose
+    hashing failed). Decodes each file once; runs off the request path.
+
+    :return: number of images hashed
+    """
+    hashed = 0
+    last_no = 0
+    while True:
+        rows = database.get_images_without_phash(last_no, batch_size)
+        if not rows:
+            return hashed
+        last_no = rows[-1]["no"]
+        updates = []
+        for row in rows:
+            try:
+                with Image.open(database.resolve_library_path(row["filepath"], base_path)) as img:
+                    updates.append((dhash(img), row["no"]))
+            except Exception as e:
+                print(f"Failed to hash {row['filepath']}: {e}")
+        database.set_perceptual_hashes(updates)
+        hashed += len(updates)
@@ -1,185 +1,309 @@
 import os
 import json
 import gzip
+import hashlib
+import time
+import numpy as np
 from PIL import Image
 from datetime import datetime
 import traceback
 
+import image_hash
+import png_reader
+
+# 동일한 파일 판별용 콘텐츠 해시를 계산할 때 한 번에 읽는 크기
+CONTENT_HASH_BLOCK_SIZE = 1024 * 1024
+# 분류 폴더에 같은 이름의 다른 파일이 있을 때의 처리: 건너뜀 / 이름 뒤에 번호 붙이기 / 덮어쓰기
+DUPLICATE_POLICIES = ("skip", "rename", "replace")
+
+STEALTH_ALPHA_SIGNATURES = {b'stealth_pnginfo': False, b'stealth_pngcomp': True}
+STEALTH_RGB_SIGNATURES = {b'stealth_rgbinfo': False, b'stealth_rgbcomp': True}
+STEALTH_SIG_BITS = len('stealth_pnginfo') * 8
+STEALTH_LEN_BITS = 32
+
+def _stealth_lsb_planes(image, pixel_count):
+    """
+    이미지 앞쪽 열들만 NumPy 배열로 읽어 열 우선(column-major) 순서의 LSB 비트열을 반환합니다.
+
+    :return: (alpha 비트열 또는 None, RGB 비트열) - RGB 비트열은 픽셀마다 r, g, b 순서입니다.
+    """
+    width, height = image.size
+    columns = min(width, -(-pixel_count // height))
+    block = np.asarray(image.crop((0, 0, columns, height)))
+    # (height, columns, channels) -> (columns, height, channels): x 바깥, y 안쪽 순회와 동일한 순서
+    block = block.transpose(1, 0, 2) & 1
+    alpha_bits = block[..., 3].reshape(-1) if image.mode == 'RGBA' else None
+    rgb_bits = block[..., :3].reshape(-1)
+    return alpha_bits, rgb_bits
+
+def _png_lsb_planes(png, pixel_count, mode=None):
+    """
+    _stealth_lsb_planes와 같은 비트열을 PngReader에서 앞쪽 열만 복원해 만듭니다.
+    mode('alpha' / 'rgb')를 주면 그 채널만 복원하고 다른 비트열은 None입니다.
+    """
+    if pixel_count <= png.height:
+        columns, rows = 1, pixel_count
+    else:
+        columns, rows = -(-pixel_count // png.height), png.height
+    channels = {'alpha': (3,), 'rgb': (0, 1, 2)}.get(mode)
+    block = png.read_columns(columns, rows, channels)
+    if block is None:
+        raise png_reader.PngFormatError("cannot decode stealth pixels")
+    block = block.transpose(1, 0, 2) & 1
+    if mode == 'alpha':
+        return block[..., 0].reshape(-1), None
+    if mode == 'rgb':
+        return None, block.reshape(-1)
+    alpha_bits = block[..., 3].reshape(-1) if png.mode == 'RGBA' else None
+    return alpha_bits, block[..., :3].reshape(-1)
+
+def _stealth_bits_to_bytes(bits):
+    """
+    비트열을 바이트로 변환합니다.
+    마지막 8비트 미만 조각은 기존 디코더와 같게 남은 비트만으로 정수를 만듭니다.
+    """
+    full = len(bits) // 8 * 8
+    data = np.packbits(bits[:full]).tobytes()
+    rest = bits[full:]
+    if rest.size:
+        data += bytes([int(''.join(str(bit) for bit in rest), 2)])
+    return data
+
 def read_info_from_image_stealth(image):
+    """
+    알파 채널 또는 RGB 채널의 LSB에 숨겨진 stealth pnginfo를 읽습니다.
+
+    픽셀을 하나씩 순회하는 대신 필요한 앞쪽 열만 배열로 가져와 np.packbits로 해석합니다.
+    stealth_pnginfo / stealth_pngcomp / stealth_rgbinfo / stealth_rgbcomp 네 가지 서명을 지원하며,
+    정보가 없으면 빈 문자열을 반환합니다.
+    """
     # if tensor, convert to PIL image
     if hasattr(image, 'cpu'):
         image = image.cpu().numpy() #((1, 1, 1280, 3), '<f4')
         image = image[0].astype('uint8') #((1, 1280, 3), 'uint8')
         image = Image.fromarray(image)
-    # trying to read stealth pnginfo
+    if image.mode not in ('RGB', 'RGBA'):
+        return ''
     width, height = image.size
-    pixels = image.load()
+    return _decode_stealth(lambda pixel_count, mode=None: _stealth_lsb_planes(image, pixel_count), width, height)
 
-    has_alpha = True if image.mode == 'RGBA' else False
+def _decode_stealth(read_planes, width, height):
+    """
+    read_planes(pixel_count, mode)가 반환하는 앞쪽 픽셀들의 LSB 비트열(alpha, RGB)에서 stealth pnginfo를 해석합니다.
+    서명을 찾은 뒤에는 mode('alpha' / 'rgb')를 넘겨 그 채널의 비트열만 요청합니다.
+    """
+    header_bits = STEALTH_SIG_BITS + STEALTH_LEN_BITS
+    alpha_bits, rgb_bits = read_planes(header_bits)
+
+    # RGB 서명(40픽셀)이 알파 서명(120픽셀)보다 먼저 확인됩니다.
     mode = None
     compressed = False
-    binary_data = ''
-    buffer_a = ''
-    buffer_rgb = ''
-    index_a = 0
-    index_rgb = 0
-    sig_confirmed = False
-    confirming_signature = True
-    reading_param_len = False
-    reading_param = False
-    read_end = False
-    never_confirmed = True
-    for x in range(width):
-        for y in range(height):
-            if has_alpha:
-                r, g, b, a = pixels[x, y]
-                buffer_a += str(a & 1)
-                index_a += 1
-            else:
-                r, g, b = pixels[x, y]
-            buffer_rgb += str(r & 1)
-            buffer_rgb += str(g & 1)
-            buffer_rgb += str(b & 1)
-            index_rgb += 3
-            if confirming_signature:
-                if x * height + y > 120 and never_confirmed:
-                    return ''
-                if index_a == len('stealth_pnginfo') * 8:
-                    decoded_sig = bytearray(int(buffer_a[i:i + 8], 2) for i in
-                                            range(0, len(buffer_a), 8)).decode('utf-8', errors='ignore')
-                    if decoded_sig in {'stealth_pnginfo', 'stealth_pngcomp'}:
-                        #print(f"Found signature at {x}, {y}")
-                        confirming_signature = False
-                        sig_confirmed = True
-                        reading_param_len = True
-                        mode = 'alpha'
-                        if decoded_sig == 'stealth_pngcomp':
-                            compressed = True
-                        buffer_a = ''
-                        index_a = 0
-                        never_confirmed = False
-                    else:
-                        read_end = True
-                        break
-                elif index_rgb == len('stealth_pnginfo') * 8:
-                    decoded_sig = bytearray(int(buffer_rgb[i:i + 8], 2) for i in
-                                            range(0, len(buffer_rgb), 8)).decode('utf-8', errors='ignore')
-                    if decoded_sig in {'stealth_rgbinfo', 'stealth_rgbcomp'}:
-                        #print(f"Found signature at {x}, {y}")
-                        confirming_signature = False
-                        sig_confirmed = True
-                        reading_param_len = True
-                        mode = 'rgb'
-                        if decoded_sig == 'stealth_rgbcomp':
-                            compressed = True
-                        buffer_rgb = ''
-                        index_rgb = 0
-                        never_confirmed = False
-            elif reading_param_len:
-                if mode == 'alpha':
-                    if index_a == 32:
-                        param_len = int(buffer_a, 2)
-                        reading_param_len = False
-                        reading_param = True
-                        buffer_a = ''
-                        index_a = 0
-                else:
-                    if index_rgb == 33:
-                        pop = buffer_rgb[-1]
-                        buffer_rgb = buffer_rgb[:-1]
-                        param_len = int(buffer_rgb, 2)
-                        reading_param_len = False
-                        reading_param = True
-                        buffer_rgb = pop
-                        index_rgb = 1
-            elif reading_param:
-                if mode == 'alpha':
-                    if index_a == param_len:
-                        binary_data = buffer_a
-                        read_end = True
-                        break
-                else:
-                    if index_rgb >= param_len:
-                        diff = param_len - index_rgb
-                        if diff < 0:
-                            buffer_rgb = buffer_rgb[:diff]
-                        binary_data = buffer_rgb
-                        read_end = True
-                        break
-            else:
-                # impossible
-                read_end = True
-                break
-        if read_end:
-            break
+    if rgb_bits.size >= STEALTH_SIG_BITS:
+        signature = np.packbits(rgb_bits[:STEALTH_SIG_BITS]).tobytes()
+        if signature in STEALTH_RGB_SIGNATURES:
+            mode = 'rgb'
+            compressed = STEALTH_RGB_SIGNATURES[signature]
+    if mode is None and alpha_bits is not None and alpha_bits.size >= STEALTH_SIG_BITS:
+        signature = np.packbits(alpha_bits[:STEALTH_SIG_BITS]).tobytes()
+        if signature in STEALTH_ALPHA_SIGNATURES:
+            mode = 'alpha'
+            compressed = STEALTH_ALPHA_SIGNATURES[signature]
+    if mode is None:
+        return ''
+
+    bits_per_pixel = 3 if mode == 'rgb' else 1
+    bits = rgb_bits if mode == 'rgb' else alpha_bits
+    if bits.size < header_bits:
+        return ''
+    param_len = int.from_bytes(np.packbits(bits[STEALTH_SIG_BITS:header_bits]).tobytes(), 'big')
+    if param_len == 0:
+        return ''
+
+    needed = header_bits + param_len
+    if needed > width * height * bits_per_pixel:
+        return ''
+    if bits.size < needed:
+        alpha_bits, rgb_bits = read_planes(-(-needed // bits_per_pixel), mode)
+        bits = rgb_bits if mode == 'rgb' else alpha_bits
+
+    byte_data = _stealth_bits_to_bytes(bits[header_bits:needed])
     geninfo = ''
-    if sig_confirmed and binary_data != '':
-        # Convert binary string to UTF-8 encoded text
-        byte_data = bytearray(int(binary_data[i:i + 8], 2) for i in range(0, len(binary_data), 8))
-        try:
-            if compressed:
-                decoded_data = gzip.decompress(bytes(byte_data)).decode('utf-8')
-            else:
-                decoded_data = byte_data.decode('utf-8', errors='ignore')
-            geninfo = decoded_data
-        except:
-            pass
-    return str(geninfo)
+    try:
+        if compressed:
+            geninfo = gzip.decompress(byte_data).decode('utf-8')
+        else:
+            geninfo = byte_data.decode('utf-8', errors='ignore')
+    except Exception:
+        pass
+    return geninfo
 
 def check_img_width(img):
     width, _ = img.size
     return width
 
-def check_platform_name(img):
-    metadata = img.info
+def _platform_from_info(info, stealth_info):
+    """텍스트 청크(info)와 stealth 정보를 읽는 함수로 플랫폼 이름을 판별합니다."""
     try:
-        if 'Comment' in metadata:
+        if 'Comment' in info:
             return "NovelAI"
-        elif 'parameters' in metadata:
+        elif 'parameters' in info:
             return "StableDiffusion"
         else:
-            stealth_info = read_info_from_image_stealth(img)
-            if stealth_info:
-                return json.loads(stealth_info).get('Software', "Unknown")
+            stealth = stealth_info()
+            if stealth:
+                return json.loads(stealth).get('Software', "Unknown")
             return "Unknown"
     except Exception:
         return "Unknown"
 
-def process_image(image_path, dest_root_path):
+def check_platform_name(img):
+    return _platform_from_info(img.info, lambda: read_info_from_image_stealth(img))
+
+def _has_stealth_signature(png):
     """
-    이미지 파일을 처리하고, 메타데이터를 추출하며, 파일을 분류/이동합니다.
+    첫 열의 앞쪽 픽셀만 디코딩해 stealth 서명이 있을 수 있는지 확인합니다.
+    서명이 없으면 False, 확인할 수 없으면(지원하지 않는 형식 등) None을 반환합니다.
+    """
+    if png.mode is None:
+        # 팔레트/흑백 이미지는 PIL에서도 RGB/RGBA가 아니므로 stealth 정보가 없습니다.
+        return False if png.color_type in (0, 3, 4) else None
+    pixels = png.read_leading_pixels(STEALTH_SIG_BITS)
+    if pixels is None:
+        return None
+    lsb = pixels & 1
+    if np.packbits(lsb[:STEALTH_SIG_BITS // 3, :3].reshape(-1)).tobytes() in STEALTH_RGB_SIGNATURES:
+        return True
+    return png.mode == 'RGBA' and np.packbits(lsb[:, 3]).tobytes() in STEALTH_ALPHA_SIGNATURES
+
+class _ImageSource:
+    """
+    이미지 파일 하나의 크기, 텍스트 청크, stealth 정보를 한 번의 읽기로 제공합니다.
+    PNG는 png_reader로 IDAT 앞까지만 읽고, stealth 정보가 필요하면 정보가 담긴 앞쪽 열만 복원합니다.
+    PNG가 아니거나 청크/픽셀을 읽지 못하면 PIL로 엽니다.
+    """
+
+    def __init__(self, image_path):
+        self.path = image_path
+        self.png = None
+        self._img = None
+        self._stealth = None
+        try:
+            self.png = png_reader.PngReader(image_path)
+            self.width = self.png.width
+            self.info = self.png.text
+        except png_reader.PngFormatError:
+            self.width = check_img_width(self.image())
+            self.info = self._img.info
+
+    def image(self):
+        """PIL 이미지를 (처음 필요할 때) 엽니다."""
+        if self._img is None:
+            self._img = Image.open(self.path)
+        return self._img
+
+    def stealth_info(self):
+        """stealth pnginfo 문자열을 반환합니다. 한 번만 디코딩합니다."""
+        if self._stealth is None and self.png is not None:
+            signature = _has_stealth_signature(self.png)
+            if signature is False:
+                self._stealth = ''
+            elif signature:
+                png = self.png
+                try:
+                    self._stealth = _decode_stealth(lambda pixel_count, mode=None: _png_lsb_planes(png, pixel_count, mode),
+                                                    png.width, png.height)
+                except png_reader.PngFormatError:
+                    pass
+        if self._stealth is None:
+            self._stealth = read_info_from_image_stealth(self.image())
+        return self._stealth
+
+    def close(self):
+        if self.png is not None:
+            self.png.close()
+        if self._img is not None:
+            self._img.close()
+
+def content_hash(path):
+    """파일 내용의 SHA-256 해시(16진수)를 블록 단위로 읽으며 계산합니다."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CONTENT_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def unique_dest_path(path):
+    """path가 이미 있으면 "이름_1.png", "이름_2.png" ... 중 아직 없는 경로를 반환합니다."""
+    stem, ext = os.path.splitext(path)
+    counter = 1
+    while os.path.exists(path):
+        path = f"{stem}_{counter}{ext}"
+        counter += 1
+    return path
+
+def get_dest_path(image_info, dest_root_path):
+    """분류 규칙(플랫폼/생성일자)에 따른 이동 대상 경로를 반환합니다."""
+    return os.path.join(dest_root_path, image_info['platform'], image_info['create_date'],
+                        os.path.basename(image_info['source_path']))
+
+def extract_image_info(image_path, dest_root_path=None, on_image=None, with_hash=True, with_content_hash=True):
+    """
+    이미지 파일에서 플랫폼과 메타데이터를 추출합니다. 파일은 이동하지 않습니다.
+    스캔 워커 프로세스에서 실행되므로 DB나 파일 시스템을 변경하지 않아야 합니다.
+    플랫폼 판별과 메타데이터 추출은 같은 _ImageSource를 공유하므로 파일은 한 번만 읽고,
+    stealth 정보도 한 번만 디코딩합니다.
 
     :param image_path: 처리할 원본 이미지 파일 경로
-    :param dest_root_path: 분류된 이미지가 저장될 최상위 경로
-    :return: 성공 시 {'new_path': str, 'make_time': str, 'platform': str, 'metadata': dict}, 실패 시 None
+    :param dest_root_path: 지정하면 이동 대상 파일이 이미 있을 때 메타데이터 추출을 건너뜁니다. (중복 정책이 skip일 때)
+    :param on_image: 열린 이미지로 추가 작업(썸네일 생성 등)을 할 콜백 on_image(img, image_info)
+    :param with_hash: 지각 해시(phash)를 계산할지 여부. 픽셀 전체를 디코딩하므로 메타데이터만 필요하면 끕니다.
+    :param with_content_hash: 파일 전체의 SHA-256(content_hash)을 계산할지 여부. 파일 전체를 읽으므로 메타데이터만 필요하면 끕니다.
+    :return: 성공 시 {'source_path', 'content_hash', 'make_time', 'create_date', 'platform', 'metadata', 'phash',
+             'stage_seconds'}, 실패 시 None. stage_seconds는 단계별(hash, open, detect, extract, phash, thumbnail) 소요 시간입니다.
     """
+    stage_seconds = {}
+    mark = time.perf_counter()
+
+    def lap(stage):
+        nonlocal mark
+        now = time.perf_counter()
+        stage_seconds[stage] = now - mark
+        mark = now
+
     try:
-        new_path = None
         metadata_dict = {}
-        platform = "Unknown"
-        make_time_str = ""
+        # 파일을 처음 읽는 단계이므로 여기서 전체를 훑어 해시를 구하면, 이후의 PNG 파싱/디코딩은 페이지 캐시에서 읽습니다.
+        file_hash = None
+        if with_content_hash:
+            file_hash = content_hash(image_path)
+            lap("hash")
 
-        with Image.open(image_path) as img:
-            platform = check_platform_name(img)
+        source = _ImageSource(image_path)
+        try:
+            lap("open")
+            platform = _platform_from_info(source.info, source.stealth_info)
+            lap("detect")
             make_time = datetime.fromtimestamp(os.path.getmtime(image_path))
-            make_time_str = make_time.strftime('%y%m%d_%H%M%S')
-            create_date_str = make_time.strftime('%y%m%d')
-
-            dest_folder = os.path.join(dest_root_path, platform, create_date_str)
-            os.makedirs(dest_folder, exist_ok=True)
-            
-            new_path = os.path.join(dest_folder, os.path.basename(image_path))
+            image_info = {
+                "source_path": image_path,
+                "content_hash": file_hash,
+                "make_time": make_time.strftime('%y%m%d_%H%M%S'),
+                "create_date": make_time.strftime('%y%m%d'),
+                "platform": platform,
+                "metadata": metadata_dict,
+                "stage_seconds": stage_seconds,
+            }
 
-            if os.path.exists(new_path):
-                print(f"File {os.path.basename(image_path)} already exists. Skipping.")
-                return None
+            # 이미 분류된 파일이면 메타데이터를 읽을 필요가 없습니다. (이동 단계에서 건너뜀)
+            if dest_root_path and os.path.exists(get_dest_path(image_info, dest_root_path)):
+                return image_info
 
             # 이미지 너비가 2000 이하일 때만 메타데이터 추출 시도
-            if check_img_width(img) <= 2000:
+            if source.width <= 2000:
                 try:
-                    raw_metadata = img.info
+                    raw_metadata = source.info
                     if 'Comment' in raw_metadata: # NovelAI
-                        metadata_dict = json.loads(raw_metadata['Comment'])
+                        metadata_dict.update(json.loads(raw_metadata['Comment']))
                         metadata_dict['Software'] = raw_metadata.get('Software', 'NovelAI')
                         metadata_dict['Source'] = raw_metadata.get('Source')
                         metadata_dict['Title'] = raw_metadata.get('Title')
@@ -187,7 +311,7 @@ def process_image(image_path, dest_root_path):
                         metadata_dict['prompt'] = raw_metadata['parameters']
                         metadata_dict['Software'] = 'StableDiffusion'
                     else: # Stealth PNG Info
-                        stealth_info = read_info_from_image_stealth(img)
+                        stealth_info = source.stealth_info()
                         if stealth_info:
                             full_info = json.loads(stealth_info)
                             comment_info = json.loads(full_info.get('Comment', '{}'))
@@ -198,20 +322,81 @@ def process_image(image_path, dest_root_path):
                 except Exception as e:
                     print(f"Error extracting metadata for {image_path}: {e}")
                     traceback.print_exc()
-        
-        # 'with' 블록이 끝난 후, 파일 핸들이 닫힌 상태에서 파일 이동
-        if new_path:
-            os.rename(image_path, new_path)
-            return {
-                "new_path": os.path.abspath(new_path),
-                "make_time": make_time_str,
-                "platform": platform,
-                "metadata": metadata_dict
-            }
-        
+            lap("extract")
+
+            # 유사 이미지 검색용 지각 해시. 썸네일 생성과 같은 디코딩 결과를 사용합니다.
+            if with_hash:
+                try:
+                    image_info['phash'] = image_hash.dhash(source.image())
+                except Exception as e:
+                    print(f"Error hashing {image_path}: {e}")
+                lap("phash")
+
+            if on_image is not None:
+                try:
+                    on_image(source.image(), image_info)
+                except Exception as e:
+                    print(f"Error in post-processing for {image_path}: {e}")
+                lap("thumbnail")
+        finally:
+            source.close()
+
+        return image_info
+
+    except Exception as e:
+        print(f"Error processing image {image_path}: {e}")
+        traceback.print_exc()
         return None
 
+def move_image(image_info, dest_root_path, duplicate_policy="skip"):
+    """
+    extract_image_info의 결과에 따라 파일을 분류 폴더로 이동합니다.
+    대상 경로에 같은 이름의 파일이 있으면 duplicate_policy에 따라 건너뛰거나(skip),
+    이름 뒤에 번호를 붙이거나(rename), 덮어씁니다(replace).
+
+    :return: 성공 시 {'source_path': str, 'new_path': str, 'content_hash': str, 'make_time': str, 'platform': str,
+             'metadata': dict, 'phash': int},
+             대상 파일이 이미 있어 건너뛰었거나 실패 시 None
+    """
+    image_path = image_info['source_path']
+    try:
+        new_path = get_dest_path(image_info, dest_root_path)
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+
+        if os.path.exists(new_path):
+            if duplicate_policy == "rename":
+                new_path = unique_dest_path(new_path)
+            elif duplicate_policy != "replace":
+                print(f"File {os.path.basename(image_path)} already exists. Skipping.")
+                return None
+
+        os.replace(image_path, new_path)
+        return {
+            "source_path": image_path,
+            "new_path": os.path.abspath(new_path),
+            "content_hash": image_info.get('content_hash'),
+            "make_time": image_info['make_time'],
+            "platform": image_info['platform'],
+            "metadata": image_info['metadata'],
+            "phash": image_info.get('phash')
+        }
+
     except Exception as e:
         print(f"Error processing image {image_path}: {e}")
         traceback.print_exc()
         return None
+
+def process_image(image_path, dest_root_path, duplicate_policy="skip"):
+    """
+    이미지 파일을 처리하고, 메타데이터를 추출하며, 파일을 분류/이동합니다.
+    내용이 같은 파일인지는 확인하지 않습니다. (스캔은 scanner가 DB의 콘텐츠 해시로 확인)
+
+    :param image_path: 처리할 원본 이미지 파일 경로
+    :param dest_root_path: 분류된 이미지가 저장될 최상위 경로
+    :param duplicate_policy: 같은 이름의 파일이 있을 때의 처리 (DUPLICATE_POLICIES 중 하나)
+    :return: 성공 시 move_image의 결과, 실패 시 None
+    """
+    image_info = extract_image_info(image_path, dest_root_path if duplicate_policy == "skip" else None)
+    if image_info is None:
+        return None
+    return move_image(image_info, dest_root_path, duplicate_policy)
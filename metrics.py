@@ -0,0 +1,215 @@
+import bisect
+import threading
+import time
+
+# In-process metrics served at /metrics in the Prometheus text format.
+# Recording is a dict lookup and a few additions under an uncontended lock,
+# so it can sit on every request and every scanned file.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds: sub-millisecond keyset pages up to multi-second thumbnail renders.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(self._copy_values().items())
+
+    def _copy_values(self):
+        return dict(self._values)
+
+    def collect(self):
+        """Returns the exposition lines of this metric."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._snapshot():
+            lines.extend(self._sample_lines(list(zip(self.labelnames, labels)), value))
+        return lines
+
+    def _sample_lines(self, pairs, value):
+        return [f"{self.name}{_format_labels(pairs)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label combination."""
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    """A value that is set, not accumulated."""
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Counts observations into fixed buckets and keeps their sum, per label combination."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # Prometheus buckets are inclusive upper bounds ("le"); the last slot is +Inf.
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *labels):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self, labels)
+
+    def _copy_values(self):
+        return {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+
+    def _sample_lines(self, pairs, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(pairs)} {cumulative}")
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "gallery_http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response, by route template.",
+    ("method", "route", "status"))
+GET_IMAGES_QUERY_SECONDS = Histogram(
+    "gallery_get_images_query_seconds",
+    "SQLite time of database.get_images by query shape: sort order, active filters, and page or count query.",
+    ("order", "filters", "part"))
+SCAN_STAGE_SECONDS = Histogram(
+    "gallery_scan_stage_seconds",
+    "Scan time per file and stage (hash, open, detect, extract, phash, thumbnail, move); insert is per committed batch.",
+    ("stage",))
+SCAN_FILES = Counter(
+    "gallery_scan_files_total",
+    "Files handled by scans and watch mode, by outcome (moved, duplicate, skipped, failed).",
+    ("outcome",))
+SCAN_THROUGHPUT = Gauge(
+    "gallery_scan_images_per_second",
+    "Images moved into the library per second by the current or most recent scan.")
+CACHE_REQUESTS = Counter(
+    "gallery_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ("cache", "result"))
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def _cache_hit_ratio_lines():
+    totals = {}
+    for (cache, result), count in CACHE_REQUESTS._snapshot():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result == "hit" else 0), lookups + count)
+    name = "gallery_cache_hit_ratio"
+    lines = [f"# HELP {name} Share of cache lookups answered from the cache since startup.",
+             f"# TYPE {name} gauge"]
+    for cache, (hits, lookups) in sorted(totals.items()):
+        lines.append(f"{name}{_format_labels([('cache', cache)])} {_format_value(hits / lookups)}")
+    return lines
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    lines.extend(_cache_hit_ratio_lines())
+    return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Requests are labelled with the
+    matched route template (/api/images/{image_id}, or the mount path for
+    static files) so the label set stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the (shared) scope; a mount
+            # such as /images only leaves its path behind as root_path.
+            route = getattr(scope.get("route"), "path", None) or scope.get("root_path") or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route, str(status))
@@ -0,0 +1,54 @@
+import hashlib
+
+import numpy as np
+
+# MinHash over an image's tag set: NUM_PERM hash functions h(x) = (a * x + b) mod p,
+# each keeping the minimum over the tags. Two sets agree on a given minimum with
+# probability equal to their Jaccard similarity.
+NUM_PERM = 64
+# LSH banding: BANDS bands of ROWS_PER_BAND minimums. Images sharing any whole
+# band land in the same bucket; with 16 x 4 the candidate probability passes 50%
+# at a Jaccard similarity of about (1 / 16) ** (1 / 4) = 0.5.
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Fixed seed: signatures are stored, so the permutations must never change.
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def _tag_hash(tag):
+    return int.from_bytes(hashlib.blake2b(tag.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def signature(tags):
+    """Returns the MinHash signature (NUM_PERM uint64 values) of a set of tag names, or None if it is empty."""
+    if not tags:
+        return None
+    # x, a and b are below 2**32, so a * x + b fits in 64 bits before the modulo.
+    x = np.fromiter((_tag_hash(tag) for tag in set(tags)), dtype=np.uint64)
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+
+def band_buckets(sig):
+    """Returns the BANDS bucket keys (signed 64-bit ints) of a signature, one per band."""
+    rows = sig.reshape(BANDS, ROWS_PER_BAND)
+    return [int.from_bytes(hashlib.blake2b(bytes([band]) + rows[band].tobytes(), digest_size=8).digest(),
+                           "little", signed=True)
+            for band in range(BANDS)]
+
+
+def pack_buckets(buckets):
+    return np.array(buckets, dtype=np.int64).tobytes()
+
+
+def unpack_buckets(data):
+    return np.frombuffer(data, dtype=np.int64).tolist()
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two sets."""
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
@@ -0,0 +1,240 @@
+"""
+PNG 청크를 직접 읽는 경량 리더.
+
+PIL을 거치지 않고 IHDR과 텍스트 청크(tEXt / zTXt / iTXt)만 읽고 첫 IDAT에서 멈춥니다.
+픽셀이 필요하면(stealth 정보) 왼쪽 몇 개 열의 필요한 채널만 복원합니다.
+텍스트 값은 PIL의 img.info와 같은 방식으로 디코딩합니다.
+(tEXt / zTXt는 latin-1, iTXt는 UTF-8)
+"""
+import struct
+import zlib
+
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PIL과 같은 텍스트 청크 압축 해제 한도
+MAX_TEXT_CHUNK = 1024 * 1024
+_CHUNK_HEADER = struct.Struct('>I4s')
+_IHDR = struct.Struct('>IIBBBBB')
+# 8비트 비인터레이스 이미지의 색상 형식별 (PIL 모드, 픽셀당 바이트 수)
+_PIXEL_FORMATS = {2: ('RGB', 3), 6: ('RGBA', 4)}
+_READ_SIZE = 64 * 1024
+
+
+class PngFormatError(ValueError):
+    """PNG가 아니거나 헤더/텍스트 청크가 손상된 경우 발생합니다."""
+
+
+class PngReader:
+    """
+    PNG 파일을 앞에서부터 한 번만 읽습니다.
+    생성 시 IHDR과 IDAT 이전의 텍스트 청크를 읽어 width / height / text를 채우고,
+    파일 위치는 첫 IDAT 청크에 남겨 두어 read_columns가 이어서 읽을 수 있습니다.
+
+    사용 예:
+        with PngReader(path) as png:
+            png.text.get('Comment')
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self._read_header()
+        except Exception:
+            self.file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self.file.close()
+
+    def _read_chunk_header(self):
+        header = self.file.read(_CHUNK_HEADER.size)
+        if len(header) < _CHUNK_HEADER.size:
+            raise PngFormatError("truncated PNG chunk")
+        return _CHUNK_HEADER.unpack(header)
+
+    def _read_chunk_data(self, chunk_type, length):
+        data = self.file.read(length + 4)
+        if len(data) < length + 4:
+            raise PngFormatError(f"truncated {chunk_type!r} chunk")
+        data, crc = data[:length], data[length:]
+        if zlib.crc32(data, zlib.crc32(chunk_type)) != int.from_bytes(crc, 'big'):
+            raise PngFormatError(f"broken PNG file: bad CRC in {chunk_type!r}")
+        return data
+
+    def _read_header(self):
+        if self.file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise PngFormatError("not a PNG file")
+        length, chunk_type = self._read_chunk_header()
+        if chunk_type != b'IHDR' or length != _IHDR.size:
+            raise PngFormatError("missing IHDR chunk")
+        (self.width, self.height, self.bit_depth, self.color_type,
+         _, _, self.interlace) = _IHDR.unpack(self._read_chunk_data(chunk_type, length))
+        self.text = {}
+        self._idat_remaining = 0
+        # 압축 해제된 IDAT 앞부분(필터 바이트 포함 행들). read_columns가 필요한 만큼 늘립니다.
+        self._raw = bytearray()
+        self._decompressor = None
+        self._idat = None
+        while True:
+            length, chunk_type = self._read_chunk_header()
+            if chunk_type == b'IDAT':
+                self._idat_remaining = length
+                return
+            if chunk_type == b'IEND':
+                return
+            if chunk_type in (b'tEXt', b'zTXt', b'iTXt'):
+                self._read_text_chunk(chunk_type, self._read_chunk_data(chunk_type, length))
+            else:
+                self.file.seek(length + 4, 1)
+
+    def _read_text_chunk(self, chunk_type, data):
+        key, _, value = data.partition(b'\0')
+        if chunk_type == b'tEXt':
+            text = value.decode('latin-1', 'replace')
+        elif chunk_type == b'zTXt':
+            if value and value[0] != 0:
+                raise PngFormatError("unknown zTXt compression method")
+            try:
+                text = _decompress_text(value[1:]).decode('latin-1', 'replace')
+            except zlib.error:
+                text = ''
+        else:
+            if len(value) < 2:
+                return
+            compressed, method, value = value[0], value[1], value[2:]
+            parts = value.split(b'\0', 2)
+            if len(parts) < 3:
+                return
+            value = parts[2]
+            if compressed:
+                if method != 0:
+                    return
+                try:
+                    value = _decompress_text(value)
+                except zlib.error:
+                    return
+            try:
+                text = value.decode('utf-8')
+            except UnicodeError:
+                return
+        if key:
+            self.text[key.decode('latin-1')] = text
+
+    @property
+    def mode(self):
+        """8비트 비인터레이스 RGB / RGBA면 PIL 모드 이름, 그 외에는 None."""
+        if self.bit_depth != 8 or self.interlace:
+            return None
+        pixel_format = _PIXEL_FORMATS.get(self.color_type)
+        return pixel_format[0] if pixel_format else None
+
+    def _iter_idat(self):
+        """현재 위치부터 이어지는 IDAT 청크들의 데이터를 조각 단위로 돌려줍니다. (CRC는 확인하지 않음)"""
+        while True:
+            while self._idat_remaining:
+                data = self.file.read(min(self._idat_remaining, _READ_SIZE))
+                if not data:
+                    return
+                self._idat_remaining -= len(data)
+                yield data
+            self.file.seek(4, 1)  # CRC
+            length, chunk_type = self._read_chunk_header()
+            if chunk_type != b'IDAT':
+                return
+            self._idat_remaining = length
+
+    def _inflate(self, size):
+        """IDAT을 raw가 size 바이트가 될 때까지만 이어서 압축 해제합니다. 부족하면 False."""
+        if self._decompressor is None:
+            self._decompressor = zlib.decompressobj()
+            self._idat = self._iter_idat()
+        decompressor = self._decompressor
+        try:
+            while len(self._raw) < size:
+                if decompressor.unconsumed_tail:
+                    data = decompressor.unconsumed_tail
+                else:
+                    data = next(self._idat, None)
+                    if data is None:
+                        return False
+                self._raw += decompressor.decompress(data, size - len(self._raw))
+        except zlib.error:
+            return False
+        return True
+
+    def read_columns(self, columns, rows=None, channels=None):
+        """
+        왼쪽 columns개 열의 처음 rows개 행(기본값: 전체)을 (rows, columns, len(channels)) uint8 배열로 반환합니다.
+        channels는 읽을 채널 번호 목록이며 기본값은 모든 채널입니다.
+        IDAT은 필요한 행까지만 압축 해제하고, 필터는 요청한 열과 채널의 바이트만 복원합니다.
+        (Sub / Up / Average / Paeth 필터는 같은 채널의 왼쪽, 위쪽, 왼쪽 위 바이트만 참조합니다)
+        mode가 None이거나 데이터가 부족하면 None을 반환합니다. 여러 번 호출할 수 있습니다.
+        """
+        if self.mode is None:
+            return None
+        rows = self.height if rows is None else rows
+        bpp = _PIXEL_FORMATS[self.color_type][1]
+        channels = range(bpp) if channels is None else channels
+        columns = min(columns, self.width)
+        stride = 1 + self.width * bpp
+        if rows > self.height or not self._inflate(stride * rows):
+            return None
+
+        raw = self._raw
+        pixels = np.empty((len(channels), rows, columns), dtype=np.uint8)
+        for index, channel in enumerate(channels):
+            previous = [0] * columns
+            for row in range(rows):
+                start = row * stride + 1 + channel
+                filter_type = raw[row * stride]
+                current = list(raw[start:start + columns * bpp:bpp])
+                if filter_type == 1:  # Sub
+                    for x in range(1, columns):
+                        current[x] = (current[x] + current[x - 1]) & 0xFF
+                elif filter_type == 2:  # Up
+                    current = [(value + above) & 0xFF for value, above in zip(current, previous)]
+                elif filter_type == 3:  # Average
+                    left = 0
+                    for x in range(columns):
+                        left = current[x] = (current[x] + ((left + previous[x]) >> 1)) & 0xFF
+                elif filter_type == 4:  # Paeth
+                    left = upper_left = 0
+                    for x in range(columns):
+                        above = previous[x]
+                        estimate = left + above - upper_left
+                        distance_left = abs(estimate - left)
+                        distance_above = abs(estimate - above)
+                        distance_upper_left = abs(estimate - upper_left)
+                        if distance_left <= distance_above and distance_left <= distance_upper_left:
+                            predictor = left
+                        elif distance_above <= distance_upper_left:
+                            predictor = above
+                        else:
+                            predictor = upper_left
+                        left = current[x] = (current[x] + predictor) & 0xFF
+                        upper_left = above
+                elif filter_type != 0:
+                    return None
+                pixels[index, row] = previous = current
+        return pixels.transpose(1, 2, 0)
+
+    def read_leading_pixels(self, rows):
+        """맨 왼쪽 열(x = 0)의 처음 rows개 픽셀을 (rows, channels) uint8 배열로 반환합니다. (read_columns 참고)"""
+        pixels = self.read_columns(1, rows)
+        return None if pixels is None else pixels[:, 0]
+
+
+def _decompress_text(data):
+    decompressor = zlib.decompressobj()
+    text = decompressor.decompress(data, MAX_TEXT_CHUNK)
+    if decompressor.unconsumed_tail:
+        raise PngFormatError("decompressed text chunk too large")
+    return text
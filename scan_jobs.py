@@ -0,0 +1,148 @@
+import datetime
+import json
+import threading
+import time
+import uuid
+
+# Local modules
+import database
+import scanner
+
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_CANCELLED = "cancelled"
+STATUS_FAILED = "failed"
+
+# Counters are written to the ScanJob table at most this often (seconds) while a scan runs.
+PERSIST_INTERVAL = 1.0
+# How often (seconds) the progress stream sends an update.
+STREAM_INTERVAL = 0.5
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+class ScanAlreadyRunning(Exception):
+    """Raised when a scan is requested while another one is still running."""
+
+    def __init__(self, job):
+        super().__init__(f"Scan {job.id} is already running.")
+        self.job = job
+
+
+class ScanJob:
+    """One scan run: its ID, status and a ScanProgress with the live counters."""
+
+    def __init__(self, source_path: str, dest_path: str, workers=None, thumbnail_sizes=(), duplicate_policy="skip"):
+        self.id = uuid.uuid4().hex
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.workers = workers
+        self.thumbnail_sizes = thumbnail_sizes
+        self.duplicate_policy = duplicate_policy
+        self.progress = scanner.ScanProgress()
+        self.status = STATUS_RUNNING
+        self.error = None
+        self.started_at = _now()
+        self.finished_at = None
+        self.done = threading.Event()
+        self._persisted_at = 0.0
+
+    def to_dict(self):
+        progress = self.progress
+        return {
+            "id": self.id,
+            "status": self.status,
+            "source_path": self.source_path,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "discovered": progress.discovered,
+            "processed": progress.processed,
+            "skipped": progress.skipped,
+            "failed": progress.failed,
+            "throughput": round(progress.throughput, 2),
+            "error": self.error,
+        }
+
+    def cancel(self):
+        self.progress.cancel()
+
+    def run(self):
+        try:
+            scanner.scan_and_process_images(self.source_path, self.dest_path, self.workers,
+                                            self.thumbnail_sizes, self.progress, self._on_progress,
+                                            self.duplicate_policy)
+            self.status = STATUS_CANCELLED if self.progress.cancelled else STATUS_COMPLETED
+        except Exception as e:
+            print(f"Scan {self.id} failed: {e}")
+            self.status = STATUS_FAILED
+            self.error = str(e)
+        finally:
+            self.progress.finish()
+            self.finished_at = _now()
+            try:
+                self._persist()
+            finally:
+                database.close_db_connection()
+                self.done.set()
+
+    def _on_progress(self, progress):
+        if time.monotonic() - self._persisted_at >= PERSIST_INTERVAL:
+            self._persist()
+
+    def _persist(self):
+        database.save_scan_job(self.to_dict())
+        self._persisted_at = time.monotonic()
+
+
+class ScanJobManager:
+    """
+    Runs scans on a background thread, one at a time. The running job is
+    served from memory; finished jobs are read back from the ScanJob table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+
+    def start(self, source_path: str, dest_path: str, workers=None, thumbnail_sizes=(), duplicate_policy="skip"):
+        """Starts a scan and returns its job. Raises ScanAlreadyRunning if one is in progress."""
+        with self._lock:
+            current = self._current
+            if current is not None and not current.done.is_set():
+                raise ScanAlreadyRunning(current)
+            job = ScanJob(source_path, dest_path, workers, thumbnail_sizes, duplicate_policy)
+            job._persist()
+            self._current = job
+            threading.Thread(target=job.run, name=f"scan-{job.id}", daemon=True).start()
+        return job
+
+    def running(self):
+        """Returns the running job, or None."""
+        current = self._current
+        return current if current is not None and not current.done.is_set() else None
+
+    def get(self, job_id: str):
+        """Returns the status dict of a job, or None if it is unknown."""
+        current = self._current
+        if current is not None and current.id == job_id:
+            return current.to_dict()
+        return database.get_scan_job(job_id)
+
+    def cancel(self, job_id: str):
+        """Requests cancellation of the running job. Returns False if job_id is not running."""
+        current = self.running()
+        if current is None or current.id != job_id:
+            return False
+        current.cancel()
+        return True
+
+
+def format_event(job: dict):
+    """Formats a job status dict as a Server-Sent Events message."""
+    event = "progress" if job["status"] == STATUS_RUNNING else "done"
+    return f"event: {event}\ndata: {json.dumps(job)}\n\n"
+
+
+manager = ScanJobManager()
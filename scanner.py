@@ -0,0 +1,333 @@
+import contextlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Local modules
+import database
+import image_processing
+import metrics
+import thumbnails
+
+# Files handed to a worker process per round trip. Small enough to keep all
+# workers busy near the end of a scan, large enough to amortize IPC overhead.
+SCAN_CHUNK_SIZE = 8
+
+# Held by whoever is moving files into the library (a full scan or a watch-mode
+# batch), so two ingests never race on the same source files.
+ingest_lock = threading.Lock()
+
+
+def resolve_worker_count(workers=None):
+    """Returns the scan pool size: the configured value, or one worker per CPU."""
+    if workers is None or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+
+class ScanProgress:
+    """
+    Live counters of one scan, updated by the scanning thread and read by
+    anyone watching it. cancel() asks the scan to stop after the current file.
+    """
+
+    def __init__(self):
+        self.discovered = 0
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.monotonic()
+            metrics.SCAN_THROUGHPUT.set(self.throughput)
+
+    @property
+    def throughput(self):
+        """Images moved into the library per second of scan time."""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def record(self, outcome):
+        if outcome == database.LEDGER_MOVED:
+            self.processed += 1
+        elif outcome in (database.LEDGER_SKIPPED, database.LEDGER_DUPLICATE):
+            self.skipped += 1
+        else:
+            self.failed += 1
+        metrics.SCAN_FILES.inc(outcome)
+        metrics.SCAN_THROUGHPUT.set(self.throughput)
+
+    def record_returned(self, outcome):
+        """
+        Recounts a file recorded as moved whose move was undone when its row
+        was committed. (The SCAN_FILES counter cannot be decremented.)
+        """
+        self.processed -= 1
+        if outcome == database.LEDGER_FAILED:
+            self.failed += 1
+        else:
+            self.skipped += 1
+        metrics.SCAN_THROUGHPUT.set(self.throughput)
+
+
+def iter_png_entries(source_path: str):
+    """
+    Walks source_path with os.scandir and yields (path, size, mtime_ns) for
+    every PNG. Only directory entries are stat-ed; no file is opened.
+    """
+    stack = [source_path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and entry.name.lower().endswith('.png'):
+                            stat = entry.stat()
+                            yield entry.path, stat.st_size, stat.st_mtime_ns
+                    except OSError as e:
+                        print(f"Failed to read directory entry {entry.path}: {e}")
+        except OSError as e:
+            print(f"Failed to read directory: {e}")
+
+
+def find_pending_png_files(source_path: str):
+    """
+    Returns (pending, seen): pending maps each new or changed PNG to its
+    (size, mtime_ns), and seen is the set of every PNG path found. Files
+    whose size and mtime match a ScanLedger entry that will not change on a
+    rescan (moved, or a content duplicate) are left out, which is also what
+    lets an interrupted scan resume where it stopped. Name collisions and
+    failures are retried, since the policy may have changed or the error
+    may have been transient.
+    """
+    ledger = database.get_scan_ledger()
+    pending = {}
+    seen = set()
+    for path, size, mtime_ns in iter_png_entries(source_path):
+        seen.add(path)
+        previous = ledger.get(path)
+        if (previous is not None and previous[0] == size and previous[1] == mtime_ns
+                and previous[2] in database.LEDGER_FINAL_OUTCOMES):
+            continue
+        pending[path] = (size, mtime_ns)
+    database.prune_scan_ledger(ledger.keys() - seen)
+    return pending, seen
+
+
+def _extract(png_file: str, dest_path: str, thumbnail_sizes=(), duplicate_policy="skip"):
+    """
+    Worker entry point. Runs in a pool process, so it must only read files:
+    moves and DB writes are left to the single writer in the parent.
+    Thumbnails are rendered here while the image is already decoded, keyed
+    to the source path until the writer knows where the file ends up.
+    Under the skip policy, files whose destination name is taken skip
+    metadata extraction. Returns (png_file, image_info, error).
+    """
+    def render_thumbnails(img, image_info):
+        thumbnails.pregenerate(img, png_file, thumbnail_sizes)
+
+    try:
+        image_info = image_processing.extract_image_info(
+            png_file, dest_path if duplicate_policy == "skip" else None,
+            on_image=render_thumbnails if thumbnail_sizes else None)
+        return png_file, image_info, None
+    except Exception as e:
+        return png_file, None, e
+
+
+def _iter_extracted(png_files, dest_path: str, workers: int, thumbnail_sizes=(), duplicate_policy="skip"):
+    """Yields extraction results, using a process pool when more than one worker is configured."""
+    if workers == 1:
+        for png_file in png_files:
+            yield _extract(png_file, dest_path, thumbnail_sizes, duplicate_policy)
+        return
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        count = len(png_files)
+        yield from executor.map(_extract, png_files, [dest_path] * count, [thumbnail_sizes] * count,
+                                [duplicate_policy] * count, chunksize=SCAN_CHUNK_SIZE)
+    finally:
+        # Closing the generator early (a cancelled scan) drops the queued files instead of extracting them.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def process_pending_files(pending: dict, dest_path: str, workers: int = 1, thumbnail_sizes=(),
+                          progress=None, on_progress=None, duplicate_policy="skip"):
+    """
+    Extracts, moves and records the given {path: (size, mtime_ns)} files.
+    The caller must hold ingest_lock. Stops early if progress is cancelled.
+
+    A file whose content hash is already in the library (or was moved earlier
+    in this call) is skipped and left in the source folder. A different file
+    whose destination name is taken is handled by duplicate_policy (see
+    image_processing.DUPLICATE_POLICIES). A file whose content turns out to
+    be in the library only when its row is committed is moved back and skipped;
+    the files of a batch that cannot be committed are moved back as failed.
+    """
+    if progress is None:
+        progress = ScanProgress()
+    results = _iter_extracted(list(pending), dest_path, workers, thumbnail_sizes, duplicate_policy)
+    # content hash -> library path of the files moved by this call, which the
+    # writer may not have committed yet
+    moved = {}
+    # The file being handled and the outcome its move was undone with; earlier files are already counted.
+    current = {"path": None, "returned": None}
+
+    def move_back(image_data, outcome):
+        moved.pop(image_data["content_hash"], None)
+        thumbnails.cache.invalidate(image_data["new_path"])
+        source_path = image_data["source_path"]
+        try:
+            if not os.path.exists(source_path):
+                os.replace(image_data["new_path"], source_path)
+        except OSError as e:
+            print(f"Failed to move {image_data['new_path']} back to {source_path}: {e}")
+        if source_path == current["path"]:
+            current["returned"] = outcome
+        else:
+            progress.record_returned(outcome)
+
+    with database.ImageInfoWriter(base_path=dest_path, on_rejected=move_back) as writer, \
+            contextlib.closing(results):
+        for png_file, image_info, error in results:
+            current.update(path=png_file, returned=None)
+            if progress.cancelled:
+                print("Scan cancelled.")
+                break
+            outcome = database.LEDGER_FAILED
+            try:
+                if error is not None:
+                    raise error
+                if image_info is None:
+                    continue
+                # Stage timings measured in the worker process are recorded here, in the process serving /metrics.
+                for stage, seconds in image_info.get("stage_seconds", {}).items():
+                    metrics.SCAN_STAGE_SECONDS.observe(seconds, stage)
+                content_hash = image_info.get("content_hash")
+                duplicate = moved.get(content_hash) or database.find_image_by_content_hash(content_hash)
+                if duplicate:
+                    print(f"File {os.path.basename(png_file)} has the same content as {duplicate}. Skipping.")
+                    outcome = database.LEDGER_DUPLICATE
+                    continue
+                target = image_processing.get_dest_path(image_info, dest_path)
+                collides = os.path.exists(target)
+                if collides and duplicate_policy == "skip":
+                    print(f"File {os.path.basename(png_file)} already exists. Skipping.")
+                    outcome = database.LEDGER_SKIPPED
+                    continue
+                replacing = collides and duplicate_policy == "replace"
+                if replacing:
+                    thumbnails.cache.invalidate(target)
+                with metrics.SCAN_STAGE_SECONDS.time("move"):
+                    image_data = image_processing.move_image(image_info, dest_path, duplicate_policy)
+                if image_data:
+                    if replacing:
+                        moved = {key: path for key, path in moved.items() if path != image_data["new_path"]}
+                    moved[content_hash] = image_data["new_path"]
+                    if thumbnail_sizes:
+                        # The final name (renamed under the rename policy) is known only now.
+                        thumbnails.cache.adopt(png_file, image_data["new_path"], thumbnail_sizes)
+                    writer.add(image_data)
+                    if replacing:
+                        # Commit now so the replaced file's old hash is gone from the library index.
+                        writer.flush()
+                    outcome = database.LEDGER_MOVED
+                    print(f"Processed: {png_file}")
+            except Exception as e:
+                print(f"Failed to process {png_file}: {e}")
+            finally:
+                # A flush may undo the move, before (add) or while (record_scan) the file is recorded.
+                if current["returned"]:
+                    outcome = current["returned"]
+                writer.record_scan(png_file, *pending[png_file], outcome)
+                if current["returned"]:
+                    outcome = current["returned"]
+                progress.record(outcome)
+                current["path"] = None
+                if thumbnail_sizes and outcome != database.LEDGER_MOVED:
+                    # Drop the thumbnails pregenerated for a file that stayed in the source folder.
+                    thumbnails.cache.invalidate(png_file)
+                if on_progress is not None:
+                    on_progress(progress)
+    return progress
+
+
+def scan_and_process_images(source_path: str, dest_path: str, workers=None, thumbnail_sizes=(),
+                            progress=None, on_progress=None, duplicate_policy="skip"):
+    """
+    Scans the source path for images and processes them.
+
+    Metadata extraction and platform detection (CPU bound) run on a pool of
+    worker processes; this process is the single writer that moves files and
+    records them in the database, so the folder layout and the DB stay consistent.
+    Rows are committed in batches through database.ImageInfoWriter, together
+    with a ScanLedger entry per file so unchanged files are skipped next time.
+    thumbnail_sizes lists thumbnail sizes to render eagerly during the scan.
+    duplicate_policy decides what happens to a new file whose destination name
+    is taken by a different file; identical content is always skipped.
+
+    progress (a ScanProgress) receives the counters and is checked for
+    cancellation between files; on_progress(progress) is called after each
+    file. Returns the ScanProgress.
+    """
+    if progress is None:
+        progress = ScanProgress()
+    database.create_table_if_not_exists() # Ensure table exists for the background process
+    workers = resolve_worker_count(workers)
+    with ingest_lock:
+        print(f"Starting scan in background: {source_path} ({workers} workers)")
+        pending, seen = find_pending_png_files(source_path)
+        print(f"Found {len(seen)} PNG files, {len(pending)} new or changed.")
+        progress.discovered = len(seen)
+        progress.skipped += len(seen) - len(pending)
+        process_pending_files(pending, dest_path, workers, thumbnail_sizes, progress, on_progress,
+                              duplicate_policy)
+    progress.finish()
+    if thumbnail_sizes:
+        thumbnails.cache.refresh()
+    print(f"Background scan finished. Processed {progress.processed} images.")
+    return progress
+
+
+def backfill_content_hashes(base_path: str, batch_size=500):
+    """
+    Computes the content hash of every image stored before content hashing
+    existed. Files identical to another stored image keep no hash (the unique
+    index allows one row per content) and are reported. Hashes are recorded
+    under ingest_lock so a scan never sees them change between its duplicate
+    check and its commit.
+
+    :return: (number of images hashed, number of duplicates found)
+    """
+    hashed = duplicates = 0
+    last_no = 0
+    while True:
+        rows = database.get_images_without_content_hash(last_no, batch_size)
+        if not rows:
+            return hashed, duplicates
+        last_no = rows[-1]["no"]
+        updates = []
+        for row in rows:
+            try:
+                updates.append((image_processing.content_hash(database.resolve_library_path(row["filepath"], base_path)),
+                                row["no"]))
+            except OSError as e:
+                print(f"Failed to hash {row['filepath']}: {e}")
+        with ingest_lock:
+            recorded = database.set_content_hashes(updates)
+        hashed += recorded
+        duplicates += len(updates) - recorded
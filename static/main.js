@@ -16,7 +16,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const platformSelect = document.getElementById('platformSelect');
     const deleteModeButton = document.getElementById('deleteModeButton'); // 새로운 버튼
 
-    let currentPage = 1;
+    let nextCursor = null;
     let currentQuery = '';
     let currentSort = 'random';
     let currentPlatformFilter = 'all';
@@ -30,31 +30,37 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Core Functions ---
 
-    const fetchImages = async (page = 1, query = '', sort_by = 'random', platform_filter = 'all') => {
-        if (isLoading || (page > 1 && !hasMore)) return;
+    const fetchImages = async (cursor = null, query = '', sort_by = 'random', platform_filter = 'all') => {
+        const isFirstPage = cursor === null;
+        if (isLoading || (!isFirstPage && !hasMore)) return;
 
         isLoading = true;
         loadingIndicator.style.display = 'block';
 
         try {
-            const response = await axios.get(`/api/images?page=${page}&limit=30&query=${query}&sort_by=${sort_by}&platform_filter=${platform_filter}`);
+            const params = { limit: 30, query: query, sort_by: sort_by, platform_filter: platform_filter };
+            if (!isFirstPage) {
+                params.cursor = cursor;
+                params.with_total = false; // 이어지는 페이지는 전체 개수가 필요 없습니다.
+            }
+            const response = await axios.get('/api/images', { params: params });
             const data = response.data;
 
-            if (page === 1) {
+            if (isFirstPage) {
                 gallery.innerHTML = '';
             }
 
             renderGallery(data.images);
-            currentPage = data.page;
-            hasMore = data.page < data.total_pages;
+            nextCursor = data.next_cursor;
+            hasMore = data.has_more;
 
-            if (data.images.length === 0 && page === 1) {
+            if (data.images.length === 0 && isFirstPage) {
                 gallery.innerHTML = '<p class="text-center col-12">No images found. Try scanning or changing your search.</p>';
             }
 
         } catch (error) {
             console.error('Failed to fetch images:', error);
-            if (error.response && error.response.status === 404 && page === 1) {
+            if (error.response && error.response.status === 404 && isFirstPage) {
                 settingsModal.show();
             }
         } finally {
@@ -69,7 +75,7 @@ document.addEventListener('DOMContentLoaded', () => {
             col.className = 'col-6 col-sm-4 col-md-3 col-lg-2';
             col.innerHTML = `
                 <div class="card bg-secondary gallery-item" data-image-id="${image.no}">
-                    <img src="${image.filepath}" class="card-img-top" alt="Image ${image.no}" loading="lazy">
+                    <img src="${image.thumbnail || image.filepath}" class="card-img-top" alt="Image ${image.no}" loading="lazy">
                     <div class="platform-overlay">${image.platform}</div>
                     <div class="selection-overlay"></div> <!-- 선택 표시 오버레이 -->
                 </div>
@@ -233,7 +239,15 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await axios.delete('/api/images/batch', {
                 data: { image_ids: Array.from(selectedImageIds) }
             });
-            alert(response.data.message);
+            // 삭제는 백그라운드 작업으로 진행되므로 끝날 때까지 상태를 확인합니다.
+            let batch = response.data.batch;
+            while (batch.status === 'running') {
+                deleteModeButton.textContent = `Deleting ${batch.deleted + batch.failed}/${batch.total}`;
+                await new Promise(resolve => setTimeout(resolve, 500));
+                batch = (await axios.get(`/api/deletions/${batch.id}`)).data;
+            }
+            alert(`${batch.deleted}개의 이미지를 삭제했습니다.` + (batch.failed ? ` (${batch.failed}개 실패)` : ''));
+            loadPlatformOptions();
             
             // 삭제 후 갤러리 새로고침 및 선택 모드 종료
             selectedImageIds.clear();
@@ -247,6 +261,37 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
 
+    // 플랫폼 드롭다운을 라이브러리에 실제로 있는 플랫폼과 개수로 채웁니다.
+    const loadPlatformOptions = async () => {
+        try {
+            const stats = (await axios.get('/api/stats')).data;
+            const selected = platformSelect.value;
+            const noneOption = platformSelect.querySelector('option[value="none"]');
+            platformSelect.querySelectorAll('option[data-facet]').forEach(option => option.remove());
+            let noneCount = 0;
+            stats.facets.platform.forEach(({ value, count }) => {
+                if (value === null || value === 'Unknown') {
+                    noneCount += count;
+                    return;
+                }
+                const option = document.createElement('option');
+                option.value = value;
+                option.textContent = `${value} (${count})`;
+                option.dataset.facet = 'platform';
+                platformSelect.insertBefore(option, noneOption);
+            });
+            platformSelect.querySelector('option[value="all"]').textContent = `All (${stats.total})`;
+            noneOption.textContent = `None (${noneCount})`;
+            platformSelect.value = selected;
+            if (platformSelect.value !== selected) {
+                platformSelect.value = 'all';
+            }
+        } catch (error) {
+            console.error('Failed to load stats:', error);
+        }
+    };
+
+
     // --- Event Handlers ---
 
     document.getElementById('saveSettingsButton').addEventListener('click', async () => {
@@ -263,13 +308,47 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    document.getElementById('scanButton').addEventListener('click', async () => {
+    // --- 스캔 진행 상황 ---
+    const scanButton = document.getElementById('scanButton');
+    let runningScanId = null;
+
+    const watchScan = (jobId) => {
+        runningScanId = jobId;
+        const events = new EventSource(`/api/scan/${jobId}/events`);
+        const showProgress = (event) => {
+            const job = JSON.parse(event.data);
+            const done = job.processed + job.skipped + job.failed;
+            scanButton.textContent = `Scanning ${done}/${job.discovered} (${job.throughput}/s)`;
+        };
+        events.addEventListener('progress', showProgress);
+        events.addEventListener('done', (event) => {
+            events.close();
+            runningScanId = null;
+            scanButton.textContent = 'Scan';
+            const job = JSON.parse(event.data);
+            alert(`Scan ${job.status}: ${job.processed} processed, ${job.skipped} skipped, ${job.failed} failed.`);
+            loadPlatformOptions();
+            handleSearch();
+        });
+    };
+
+    scanButton.addEventListener('click', async () => {
+        if (runningScanId) {
+            if (confirm('A scan is running. Cancel it?')) {
+                await axios.post(`/api/scan/${runningScanId}/cancel`).catch(() => {});
+            }
+            return;
+        }
         if (confirm('Start scanning for new images in the source directory? This may take a while.')) {
             try {
-                await axios.post('/api/scan');
-                alert('Image scan started in the background.');
+                const response = await axios.post('/api/scan');
+                watchScan(response.data.job_id);
             } catch (error) {
-                alert(`Failed to start scan: ${error.response.data.detail}`);
+                if (error.response && error.response.status === 409) {
+                    watchScan(error.response.data.detail.job_id);
+                } else {
+                    alert(`Failed to start scan: ${error.response.data.detail}`);
+                }
             }
         }
     });
@@ -282,10 +361,10 @@ document.addEventListener('DOMContentLoaded', () => {
         currentQuery = query;
         currentSort = sort_by;
         currentPlatformFilter = platform_filter;
-        currentPage = 1;
+        nextCursor = null;
         hasMore = true;
         gallery.innerHTML = '';
-        fetchImages(currentPage, currentQuery, currentSort, currentPlatformFilter);
+        fetchImages(null, currentQuery, currentSort, currentPlatformFilter);
     };
 
     document.getElementById('searchButton').addEventListener('click', handleSearch);
@@ -301,7 +380,7 @@ document.addEventListener('DOMContentLoaded', () => {
     window.addEventListener('scroll', () => {
         if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 200) {
             if (hasMore && !isLoading) {
-                fetchImages(currentPage + 1, currentQuery, currentSort, currentPlatformFilter);
+                fetchImages(nextCursor, currentQuery, currentSort, currentPlatformFilter);
             }
         }
     });
@@ -360,6 +439,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const config = response.data;
             document.getElementById('image_file_path').value = config.image_file_path;
             document.getElementById('des_file_path').value = config.des_file_path;
+            loadPlatformOptions();
             handleSearch();
         } catch (error) {
             if (error.response && error.response.status === 404) {
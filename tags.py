@@ -0,0 +1,65 @@
+import re
+
+# SD의 \( \) 는 가중치가 아닌 글자 그대로의 괄호입니다.
+_ESCAPED_PAREN = re.compile(r'\\([()])')
+# SD LoRA / hypernetwork 호출: <lora:name:0.8>
+_EXTRA_NETWORK = re.compile(r'<[^<>]*>')
+# SD 가중치 (tag:1.2) 의 ":1.2" 부분
+_SD_WEIGHT = re.compile(r':\s*-?\d+(?:\.\d+)?\s*(?=\))')
+# NovelAI V4 가중치 1.5::tag:: 의 "1.5::" 와 "::"
+_NAI_WEIGHT = re.compile(r'-?\d+(?:\.\d+)?::|::')
+_EMPHASIS = re.compile(r'[{}\[\]()]')
+_SPACES = re.compile(r'\s+')
+# SD parameters 문자열에서 긍정 프롬프트가 끝나는 위치
+_SD_PROMPT_END = re.compile(r'\n\s*(?:Negative prompt:|Steps:)')
+
+_LPAREN = '\x00'
+_RPAREN = '\x01'
+
+
+def normalize_tag(tag):
+    """
+    태그 하나를 정규화합니다.
+    가중치 문법({}, [], (tag:1.2), 1.2::tag::)을 벗기고, 소문자로 바꾸고,
+    밑줄을 공백으로 바꾼 뒤 공백을 정리합니다. 남는 것이 없으면 빈 문자열을 반환합니다.
+    """
+    tag = _ESCAPED_PAREN.sub(lambda m: _LPAREN if m.group(1) == '(' else _RPAREN, tag)
+    tag = _EXTRA_NETWORK.sub(' ', tag)
+    tag = _SD_WEIGHT.sub('', tag)
+    tag = _NAI_WEIGHT.sub(' ', tag)
+    tag = _EMPHASIS.sub(' ', tag)
+    tag = tag.replace(_LPAREN, '(').replace(_RPAREN, ')')
+    tag = tag.replace('_', ' ').lower()
+    return _SPACES.sub(' ', tag).strip()
+
+
+def split_tags(prompt):
+    """쉼표/줄바꿈으로 구분된 프롬프트를 정규화된 태그 목록으로 나눕니다. (중복 제거, 순서 유지)"""
+    seen = {}
+    for raw_tag in re.split(r'[,\n|]', prompt or ''):
+        tag = normalize_tag(raw_tag)
+        if tag:
+            seen.setdefault(tag, None)
+    return list(seen)
+
+
+def extract_tags(metadata):
+    """
+    이미지 메타데이터에서 긍정 프롬프트의 태그 목록을 추출합니다.
+    Stable Diffusion은 prompt에 전체 parameters 문자열이 있으므로 Negative prompt 앞까지만 사용합니다.
+    """
+    prompt = metadata.get('prompt') if isinstance(metadata, dict) else None
+    if not isinstance(prompt, str):
+        return []
+    if metadata.get('Software') == 'StableDiffusion':
+        match = _SD_PROMPT_END.search(prompt)
+        if match:
+            prompt = prompt[:match.start()]
+    return split_tags(prompt)
+
+
+def parse_tag_list(value):
+    """API 쿼리 값("a, b, c")을 정규화된 태그 목록으로 변환합니다."""
+    if not value:
+        return []
+    return split_tags(value)
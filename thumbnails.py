@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+import uuid
+
+from PIL import Image, features
+
+# Local modules
+import metrics
+
+THUMBNAIL_DIR = "thumbnail_cache"
+THUMBNAIL_SIZES = {"small": 256, "medium": 512, "large": 1024}
+DEFAULT_THUMBNAIL_SIZE = "small"
+THUMBNAIL_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# After eviction the cache is trimmed down to this fraction of the budget,
+# so a full cache does not evict on every single write.
+THUMBNAIL_CACHE_LOW_WATERMARK = 0.9
+
+if features.check("webp"):
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION, THUMBNAIL_MEDIA_TYPE = "WEBP", ".webp", "image/webp"
+else:
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION, THUMBNAIL_MEDIA_TYPE = "JPEG", ".jpg", "image/jpeg"
+THUMBNAIL_QUALITY = 80
+
+
+def thumbnail_key(filepath: str, size: str, stat_result=None):
+    """
+    Returns the cache key for one thumbnail. The key is derived from the file
+    identity (absolute path, byte size, mtime) so a changed file never hits a
+    stale entry.
+    """
+    if stat_result is None:
+        stat_result = os.stat(filepath)
+    identity = f"{os.path.abspath(filepath)}\0{stat_result.st_size}\0{stat_result.st_mtime_ns}\0{size}\0{THUMBNAIL_FORMAT}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def render_thumbnail(img, size: str, target_path: str):
+    """Writes a thumbnail of an opened PIL image to target_path (atomically)."""
+    edge = THUMBNAIL_SIZES[size]
+    thumb = img.copy()
+    thumb.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+    if THUMBNAIL_FORMAT == "JPEG" and thumb.mode != "RGB":
+        thumb = thumb.convert("RGB")
+    elif thumb.mode not in ("RGB", "RGBA"):
+        thumb = thumb.convert("RGBA")
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        thumb.save(tmp_path, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ThumbnailCache:
+    """
+    On-disk thumbnail cache with a size budget.
+
+    Entries live at <cache_dir>/<key[:2]>/<key><ext>. The total size is tracked
+    in memory (computed lazily from disk) and the least recently used entries,
+    by mtime, are evicted once the budget is exceeded. Hits touch the entry.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def path_for(self, key: str):
+        return os.path.join(self.cache_dir, key[:2], key + THUMBNAIL_EXTENSION)
+
+    def get_or_create(self, filepath: str, size: str = DEFAULT_THUMBNAIL_SIZE, key=None):
+        """Returns the cached thumbnail path for filepath, generating it on a miss."""
+        if key is None:
+            key = thumbnail_key(filepath, size)
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+            metrics.record_cache("thumbnail", True)
+            return path
+        except FileNotFoundError:
+            pass
+        metrics.record_cache("thumbnail", False)
+        with Image.open(filepath) as img:
+            render_thumbnail(img, size, path)
+        self._added(os.path.getsize(path))
+        return path
+
+    def invalidate(self, filepath: str):
+        """Removes every cached size of filepath. Call before the file is moved or deleted."""
+        try:
+            stat_result = os.stat(filepath)
+        except FileNotFoundError:
+            return
+        for size in THUMBNAIL_SIZES:
+            path = self.path_for(thumbnail_key(filepath, size, stat_result))
+            try:
+                removed = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                if self._total_bytes is not None:
+                    self._total_bytes -= removed
+
+    def adopt(self, source_path: str, dest_path: str, sizes):
+        """
+        Rekeys thumbnails pregenerated for source_path to dest_path, where the
+        file now is. A rename keeps the stat, so the entries are only renamed.
+        """
+        stat_result = os.stat(dest_path)
+        for size in sizes:
+            staged = self.path_for(thumbnail_key(source_path, size, stat_result))
+            final = self.path_for(thumbnail_key(dest_path, size, stat_result))
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            try:
+                os.replace(staged, final)
+            except FileNotFoundError:
+                continue
+
+    def refresh(self):
+        """Recounts the cache from disk (e.g. after scan workers wrote entries) and evicts if needed."""
+        with self._lock:
+            self._total_bytes = None
+        self._added(0)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(THUMBNAIL_EXTENSION):
+                    path = os.path.join(root, name)
+                    try:
+                        stat_result = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat_result.st_size, stat_result.st_mtime
+
+    def _added(self, nbytes: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(entry_size for _, entry_size, _ in self._entries())
+            else:
+                self._total_bytes += nbytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * THUMBNAIL_CACHE_LOW_WATERMARK
+        for path, entry_size, _ in sorted(self._entries(), key=lambda entry: entry[2]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._total_bytes -= entry_size
+
+
+cache = ThumbnailCache()
+
+
+def pregenerate(img, source_path: str, sizes=(DEFAULT_THUMBNAIL_SIZE,)):
+    """
+    Renders thumbnails for an image that is about to be moved, keyed to its
+    source_path. The final name is only known once the file is moved, so the
+    writer then calls cache.adopt (or cache.invalidate if it was not moved).
+    Safe to call from scan worker processes.
+    """
+    stat_result = os.stat(source_path)
+    for size in sizes:
+        path = cache.path_for(thumbnail_key(source_path, size, stat_result))
+        if not os.path.exists(path):
+            render_thumbnail(img, size, path)
+
+
+def thumbnail_version(stored_path: str, make_time, content_hash=None):
+    """
+    Short version token of an image's thumbnails, derived from the stored row
+    so list endpoints need no stat calls. It follows the content hash, so a
+    file replaced at the same path gets a new token; rows stored before
+    content hashing fall back to the creation time until they are hashed.
+    """
+    identity = f"{stored_path}\0{content_hash or make_time}\0{THUMBNAIL_FORMAT}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:16]
+
+
+def thumbnail_url(image_id: int, size: str = DEFAULT_THUMBNAIL_SIZE, version=None):
+    """Thumbnail URL; with a version it is content-addressed and served as immutable."""
+    url = f"/api/thumbnails/{image_id}?size={size}"
+    return f"{url}&v={version}" if version else url
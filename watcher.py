@@ -0,0 +1,237 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# Local modules
+import database
+import scanner
+
+# A file is ingested once its size and mtime have not changed for this long (seconds),
+# so images that are still being written are left alone.
+WATCH_DEBOUNCE = 2.0
+# Files handed to the scanner per batch; a batch holds scanner.ingest_lock.
+WATCH_BATCH_SIZE = 32
+# How long (seconds) the watch loop waits for events before re-checking pending files.
+WATCH_TICK = 0.5
+# Rescan interval (seconds) of the polling fallback.
+POLL_INTERVAL = 2.0
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_png(path):
+    return path.lower().endswith('.png')
+
+
+def _iter_directories(path):
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        yield directory
+        try:
+            with os.scandir(directory) as entries:
+                stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError as e:
+            print(f"Failed to read directory: {e}")
+
+
+class InotifyBackend:
+    """
+    Reports PNG paths under source_path that were created or written, using
+    inotify through ctypes. Subdirectories are watched as they appear.
+    Raises OSError if inotify is unavailable.
+    """
+
+    def __init__(self, source_path: str):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.source_path = source_path
+        self.directories = {}
+        self._found = []
+        self._watch_tree(source_path, report_files=False)
+
+    def _watch_tree(self, path, report_files=True):
+        """Watches path and every directory below it. Files already there are reported,
+        since they may have been written before the watch existed."""
+        for directory in _iter_directories(path):
+            wd = self._add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                print(f"Failed to watch {directory}: {os.strerror(errno)}")
+                continue
+            self.directories[wd] = directory
+            if report_files:
+                self._found.extend(path for path, _, _ in scanner.iter_png_entries(directory))
+
+    def poll(self, timeout: float):
+        """Waits up to timeout seconds and returns the PNG paths that changed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                data = b''
+            self._parse(data)
+        found, self._found = self._found, []
+        return found
+
+    def _parse(self, data):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; fall back to comparing against the scan ledger.
+                pending, _ = scanner.find_pending_png_files(self.source_path)
+                self._found.extend(pending)
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+            elif _is_png(path):
+                self._found.append(path)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingBackend:
+    """Reports new or changed PNG paths by re-walking source_path every POLL_INTERVAL seconds."""
+
+    def __init__(self, source_path: str, interval: float = POLL_INTERVAL):
+        self.source_path = source_path
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._scanned_at = time.monotonic()
+
+    def _scan(self):
+        return {path: (size, mtime_ns) for path, size, mtime_ns in scanner.iter_png_entries(self.source_path)}
+
+    def poll(self, timeout: float):
+        time.sleep(timeout)
+        if time.monotonic() - self._scanned_at < self.interval:
+            return []
+        snapshot = self._scan()
+        self._scanned_at = time.monotonic()
+        found = [path for path, identity in snapshot.items() if self._snapshot.get(path) != identity]
+        self._snapshot = snapshot
+        return found
+
+    def close(self):
+        pass
+
+
+def open_backend(source_path: str):
+    """Returns an InotifyBackend when possible, otherwise a PollingBackend."""
+    try:
+        return InotifyBackend(source_path)
+    except (OSError, AttributeError) as e:
+        print(f"inotify unavailable ({e}), polling {source_path} every {POLL_INTERVAL}s instead.")
+        return PollingBackend(source_path)
+
+
+class SourceWatcher:
+    """
+    Watches the source folder on a background thread and ingests new PNGs
+    in small batches through scanner.process_pending_files, so they show up
+    in the gallery without a full rescan. Files are debounced until their
+    size and mtime stop changing. A batch waits while a full scan holds
+    scanner.ingest_lock.
+    """
+
+    def __init__(self, source_path: str, dest_path: str, thumbnail_sizes=(), duplicate_policy="skip"):
+        self.source_path = source_path
+        self.dest_path = dest_path
+        self.thumbnail_sizes = thumbnail_sizes
+        self.duplicate_policy = duplicate_policy
+        # path -> (size, mtime_ns, monotonic time that identity was first seen)
+        self._candidates = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="source-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        backend = open_backend(self.source_path)
+        print(f"Watching {self.source_path} for new images ({type(backend).__name__}).")
+        try:
+            while not self._stop.is_set():
+                for path in backend.poll(WATCH_TICK):
+                    self._candidates.setdefault(path, None)
+                if self._candidates:
+                    self._ingest_settled()
+        except Exception as e:
+            print(f"Source watcher stopped: {e}")
+        finally:
+            backend.close()
+            database.close_db_connection()
+
+    def _settled_files(self):
+        """Returns {path: (size, mtime_ns)} of candidates that stopped changing."""
+        now = time.monotonic()
+        settled = {}
+        for path, observed in list(self._candidates.items()):
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                del self._candidates[path] # Moved away or deleted
+                continue
+            identity = (stat_result.st_size, stat_result.st_mtime_ns)
+            if observed is None or observed[:2] != identity:
+                self._candidates[path] = (*identity, now)
+            elif now - observed[2] >= WATCH_DEBOUNCE and len(settled) < WATCH_BATCH_SIZE:
+                settled[path] = identity
+        return settled
+
+    def _ingest_settled(self):
+        settled = self._settled_files()
+        if not settled or not scanner.ingest_lock.acquire(blocking=False):
+            return
+        try:
+            progress = scanner.process_pending_files(settled, self.dest_path, 1, self.thumbnail_sizes,
+                                                     duplicate_policy=self.duplicate_policy)
+        finally:
+            scanner.ingest_lock.release()
+        for path in settled:
+            self._candidates.pop(path, None)
+        print(f"Watch batch finished: {progress.processed} processed, "
+              f"{progress.skipped} skipped, {progress.failed} failed.")